@@ -9,10 +9,11 @@ import pandas as pd
 
 from dateutil import parser
 from pathlib import Path
+from zipfile import ZipFile
 
 from ....vencopy.core.dataparsers.dataparsers import DataParser
 
-# NOT TESTED: _load_data(), _load_unencrypted_data(), _load_encrypted_data(), _harmonise_variables(), _filter(), _simple_filters(), _complex_filters(), write_output(), process()
+# NOT TESTED: _load_data(), _raw_id_variable(), _encrypted_zip_path(), _harmonise_variables(), _filter(), write_output(), process()
 
 
 @pytest.fixture
@@ -25,6 +26,11 @@ def sample_configs():
                     'dataset1': '/path/to/dataset1',
                     'dataset2': '/path/to/dataset2'
                     }
+                },
+            'dataparsers': {
+                'chunk_size': None,
+                'load_encrypted': False,
+                'encryption_password': 'PW'
                 }
             },
         'dev_config': {
@@ -62,6 +68,98 @@ def test_dataparser_init(sample_configs):
     assert parser.filters == {}
 
 
+def test_load_unencrypted_data_columns(sample_configs, tmp_path):
+    raw_data = pd.DataFrame({"var1": [1, 2], "var2": [3.0, 4.0], "var3": ["a", "b"]})
+    sample_configs["user_config"]["global"]["absolute_path"]["dataset1"] = tmp_path
+    parser = DataParser(sample_configs, "dataset1")
+    parser.columns = ["var1", "var3"]
+
+    raw_data.to_csv(tmp_path / "trips01.csv", index=False)
+    result = parser._load_unencrypted_data()
+    assert list(result.columns) == ["var1", "var3"]
+
+    parser.raw_data_path = tmp_path / "trips01.dta"
+    raw_data.to_stata(parser.raw_data_path, write_index=False)
+    result = parser._load_unencrypted_data()
+    assert list(result.columns) == ["var1", "var3"]
+    assert DataParser._read_stata_variables(path=parser.raw_data_path) == ["var1", "var2", "var3"]
+
+
+def test_open_raw_file(sample_configs, tmp_path):
+    raw_data = pd.DataFrame({"var1": [1, 2], "var2": [3.0, 4.0]})
+    sample_configs["user_config"]["global"]["absolute_path"]["dataset1"] = tmp_path
+    sample_configs["dev_config"]["global"]["files"]["dataset1"]["encrypted_zip_file"] = "archive.zip"
+    parser = DataParser(sample_configs, "dataset1")
+    raw_data.to_csv(tmp_path / "trips01.csv", index=False)
+    with ZipFile(tmp_path / "archive.zip", "w") as archive:
+        archive.writestr("folder/trips01.csv", "var1,var2\n5,6.0\n")
+
+    with parser._open_raw_file(path=parser.raw_data_path) as source:
+        assert source == parser.raw_data_path
+
+    sample_configs["user_config"]["dataparsers"]["load_encrypted"] = True
+    with parser._open_raw_file(path=parser.raw_data_path) as source:
+        result = pd.read_csv(source)
+    pd.testing.assert_frame_equal(result, pd.DataFrame({"var1": [5], "var2": [6.0]}))
+
+    with pytest.raises(FileNotFoundError, match="File trips02.csv not found"):
+        with parser._open_raw_file(path=tmp_path / "trips02.csv"):
+            pass
+
+
+def test_load_debug_data(sample_configs, tmp_path):
+    sample_configs["user_config"]["global"]["absolute_path"]["dataset1"] = tmp_path
+    sample_configs["user_config"]["global"]["number_lines_debug"] = 3
+    sample_configs["user_config"]["global"]["number_vehicles_debug"] = None
+    sample_configs["dev_config"]["dataparsers"]["data_variables"]["vehicle_id"] = ["id01", "id02", "NA"]
+    sample_configs["dev_config"]["dataparsers"]["id_variables_names"] = {"dataset1": "vehicle_id"}
+    parser = DataParser(sample_configs, "dataset1")
+    pd.DataFrame({"id01": [1, 1, 2, 2, 2, 3, 4, 4], "var1": range(8)}).to_csv(tmp_path / "trips01.csv", index=False)
+
+    parser._load_debug_data()
+    assert parser.raw_data["var1"].to_list() == [0, 1, 2]
+
+    sample_configs["user_config"]["global"]["number_vehicles_debug"] = 2
+    parser._load_debug_data()
+    assert parser.raw_data["id01"].nunique() == 2
+    assert parser.raw_data["var1"].is_monotonic_increasing
+    trips_per_id = {1: 2, 2: 3, 3: 1, 4: 2}
+    assert all(parser.raw_data["id01"].value_counts()[i] == trips_per_id[i] for i in parser.raw_data["id01"].unique())
+
+
+def test_sample_complete_ids():
+    raw_data = pd.DataFrame({"id": [5, 1, 1, 7, 2, 5, 3, 9, 7, 4], "var1": range(10)})
+    chunks = [raw_data.iloc[i : i + 3] for i in range(0, len(raw_data), 3)]
+
+    result = DataParser._sample_complete_ids(chunks=chunks, id_column="id", number_ids=3)
+    assert result["id"].nunique() == 3
+    assert result["var1"].is_monotonic_increasing
+    for sampled_id in result["id"].unique():
+        assert (result["id"] == sampled_id).sum() == (raw_data["id"] == sampled_id).sum()
+
+    result_single_chunk = DataParser._sample_complete_ids(chunks=[raw_data], id_column="id", number_ids=3)
+    pd.testing.assert_frame_equal(result, result_single_chunk)
+
+    result_all = DataParser._sample_complete_ids(chunks=chunks, id_column="id", number_ids=20)
+    pd.testing.assert_frame_equal(result_all, raw_data)
+
+
+def test_align_chunks():
+    raw_data = pd.DataFrame({"id": [1, 1, 2, 2, 2, 3, 4, 4, 5], "var1": range(9)})
+    chunks = [raw_data.iloc[i : i + 3] for i in range(0, len(raw_data), 3)]
+
+    aligned = list(DataParser._align_chunks(chunks=chunks, id_column="id"))
+    assert [list(chunk["id"]) for chunk in aligned] == [[1, 1], [2, 2, 2], [3, 4, 4], [5]]
+    pd.testing.assert_frame_equal(pd.concat(aligned), raw_data)
+
+    aligned_single_id = list(DataParser._align_chunks(chunks=[raw_data.iloc[:2], raw_data.iloc[2:]], id_column="id"))
+    pd.testing.assert_frame_equal(pd.concat(aligned_single_id), raw_data)
+
+    not_adjacent = pd.DataFrame({"id": [1, 1, 2, 2, 1], "var1": range(5)})
+    with pytest.raises(ValueError):
+        list(DataParser._align_chunks(chunks=[not_adjacent.iloc[:3], not_adjacent.iloc[3:]], id_column="id"))
+
+
 def test_check_dataset_id(sample_configs):
     dataset = 'dataset2'
     mock_data_parser = DataParser(configs=sample_configs, dataset=dataset)
@@ -125,72 +223,37 @@ def sample_data_frame_filters():
     return pd.DataFrame(data)
 
 
-def test_set_include_filter(sample_data_frame_filters):
-    include_filter_dict = {
-        "transport_mode": ["car"],
-        "age": [30, 35],
-    }
-
-    result = DataParser._set_include_filter(dataset=sample_data_frame_filters, include_filter_dict=include_filter_dict)
-
-    assert isinstance(result, pd.DataFrame)
-    assert set(result.columns) == set(include_filter_dict.keys())
+@pytest.mark.parametrize("filter_logic, column, elements, expected_result", [
+    ("include", "transport_mode", ["car"], [True, False, False]),
+    ("include", "age", [30, 35], [False, True, False]),
+    ("exclude", "transport_mode", ["car"], [False, True, True]),
+    ("exclude", "age", [30, 35], [True, False, True]),
+    ("greater_than", "age", [30], [False, True, True]),
+    ("smaller_than", "age", [25], [True, False, False]),
+])
+def test_filter_checks(sample_data_frame_filters, filter_logic, column, elements, expected_result):
+    result = DataParser._filter_checks[filter_logic](sample_data_frame_filters[column], elements)
 
-    expected_result = pd.DataFrame({
-        "transport_mode": [True, False, False],
-        "age": [False, True, False],
-    }, index=sample_data_frame_filters.index)
-    assert result.equals(expected_result)
-
-
-def test_set_exclude_filter(sample_data_frame_filters):
-    exclude_filter_dict = {
-        "transport_mode": ["car"],
-        "age": [30, 35],
-    }
-
-    result = DataParser._set_exclude_filter(dataset=sample_data_frame_filters, exclude_filter_dict=exclude_filter_dict)
-
-    assert isinstance(result, pd.DataFrame)
-    assert set(result.columns) == set(exclude_filter_dict.keys())
-
-    expected_result = pd.DataFrame({
-        "transport_mode": [False, True, True],
-        "age": [True, False, True],
-    }, index=sample_data_frame_filters.index)
-    assert result.equals(expected_result)
-
-
-def test_set_greater_than_filter(sample_data_frame_filters):
-    greater_than_filter_dict = {
-        "age": [30],
-    }
-
-    result = DataParser._set_greater_than_filter(dataset=sample_data_frame_filters, greater_than_filter_dict=greater_than_filter_dict)
-
-    assert isinstance(result, pd.DataFrame)
-    assert set(result.columns) == set(greater_than_filter_dict.keys())
-
-    expected_result = pd.DataFrame({
-        "age": [False, True, True],
-    }, index=sample_data_frame_filters.index)
-    assert result.equals(expected_result)
+    assert isinstance(result, pd.Series)
+    assert result.tolist() == expected_result
 
 
-def test_set_smaller_than_filter(sample_data_frame_filters):
-    smaller_than_filter_dict = {
-        "age": [25],
+def test_compile_and_apply_filter_plan(sample_data_frame_filters):
+    filters = {
+        "include": {"transport_mode": ["car", "bike"]},
+        "exclude": {"age": [40]},
+        "greater_than": None,
+        "smaller_than": {"age": [35]},
+        "unknown": {"age": [1]},
     }
 
-    result = DataParser._set_smaller_than_filter(dataset=sample_data_frame_filters, smaller_than_filter_dict=smaller_than_filter_dict)
+    with pytest.warns(UserWarning, match="unknown filtering key"):
+        plan = DataParser._compile_filter_plan(filters=filters)
+    assert plan == {"transport_mode": [("include", ["car", "bike"])], "age": [("exclude", [40]), ("smaller_than", [35])]}
 
-    assert isinstance(result, pd.DataFrame)
-    assert set(result.columns) == set(smaller_than_filter_dict.keys())
-
-    expected_result = pd.DataFrame({
-        "age": [True, False, False],
-    }, index=sample_data_frame_filters.index)
-    assert result.equals(expected_result)
+    result = DataParser._apply_filter_plan(trips=sample_data_frame_filters, plan=plan)
+    assert result.tolist() == [0]
+    assert DataParser._apply_filter_plan(trips=sample_data_frame_filters, plan={}).tolist() == [0, 1, 2]
 
 
 @pytest.fixture
@@ -239,14 +302,33 @@ def test_filter_overlapping_trips(sample_data_frame_other_filters):
     assert result.equals(expected_result)
 
 
-def test_identify_overlapping_trips(sample_data_frame_other_filters):
-    result = DataParser._identify_overlapping_trips(sample_data_frame_other_filters, 1)
+def test_filter_overlapping_trips_long_chain():
+    # trips 2 to 9 end before they start, so trip 10 only overlaps with trip 1 nine trips earlier
+    timestamp_start = ["2023-09-01 08:00"] + [f"2023-09-01 18:0{i}" for i in range(8)] + ["2023-09-01 10:00"]
+    timestamp_end = ["2023-09-01 18:00"] + ["2023-09-01 07:00"] * 8 + ["2023-09-01 11:00"]
+    dataset = pd.DataFrame({
+        "unique_id": [1] * 10 + [2],
+        "timestamp_start": [parser.parse(x) for x in timestamp_start + ["2023-09-01 10:00"]],
+        "timestamp_end": [parser.parse(x) for x in timestamp_end + ["2023-09-01 11:00"]],
+    })
 
-    assert isinstance(result, pd.Series)
-    assert len(result) == len(sample_data_frame_other_filters)
+    result = DataParser._filter_overlapping_trips(dataset)
 
-    expected_result = pd.Series([True, False, True, True, True])
-    assert result.equals(expected_result)
+    expected_result = pd.Series([False] * 10 + [True], name="overlap")
+    pd.testing.assert_series_equal(result, expected_result)
+
+
+def test_filter_overlapping_trips_missing_timestamps(sample_data_frame_other_filters):
+    dataset = sample_data_frame_other_filters.iloc[[0, 2, 3, 4]].reset_index(drop=True)
+    dataset = pd.concat([dataset, dataset.iloc[[3]].assign(unique_id=4)], ignore_index=True)
+    dataset.loc[1, "timestamp_end"] = pd.NaT
+    dataset.loc[3, "timestamp_start"] = pd.NaT
+    dataset.loc[4, "timestamp_end"] = pd.NaT
+
+    result = DataParser._filter_overlapping_trips(dataset)
+
+    expected_result = pd.Series([True, False, False, True, True], name="overlap")
+    pd.testing.assert_series_equal(result, expected_result)
 
 
 def test_filter_analysis(capsys):
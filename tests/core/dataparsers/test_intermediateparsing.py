@@ -5,13 +5,15 @@ __status__ = "dev"  # options are: dev, test, prod
 __license__ = "BSD-3-Clause"
 
 import pytest
+import numpy as np
 import pandas as pd
 
 from pathlib import Path
 
-from ....vencopy.core.dataparsers.dataparsers import IntermediateParsing
+from ....vencopy.core.dataparsers import dataparsers
+from ....vencopy.core.dataparsers.dataparsers import IntermediateParsing, SortedKeyIndex
 
-# NOT TESTED: _complex_filters(), _compose_start_and_end_timestamps(), 
+# NOT TESTED: _harmonise_trips(), _update_filter_provenance(), _compose_start_and_end_timestamps(), _write_trips_cache()
 
 
 @pytest.fixture
@@ -85,6 +87,14 @@ def test_compile_variable_list(sample_configs):
     assert variables == expected_variables
 
 
+def test_project_columns(sample_configs):
+    parser = IntermediateParsing(sample_configs, "dataset1")
+
+    assert parser._project_columns(available_columns=["var2dataset1", "other"]) == ["var2dataset1"]
+    assert parser._project_columns(available_columns=["var2dataset1"], key="id") == ["var2dataset1", "id"]
+    assert parser._project_columns(available_columns=["id", "var1dataset1"], key="id") == ["var1dataset1", "id"]
+
+
 def test_remove_na():
     variables = ["var1", "var2", "NA"]
     IntermediateParsing._remove_na(variables)
@@ -104,6 +114,10 @@ def intermediate_parser_instance():
                     }
                 },
         "dataparsers": {
+            "chunk_size": None,
+            "load_encrypted": False,
+            "filter_provenance": False,
+            "report_filter_rejections": False,
             "subset_vehicle_segment": True,
             "vehicle_segment": {
                 "dataset1": "Car",
@@ -220,10 +234,30 @@ def test_add_string_column_from_variable(intermediate_parser_instance):
     intermediate_parser_instance .trips = trips_data
     intermediate_parser_instance._add_string_column_from_variable("new_var", "var1dataset1")
 
-    expected_result = pd.Series(["One", "Two", "Two", "Three"], name="new_var")
+    expected_result = pd.Series(
+        pd.Categorical(["One", "Two", "Two", "Three"], categories=["One", "Two", "Three"]), name="new_var"
+    )
     pd.testing.assert_series_equal(intermediate_parser_instance.trips["new_var"], expected_result)
 
 
+def test_categorical_from_replacements():
+    replacements = {1: "WORK", 2: "WORK", 8: "HOME", 99: "NA"}
+
+    result = IntermediateParsing._categorical_from_replacements(
+        values=pd.Series([8.0, 1.0, 2.0, 5.0, np.nan]), replacements=replacements
+    )
+
+    assert list(result.categories) == ["WORK", "HOME", "NA", "5"]
+    assert list(result.codes) == [1, 0, 0, 3, -1]
+    assert list(result.astype(object)[:4]) == ["HOME", "WORK", "WORK", "5"]
+    assert pd.isna(result[4])
+
+    result_mapped = IntermediateParsing._categorical_from_replacements(
+        values=pd.Series([8, 1]), replacements=replacements
+    )
+    assert list(result_mapped.categories) == ["WORK", "HOME", "NA"]
+
+
 def test_compose_timestamp():
     data = pd.DataFrame({
         "col_year": [2023, 2023, 2023],
@@ -285,3 +319,245 @@ def test_subset_vehicle_segment(intermediate_parser_instance):
     })
     pd.testing.assert_frame_equal(intermediate_parser_instance.activities, expected_result)
 
+
+def test_load_harmonised_trips_cache(intermediate_parser_instance, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    parser = intermediate_parser_instance
+    parser.user_config["dataparsers"]["cache_trips"] = True
+    parser.user_config["global"]["absolute_path"]["dataset1"] = tmp_path
+    parser.user_config["global"]["absolute_path"]["vencopy_root"] = tmp_path
+    parser.user_config["global"]["number_lines_debug"] = 10
+    parser.dev_config["global"]["relative_path"] = {"parse_cache": "cache"}
+    (tmp_path / "trips01.csv").write_text("var1dataset1,var2dataset1\n1,A\n")
+    trips = pd.DataFrame({
+        "unique_id": [1, 1, 2],
+        "timestamp_start": pd.DatetimeIndex(["2023-09-12 08:00:00", "2023-09-12 09:00:00", "2023-09-12 10:00:00"]),
+        "purpose_string": ["HOME", "WORK", "HOME"],
+    }, index=[0, 2, 5])
+    calls = []
+
+    def parse_trips():
+        calls.append(1)
+        parser.trips = trips.copy()
+
+    monkeypatch.setattr(parser, "_parse_trips", parse_trips)
+    parser._load_harmonised_trips()
+    parser.trips = None
+    parser._load_harmonised_trips()
+
+    assert len(calls) == 1
+    assert parser._trips_cache_path().exists()
+    pd.testing.assert_frame_equal(parser.trips, trips)
+
+    (tmp_path / "trips01.csv").write_text("var1dataset1,var2dataset1\n1,A\n2,B\n")
+    parser._load_harmonised_trips()
+    assert len(calls) == 2
+
+    parser.user_config["dataparsers"]["chunk_size"] = 1000
+    parser._load_harmonised_trips()
+    assert len(calls) == 3
+
+    monkeypatch.setattr(dataparsers, "TRIPS_CACHE_VERSION", dataparsers.TRIPS_CACHE_VERSION + 1)
+    parser._load_harmonised_trips()
+    assert len(calls) == 4
+
+
+
+def test_stream_trips(intermediate_parser_instance, tmp_path, monkeypatch):
+    parser = intermediate_parser_instance
+    parser.user_config["dataparsers"]["chunk_size"] = 2
+    parser.user_config["global"]["number_lines_debug"] = 4
+    parser.raw_data_path = tmp_path / "trips01.csv"
+    parser.columns = None
+    parser.filters = {"greater_than": {"trip_distance": [2]}}
+    pd.DataFrame({
+        "unique_id": [1, 1, 2, 3, 3],
+        "trip_distance": [1.0, 5.0, 3.0, 0.5, 8.0],
+    }).to_csv(parser.raw_data_path, index=False)
+
+    def harmonise_trips():
+        parser.trips = parser.raw_data
+
+    monkeypatch.setattr(parser, "_harmonise_trips", harmonise_trips)
+    parser._parse_trips()
+
+    expected_result = pd.DataFrame({"unique_id": [1, 2, 3], "trip_distance": [5.0, 3.0, 8.0]}, index=[1, 2, 4])
+    pd.testing.assert_frame_equal(parser.trips, expected_result)
+    assert parser.filters == {"greater_than": {"trip_distance": [2]}}
+
+
+def test_stream_trips_unmapped_codes(intermediate_parser_instance, tmp_path, monkeypatch):
+    parser = intermediate_parser_instance
+    parser.raw_data_path = tmp_path / "trips01.csv"
+    parser.columns = None
+    parser.filters = {}
+    pd.DataFrame({
+        "unique_id": [1, 1, 2, 3, 3],
+        "trip_purpose": [1, 8, 55, 8, 1],
+    }).to_csv(parser.raw_data_path, index=False)
+
+    def harmonise_trips():
+        parser.trips = parser.raw_data
+        parser.trips["purpose_string"] = IntermediateParsing._categorical_from_replacements(
+            values=parser.trips["trip_purpose"], replacements={1: "WORK", 8: "HOME"}
+        )
+
+    monkeypatch.setattr(parser, "_harmonise_trips", harmonise_trips)
+    parser._parse_trips()
+    expected_result = parser.trips
+    assert list(expected_result["purpose_string"].cat.categories) == ["WORK", "HOME", "55"]
+
+    parser.user_config["dataparsers"]["chunk_size"] = 2
+    parser._parse_trips()
+    pd.testing.assert_frame_equal(parser.trips, expected_result)
+
+
+def test_refilter_streamed_trips(intermediate_parser_instance, tmp_path, monkeypatch):
+    parser = intermediate_parser_instance
+    parser.user_config["dataparsers"]["chunk_size"] = 2
+    parser.user_config["dataparsers"]["filter_provenance"] = True
+    parser.user_config["dataparsers"]["cache_trips"] = False
+    parser.raw_data_path = tmp_path / "trips01.csv"
+    parser.columns = None
+    parser.filters = {"greater_than": {"trip_distance": [2]}}
+    pd.DataFrame({
+        "unique_id": [1, 1, 2, 3, 3],
+        "trip_distance": [1.0, 5.0, 3.0, 0.5, 8.0],
+    }).to_csv(parser.raw_data_path, index=False)
+
+    def harmonise_trips():
+        parser.trips = parser.raw_data
+
+    monkeypatch.setattr(parser, "_harmonise_trips", harmonise_trips)
+    monkeypatch.setattr(parser, "_complex_filter_functions", lambda: [])
+    parser._load_harmonised_trips()
+    assert not parser.simple_filters_applied
+    assert len(parser.trips) == 5
+
+    parser._filter(filters=parser.filters)
+    assert parser.trips.index.to_list() == [1, 2, 4]
+
+    result = parser.refilter_trips(filters={"greater_than": {"trip_distance": [0.8]}})
+    assert result.index.to_list() == [0, 1, 2, 4]
+
+
+def test_trips_cache_path_encrypted(intermediate_parser_instance, tmp_path, monkeypatch):
+    parser = intermediate_parser_instance
+    parser.user_config["dataparsers"]["cache_trips"] = True
+    parser.user_config["dataparsers"]["load_encrypted"] = True
+    parser.user_config["global"]["absolute_path"]["dataset1"] = tmp_path
+    parser.user_config["global"]["number_lines_debug"] = 10
+    parser.dev_config["global"]["files"]["dataset1"]["encrypted_zip_file"] = "archive.zip"
+    (tmp_path / "archive.zip").write_bytes(b"encrypted")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+    result = parser._trips_cache_path()
+    assert result.parent == parser._private_cache_folder()
+    assert result.parent == tmp_path / "cache" / "vencopy"
+    assert result.parent.stat().st_mode & 0o777 == 0o700
+    assert parser._raw_data_origin() == [tmp_path / "archive.zip"]
+
+
+def test_private_cache_folder_refused(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    (tmp_path / "cache").mkdir()
+    (tmp_path / "elsewhere").mkdir(mode=0o700)
+    (tmp_path / "cache" / "vencopy").symlink_to(tmp_path / "elsewhere")
+    with pytest.raises(PermissionError):
+        IntermediateParsing._private_cache_folder()
+
+    (tmp_path / "cache" / "vencopy").unlink()
+    (tmp_path / "cache" / "vencopy").mkdir()
+    (tmp_path / "cache" / "vencopy").chmod(0o755)
+    with pytest.raises(PermissionError):
+        IntermediateParsing._private_cache_folder()
+
+
+def test_run_concurrently():
+    result = IntermediateParsing._run_concurrently(lambda: pd.DataFrame({"a": [1]}), lambda: "vehicles")
+
+    assert len(result) == 2
+    pd.testing.assert_frame_equal(result[0], pd.DataFrame({"a": [1]}))
+    assert result[1] == "vehicles"
+
+
+def test_refilter_trips(intermediate_parser_instance, monkeypatch):
+    parser = intermediate_parser_instance
+    parser.user_config["dataparsers"]["filter_provenance"] = True
+    parser.trips = pd.DataFrame({
+        "unique_id": [1, 1, 2, 3, 4],
+        "trip_distance": [5.0, 15.0, 8.0, 25.0, 2.0],
+        "trip_purpose": [1, 1, 9, 2, 2],
+    })
+    parser.filters = {"exclude": {"trip_purpose": [9]}, "smaller_than": {"trip_distance": [20]}}
+    calls = []
+
+    def _filter_short_vehicles(dataset):
+        calls.append(len(dataset))
+        return dataset.groupby("unique_id")["trip_distance"].transform("sum") > 4
+
+    monkeypatch.setattr(parser, "_complex_filter_functions", lambda: [_filter_short_vehicles])
+    parser._filter(filters=parser.filters)
+
+    assert parser.trips.index.to_list() == [0, 1]
+    assert list(parser.filter_definitions) == ["exclude_trip_purpose", "smaller_than_trip_distance", "_filter_short_vehicles"]
+    assert parser.filter_mask.dtype == "uint8"
+    assert parser.filter_mask.to_list() == [0, 0, 1, 2, 4]
+    assert calls == [3]
+
+    result = parser.refilter_trips(filters={"exclude": {"trip_purpose": [9]}, "smaller_than": {"trip_distance": [30]}})
+    assert result.index.to_list() == [0, 1, 3]
+    assert parser.filter_mask.to_list() == [0, 0, 1, 0, 4]
+    assert calls == [3, 4]
+
+    parser.refilter_trips()
+    assert calls == [3, 4]
+    assert parser._provenance_rejections().to_list() == [1, 0, 1]
+
+
+def test_report_filter_rejections(intermediate_parser_instance, monkeypatch, capsys):
+    parser = intermediate_parser_instance
+    parser.user_config["dataparsers"]["report_filter_rejections"] = True
+    parser.trips = pd.DataFrame({
+        "unique_id": [1, 1, 2, 3, 4],
+        "trip_distance": [5.0, 15.0, 8.0, 25.0, 2.0],
+        "trip_purpose": [1, 1, 9, 2, 2],
+    })
+    parser.filters = {"exclude": {"trip_purpose": [9]}}
+
+    def _filter_short_trips(dataset):
+        return dataset["trip_distance"] > 4
+
+    monkeypatch.setattr(parser, "_complex_filter_functions", lambda: [_filter_short_trips])
+    parser._filter(filters={"exclude": {"trip_purpose": [9]}, "smaller_than": {"trip_distance": [20]}})
+    report = capsys.readouterr().out.splitlines()
+    rejections = dict(line.split() for line in report[report.index("Number of trips rejected per filter:") + 1 :][:3])
+    assert rejections == {"exclude_trip_purpose": "1", "smaller_than_trip_distance": "1", "_filter_short_trips": "1"}
+
+    parser.simple_filters_applied = True
+    parser._filter(filters=parser.filters)
+    report = capsys.readouterr().out.splitlines()
+    start = report.index("Number of trips rejected per filter:") + 1
+    assert "applied while streaming" in report[start]
+    assert report[start + 1].split() == ["_filter_short_trips", "0"]
+
+
+def test_sorted_key_index():
+    index = SortedKeyIndex(keys=[30, 10, 20, 10])
+
+    np.testing.assert_array_equal(index.positions(keys=[10, 20, 40, 30]), [1, 2, -1, 0])
+
+    values = pd.Series([None, None, "L", "S"], index=[5, 6, 7, 8])
+    expected_result = pd.Series([None, "S", "L", "S"], index=[5, 6, 7, 8])
+    pd.testing.assert_series_equal(index.first_valid(values=values), expected_result)
+
+
+def test_join_vehicles():
+    trips = pd.DataFrame({"k00": [2.0, 1.0, 3.0], "trip_distance": [1.5, 2.0, 3.5]}, index=[4, 5, 6])
+    vehicles = pd.DataFrame({"k01": ["L", "S"], "drivetrain": ["BEV", "ICE"]}, index=pd.Index([1, 2], name="k00"))
+
+    result = IntermediateParsing._join_vehicles(trips=trips, vehicles=vehicles, on="k00")
+
+    pd.testing.assert_frame_equal(result, trips.join(vehicles, on="k00"))
+    with pytest.raises(ValueError):
+        IntermediateParsing._join_vehicles(trips=trips, vehicles=vehicles.rename(columns={"k01": "trip_distance"}), on="k00")
@@ -8,7 +8,66 @@ import pytest
 
 import pandas as pd
 
-from ....vencopy.core.dataparsers.parkinference import OvernightSplitter
+from ....vencopy.core.dataparsers.parkinference import OvernightSplitter, ParkInference
 
-# NOT TESTED:
+# NOT TESTED: check_and_assert()
 
+
+@pytest.fixture
+def sample_activities():
+    configs = {
+        "user_config": {
+            "global": {"dataset": "dataset1"},
+            "dataparsers": {"location_park_before_first_trip": {"dataset1": "HOME"}},
+        }
+    }
+    trips = pd.DataFrame({
+        "unique_id": [1, 1, 2, 2, 3, 3],
+        "trip_id": [1, 2, 1, 2, 1, 2],
+        "timestamp_start": pd.DatetimeIndex([
+            "2023-09-12 08:00", "2023-09-12 22:00",
+            "2023-09-12 00:30", "2023-09-12 23:00",
+            "2023-09-12 01:00", "2023-09-12 23:00"]),
+        "timestamp_end": pd.DatetimeIndex([
+            "2023-09-12 09:00", "2023-09-13 01:00",
+            "2023-09-12 02:00", "2023-09-13 01:00",
+            "2023-09-12 02:00", "2023-09-13 01:00"]),
+        "trip_end_next_day": [False, True, False, True, False, True],
+        "trip_distance": [4000.0, 90.0, 20.0, 60.0, 20.0, 60.0],
+        "trip_purpose": [1, 2, 1, 3, 1, 4],
+    })
+    park_inference = ParkInference(configs=configs)
+    activities = park_inference._build_activity_chains(trips=trips, user_config=configs["user_config"])
+    return park_inference._add_first_trip_park_columns(activities_raw=activities)
+
+
+def test_split_overnight_trips(sample_activities):
+    result = OvernightSplitter().split_overnight_trips(activities_raw=sample_activities)
+
+    # Regular overnight trip: the morning part becomes the first activity of the chain
+    vehicle = result.loc[result["unique_id"] == 1]
+    assert vehicle["trip_id"].tolist()[0] == 0
+    assert vehicle["park_id"].tolist()[1] == 0
+    assert vehicle["timestamp_start"].tolist()[:2] == [pd.Timestamp("2023-09-12 00:00"), pd.Timestamp("2023-09-12 01:00")]
+    assert vehicle["trip_distance"].tolist()[0] == pytest.approx(30)
+    assert vehicle["trip_distance"].tolist()[-1] == pytest.approx(60)
+    assert vehicle["timestamp_end"].tolist()[-1] == pd.Timestamp("2023-09-13 00:00")
+    assert vehicle["is_first_activity"].tolist() == [True, False, False, False, False]
+    assert vehicle["is_first_trip"].tolist() == [True, False, False, False, False]
+    assert vehicle["is_last_activity"].tolist() == [False, False, False, False, True]
+
+    # Edge case 1: the morning part overlaps with the first trip and is neglected
+    vehicle = result.loc[result["unique_id"] == 2]
+    assert 0 not in vehicle["trip_id"].tolist()
+    assert vehicle["trip_distance"].tolist()[-1] == pytest.approx(30)
+    assert vehicle["previous_activity_id"].tolist()[0] == 0
+
+    # Edge case 2: the morning part ends at the start of the first trip and is merged into it
+    vehicle = result.loc[result["unique_id"] == 3]
+    assert vehicle["park_id"].isna().tolist()[0]
+    assert vehicle["timestamp_start"].tolist()[0] == pd.Timestamp("2023-09-12 00:00")
+    assert vehicle["trip_distance"].tolist()[0] == pytest.approx(50)
+    assert vehicle["trip_purpose"].tolist()[0] == 4
+    assert vehicle["is_first_activity"].tolist()[0]
+    assert len(result) == 12
+    assert result.index.tolist() == list(range(12))
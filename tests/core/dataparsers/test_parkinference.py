@@ -12,7 +12,7 @@ import numpy as np
 from ....vencopy.core.dataparsers.parkinference import ParkInference
 from ....vencopy.core.dataparsers.parkinference import OvernightSplitter
 
-# NOT TESTED: add_parking_rows(), __adjust_park_timestamps(), __overnight_split_decider()
+# NOT TESTED: add_parking_rows(), __overnight_split_decider(), __report_composition()
 
 
 @pytest.fixture
@@ -65,93 +65,151 @@ def test_park_inference_init(sample_configs):
     assert isinstance(park_inference.overnight_splitter, OvernightSplitter)
 
 
-def test_copy_rows(sample_activities):
-    result = ParkInference._copy_rows(sample_activities)
-    result = result[["trip_id", "park_id"]]
-
-    expected_result = pd.DataFrame({
-        "trip_id": [1, np.nan, 2, np.nan, 1, np.nan, 2, np.nan],
-        "park_id": [np.nan, 1, np.nan, 2, np.nan, 1, np.nan, 2],
+def test_chain_layout():
+    layout = ParkInference._chain_layout(
+        unique_ids=np.array([1, 1, 2, 2]),
+        trip_ids=np.array([1.0, 2.0, 1.0, 2.0]),
+        trip_end_next_day=np.array([False, False, False, True]),
+    )
+
+    assert layout["source"].tolist() == [0, 0, 0, 1, 1, 2, 2, 2, 3]
+    assert layout["is_trip"].tolist() == [False, True, False, True, False, False, True, False, True]
+    assert layout["is_first_park"].tolist() == [True, False, False, False, False, True, False, False, False]
+    assert layout["is_park_after_trip"].tolist() == [False, False, True, False, True, False, False, True, False]
+    assert layout["is_first_activity"].tolist() == [True, False, False, False, False, True, False, False, False]
+    assert layout["is_last_activity"].tolist() == [False, False, False, False, True, False, False, False, True]
+
+
+def test_build_activity_chains(sample_activities, sample_configs):
+    sample_activities["trip_end_next_day"] = [False, False, False, False]
+    sample_activities["purpose_string"] = ["WORK", "SHOPPING", "WORK", "LEISURE"]
+    result = ParkInference._build_activity_chains(sample_activities, user_config=sample_configs["user_config"])
+
+    assert len(result) == 3 * len(sample_activities) - 2
+    assert result["trip_id"].equals(pd.Series([np.nan, 1, np.nan, 2, np.nan, np.nan, 1, np.nan, 2, np.nan]))
+    assert result["park_id"].equals(pd.Series([0, np.nan, 1, np.nan, 2, 0, np.nan, 1, np.nan, 2]))
+    assert result["is_first_activity"].tolist() == [True] + [False] * 4 + [True] + [False] * 4
+    assert result["is_last_activity"].tolist() == [False] * 4 + [True] + [False] * 4 + [True]
+    assert result.loc[result["park_id"] == 0, "purpose_string"].tolist() == ["HOME", "HOME"]
+    assert result.loc[result["park_id"] != 0, "purpose_string"].tolist() == [
+        "WORK", "WORK", "SHOPPING", "SHOPPING", "WORK", "WORK", "LEISURE", "LEISURE"
+    ]
+    assert result.loc[result["trip_id"].isna(), "travel_time"].isna().all()
+    assert result["trip_is_intermodal"].isna().all()
+
+    expected_timestamp_start = pd.Series(pd.DatetimeIndex([
+        "2023-09-12 00:00:00", "2023-09-12 08:00:00", "2023-09-12 09:16:00", "2023-09-12 10:30:00",
+        "2023-09-12 11:50:00", "2023-09-15 00:00:00", "2023-09-15 13:30:00", "2023-09-15 14:00:00",
+        "2023-09-15 14:30:00", "2023-09-15 15:45:00"]), name="timestamp_start")
+    expected_timestamp_end = pd.Series(pd.DatetimeIndex([
+        "2023-09-12 08:00:00", "2023-09-12 09:16:00", "2023-09-12 10:30:00", "2023-09-12 11:50:00",
+        "2023-09-13 00:00:00", "2023-09-15 13:30:00", "2023-09-15 14:00:00", "2023-09-15 14:30:00",
+        "2023-09-15 15:45:00", "2023-09-16 00:00:00"]), name="timestamp_end")
+    pd.testing.assert_series_equal(result["timestamp_start"], expected_timestamp_start)
+    pd.testing.assert_series_equal(result["timestamp_end"], expected_timestamp_end)
+
+    assert result["activity_id"].tolist() == [0, 1, 1, 2, 2, 0, 1, 1, 2, 2]
+    assert result["next_activity_id"].equals(pd.Series([1, 1, 2, 2, np.nan, 1, 1, 2, 2, np.nan], dtype=float))
+    assert result["previous_activity_id"].equals(pd.Series([np.nan, 0, 1, 1, 2, np.nan, 0, 1, 1, 2], dtype=float))
+
+
+def test_build_activity_chains_next_day_last_trip(sample_activities, sample_configs):
+    sample_activities["trip_end_next_day"] = [False, True, False, False]
+    sample_activities["purpose_string"] = pd.Categorical(["WORK", "SHOPPING", "WORK", "LEISURE"])
+    result = ParkInference._build_activity_chains(sample_activities, user_config=sample_configs["user_config"])
+
+    assert isinstance(result["purpose_string"].dtype, pd.CategoricalDtype)
+    assert list(result.loc[result["park_id"] == 0, "purpose_string"]) == ["HOME", "HOME"]
+    assert result["trip_id"].equals(pd.Series([np.nan, 1, np.nan, 2, np.nan, 1, np.nan, 2, np.nan]))
+    assert result.loc[result["is_last_activity"], "trip_id"].tolist()[0] == 2
+    assert result.loc[result["is_last_activity"], "next_activity_id"].isna().all()
+    assert result.loc[3, "timestamp_end"] == pd.Timestamp("2023-09-12 11:50:00")
+
+
+def test_add_first_trip_park_columns(sample_configs):
+    activities = pd.DataFrame({
+        "unique_id": [1, 1, 1, 2, 2, 2],
+        "trip_id": [np.nan, 1, np.nan, 0, np.nan, 1],
+        "park_id": [0, np.nan, 1, np.nan, 0, np.nan],
+        "purpose_string": ["HOME", "WORK", "WORK", "HOME", "HOME", "SHOPPING"],
     })
 
-    assert len(result) == 2 * len(sample_activities)
-    assert result.equals(expected_result)
+    result = ParkInference(configs=sample_configs)._add_first_trip_park_columns(activities)
 
+    assert result.columns.tolist()[:3] == ["unique_id", "park_id", "trip_id"]
+    assert result["is_first_trip"].tolist() == [False, True, False, True, False, False]
+    assert result["is_first_park_activity"].tolist() == [True, False, False, False, True, False]
+    assert "is_first_trip" not in activities.columns
 
-def test_add_util_attributes(sample_activities):
-    result = ParkInference._add_util_attributes(sample_activities)
 
-    assert "previous_unique_id" in result.columns
-    assert "is_first_activity" in result.columns
-    assert "next_unique_id" in result.columns
-    assert "is_last_activity" in result.columns
+def test_shard_bounds():
+    unique_ids = pd.Series([1, 1, 1, 2, 3, 3, 4, 5, 5, 5])
 
-    assert result["previous_unique_id"].equals(pd.Series([0, 1, 1, 2]))
-    assert result["is_first_activity"].equals(pd.Series([True, False, True, False]))
-    assert result["next_unique_id"].equals(pd.Series([1, 2, 2, 0]))
-    assert result["is_last_activity"].equals(pd.Series([False, True, False, True]))
+    assert ParkInference._shard_bounds(unique_ids=unique_ids, number_shards=2).tolist() == [0, 6, 10]
+    assert ParkInference._shard_bounds(unique_ids=unique_ids, number_shards=3).tolist() == [0, 4, 7, 10]
+    assert ParkInference._shard_bounds(unique_ids=unique_ids, number_shards=20).tolist() == [0, 3, 4, 6, 7, 10]
 
 
-def test_add_park_act_before_first_trip(sample_activities, sample_configs):
-    input_data = ParkInference._add_util_attributes(sample_activities)
-    result = ParkInference._add_park_act_before_first_trip(input_data, user_config=sample_configs["user_config"])
+def test_add_parking_rows_partitioned(sample_activities, sample_configs, capsys):
+    sample_configs["user_config"]["dataparsers"]["split_overnight_trips"] = True
+    trips = pd.concat([sample_activities.assign(unique_id=sample_activities["unique_id"] + 2 * i) for i in range(3)])
+    trips = trips.reset_index(drop=True).drop(columns="activity_duration")
+    trips["timestamp_end"] = trips["timestamp_end"].where(trips.index != 5, pd.Timestamp("2023-09-16 00:30:00"))
+    trips["trip_end_next_day"] = trips.index == 5
+    trips["trip_distance"] = 40.0
+    trips["purpose_string"] = pd.Categorical(["WORK", "HOME"] * 6)
+    for column in ["trip_start_clock", "trip_end_clock", "trip_start_year", "trip_start_month", "trip_start_week",
+                   "trip_start_hour", "trip_start_minute", "trip_end_hour", "trip_end_minute"]:
+        trips[column] = 0
 
-    assert "park_id" in result.columns
-    assert "purpose_string" in result.columns
+    expected = ParkInference(sample_configs).add_parking_rows(trips=trips)
+    expected_output = capsys.readouterr().out
+    result = ParkInference(sample_configs).add_parking_rows_partitioned(trips=trips, number_processes=3)
 
-    assert result.loc[result["is_first_activity"], "park_id"].equals(pd.Series([float(0), float(0)], index=[0, 2]))
-    assert result.loc[result["is_first_activity"], "purpose_string"].equals(pd.Series(["HOME", "HOME"], index=[0, 2]))
-    assert result.loc[result["is_first_activity"] & (result["park_id"] == 0), "trip_id"].equals(pd.Series([np.nan, np.nan], index=[0, 2]))
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+    assert capsys.readouterr().out == expected_output
 
 
-def test_adjust_park_attrs(sample_activities, sample_configs):
-    input_data = ParkInference._add_util_attributes(sample_activities)
-    input_data = ParkInference._add_park_act_before_first_trip(input_data, user_config=sample_configs["user_config"])
-    result = ParkInference._adjust_park_attrs(input_data)
+def test_set_overnight_var_false_for_last_act_trip():
+    activities = pd.DataFrame({
+        "unique_id": [1, 1, 1, 2, 2, 2],
+        "trip_id": [np.nan, 1, 2, np.nan, 1, 2],
+        "is_last_activity": [False, False, True, False, False, True],
+        "trip_end_next_day": [True, True, True, False, False, True],
+        "timestamp_end": pd.DatetimeIndex([
+            "2023-09-12 08:00", "2023-09-12 09:00", "2023-09-13 00:00",
+            "2023-09-12 08:00", "2023-09-12 09:00", "2023-09-13 01:30"]),
+    })
 
-    assert "trip_distance" in result.columns
-    assert "travel_time" in result.columns
-    assert "trip_is_intermodal" in result.columns
-    assert "column_from_index" in result.columns
+    result = ParkInference._set_overnight_var_false_for_last_act_trip(activities)
 
-    parking_activities = result[result["trip_id"].isna()]
-    assert parking_activities["trip_distance"].equals(pd.Series([np.nan, np.nan], index=[0, 2]))
-    assert parking_activities["travel_time"].equals(pd.Series([np.nan, np.nan], index=[0, 2]))
-    assert parking_activities["trip_is_intermodal"].equals(pd.Series([np.nan, np.nan], index=[0, 2]))
+    assert result["trip_end_next_day"].tolist() == [False, False, False, False, False, True]
 
-    expected_column_from_index = [0, 0, 1, 2, 2, 3]
-    assert result["column_from_index"].equals(pd.Series(expected_column_from_index, index=[0, 0, 1, 2, 2, 3]))
 
+def test_neglect_overnight_trips():
+    activities = pd.DataFrame({
+        "unique_id": [1, 1, 1, 1, 2, 2, 2],
+        "trip_id": [np.nan, 1, np.nan, 2, np.nan, 1, np.nan],
+        "is_last_activity": [False, False, False, True, False, False, True],
+        "trip_end_next_day": [False, False, False, True, False, False, False],
+        "timestamp_start": pd.DatetimeIndex([
+            "2023-09-12 00:00", "2023-09-12 08:00", "2023-09-12 09:00", "2023-09-12 23:00",
+            "2023-09-12 00:00", "2023-09-12 08:00", "2023-09-12 09:00"]),
+        "timestamp_end": pd.DatetimeIndex([
+            "2023-09-12 08:00", "2023-09-12 09:00", "2023-09-12 23:00", "2023-09-13 01:00",
+            "2023-09-12 08:00", "2023-09-12 09:00", "2023-09-13 00:00"]),
+    })
 
-def test_drop_redundant_columns(sample_activities, sample_configs):
-    input_data = ParkInference._add_util_attributes(sample_activities)
-    input_data = ParkInference._add_park_act_before_first_trip(input_data, user_config=sample_configs["user_config"])
-    input_data = ParkInference._adjust_park_attrs(input_data)
-    input_data["trip_start_clock"] = pd.NA
-    input_data["trip_start_year"] = pd.NA
-    input_data["trip_start_month"] = pd.NA
-    input_data["trip_start_week"] = pd.NA
-    input_data["trip_start_hour"] = pd.NA
-    input_data["trip_start_minute"] = pd.NA
-    input_data["trip_end_clock"] = pd.NA
-    input_data["trip_end_hour"] = pd.NA
-    input_data["trip_end_minute"] = pd.NA
-    result = ParkInference._drop_redundant_columns(input_data)
+    result = ParkInference._neglect_overnight_trips(activities)
 
-    expected_columns = [
-        "trip_id",
-        "unique_id",
-        "activity_duration",
-        "timestamp_start",
-        "timestamp_end",
-        "park_id",
-        "is_first_activity",
-        "purpose_string",
-    ]
+    assert result.index.tolist() == [0, 1, 2, 4, 5, 6]
+    assert result["is_last_activity"].tolist() == [False, False, True, False, False, True]
+    assert result.loc[2, "timestamp_end"] == pd.Timestamp("2023-09-13 00:00")
 
-    assert all(col in result.columns for col in expected_columns)
 
-    dropped_columns = [
+def test_drop_redundant_columns(sample_activities):
+    input_data = sample_activities.copy()
+    for column in [
         "trip_start_clock",
         "trip_end_clock",
         "trip_start_year",
@@ -161,8 +219,8 @@ def test_drop_redundant_columns(sample_activities, sample_configs):
         "trip_start_minute",
         "trip_end_hour",
         "trip_end_minute",
-        "previous_unique_id",
-        "next_unique_id",
-        "column_from_index",
-    ]
-    assert not any(col in result.columns for col in dropped_columns)
\ No newline at end of file
+    ]:
+        input_data[column] = pd.NA
+    result = ParkInference._drop_redundant_columns(input_data)
+
+    assert result.columns.tolist() == sample_activities.columns.tolist()
@@ -149,3 +149,30 @@ def test_exclude_hours():
     })
 
     pd.testing.assert_frame_equal(result, expected_result)
+
+
+def test_split_clock():
+    hours, minutes = ParseKiD._split_clock(clock=pd.Series(["08:05", "9:30", "23:59"], name="trip_start_clock"))
+
+    pd.testing.assert_series_equal(hours, pd.Series([8, 9, 23], name=0))
+    pd.testing.assert_series_equal(minutes, pd.Series([5, 30, 59], name=2))
+    with pytest.raises(ValueError):
+        ParseKiD._split_clock(clock=pd.Series(["24:00"], name="trip_start_clock"))
+
+    hours, minutes = ParseKiD._split_clock(clock=pd.Series(["08:05", np.nan, ""], name="trip_start_clock"))
+    pd.testing.assert_series_equal(hours, pd.Series([8.0, np.nan, np.nan], name=0))
+    pd.testing.assert_series_equal(minutes, pd.Series([5.0, np.nan, np.nan], name=2))
+
+
+def test_extract_timestamps_missing_clock():
+    trips = pd.DataFrame({'trip_start_date': ['01.09.2023', '02.09.2023'],
+                          'trip_start_clock': ['08:00', np.nan],
+                          'trip_end_clock': ['08:45', '10:00']})
+
+    result = ParseKiD._compose_timestamp(
+        data=ParseKiD._extract_timestamps(trips=trips), col_year="trip_start_year", col_week="trip_start_week",
+        col_day="trip_start_weekday", col_hour="trip_start_hour", col_min="trip_start_minute",
+        col_name="timestamp_start",
+    )
+
+    assert result["timestamp_start"].notna().to_list() == [True, False]
@@ -0,0 +1,79 @@
+__version__ = "1.0.0"
+__maintainer__ = "Fabia Miorelli"
+__birthdate__ = "17.10.2026"
+__status__ = "dev"  # options are: dev, test, prod
+__license__ = "BSD-3-Clause"
+
+import pytest
+import numpy as np
+import pandas as pd
+
+from ....vencopy.core.dataparsers.dataparsers import DataParser
+from ....vencopy.core.dataparsers.parkinference import ParkInference
+from ....vencopy.core.dataparsers.parseVF import ParseVF
+
+# NOT TESTED: process(), _load_unencrypted_data(), _iterate_raw_data(), _harmonise_variables(), __exclude_hours(), __add_string_columns(), _drop_redundant_columns()
+
+
+@pytest.fixture
+def parse_vf_instance():
+    configs = {
+        "user_config": {
+            "global": {"debug": False, "absolute_path": {"VF": "/path/to/VF"}},
+            "dataparsers": {"chunk_size": 3},
+        },
+        "dev_config": {
+            "global": {"files": {"VF": {"trips_data_raw": "trips.dta"}}},
+            "dataparsers": {
+                "data_variables": {
+                    "dataset": ["VF"],
+                    "household_id": ["H_ID"],
+                },
+                "filters": {"VF": {}},
+            },
+        },
+    }
+    return ParseVF(configs=configs, dataset="VF")
+
+
+@pytest.fixture
+def vf_trips():
+    return pd.DataFrame(
+        {
+            "household_id": [1, 1, 2, 2, 2, 2, 3, 3],
+            "vehicle_segment": ["klein", np.nan, np.nan, "mittel", np.nan, "nicht zuzuordnen", np.nan, np.nan],
+            "drivetrain": ["BEV", np.nan, np.nan, "ICEV", np.nan, "ICEV", np.nan, np.nan],
+            "vehicle_id": [11, np.nan, np.nan, 21, np.nan, 22, np.nan, np.nan],
+            "trip_distance": range(8),
+        }
+    )
+
+
+def test_parse_vf_init(parse_vf_instance):
+    assert isinstance(parse_vf_instance, ParseVF)
+    assert isinstance(parse_vf_instance.park_inference, ParkInference)
+
+
+def test_pad_missing_car_segments(parse_vf_instance, vf_trips):
+    parse_vf_instance.trips = vf_trips.copy()
+    parse_vf_instance._ParseVF__pad_missing_car_segments()
+    result = parse_vf_instance.trips
+
+    assert list(result["trip_distance"]) == [0, 1, 2, 3, 4]
+    assert list(result["vehicle_segment"]) == ["klein", "klein", "mittel", "mittel", "mittel"]
+    assert list(result["vehicle_id"]) == [11, 11, 21, 21, 21]
+
+
+def test_pad_missing_car_segments_streamed(parse_vf_instance, vf_trips):
+    parse_vf_instance.trips = vf_trips.copy()
+    parse_vf_instance._ParseVF__pad_missing_car_segments()
+    expected = parse_vf_instance.trips
+
+    for chunk_size in [1, 2, 3, 5]:
+        chunks = [vf_trips.iloc[i : i + chunk_size] for i in range(0, len(vf_trips), chunk_size)]
+        padded_chunks = []
+        for chunk in DataParser._align_chunks(chunks=chunks, id_column="household_id"):
+            parse_vf_instance.trips = chunk.copy()
+            parse_vf_instance._ParseVF__pad_missing_car_segments()
+            padded_chunks.append(parse_vf_instance.trips)
+        pd.testing.assert_frame_equal(pd.concat(padded_chunks), expected)
@@ -7,10 +7,12 @@ __license__ = "BSD-3-Clause"
 
 import pytest
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
-from ...vencopy.core.gridmodellers import GridModeller
+from ...vencopy.core import gridmodellers
+from ...vencopy.core.gridmodellers import GridModeller, LossModel, register_grid_model
 
 
 # TESTS GridModeller class instantiation
@@ -80,3 +82,177 @@ def sample_activities():
 
 #     expected_rated_power = [0, 0, 30]  # Only the last activity should have rated_power unchanged
 #     assert list(charging_instance.activities["rated_power"]) == expected_rated_power
+
+
+# TESTS _inverse_cdf_table and _sample_positions
+def test_inverse_cdf_table():
+    distribution = {"HOME": {3.6: 0.2, 11: 0.2, 22: 0, 0: 0.6}, "WORK": {11: 1, 0: 0}}
+    bounds, powers = GridModeller._inverse_cdf_table(
+        categories=pd.Index(["HOME", "WORK", "OTHER"]), distribution=distribution
+    )
+
+    assert bounds.tolist() == pytest.approx([0.2, 0.4, 0.4, 2.0])
+    assert powers.tolist() == [3.6, 11, 22, 0, 11, 0, 0]
+
+
+def test_sample_positions():
+    distribution = {"HOME": {3.6: 0.2, 11: 0.2, 22: 0, 0: 0.6}, "WORK": {11: 0.5, 0: 0.5}}
+    bounds, powers = GridModeller._inverse_cdf_table(
+        categories=pd.Index(["HOME", "WORK"]), distribution=distribution
+    )
+    codes = np.array([0, 0, 0, 0, 1, 1])
+    uniforms = np.array([[0.1, 0.2, 0.4, 0.99, 0.49, 0.5], [0.5, 0.5, 0.5, 0.5, 0.5, 0.4]])
+
+    result = GridModeller._sample_positions(bounds=bounds, codes=codes, uniforms=uniforms)
+
+    assert powers[result[0]].tolist() == [3.6, 11, 0, 0, 11, 0]
+    assert powers[result[1]].tolist() == [0, 0, 0, 0, 0, 11]
+
+
+# TESTS assign_grid_ensemble
+@pytest.fixture
+def ensemble_configs():
+    configs = {
+        "user_config": {
+            "global": {"dataset": "KiD", "write_output_to_disk": {"grid_output": False}},
+            "gridmodellers": {
+                "grid_model": "probability",
+                "force_last_trip_home": False,
+                "counter_based_random_numbers": False,
+                "minimum_parking_time": 900,
+                "losses": True,
+                "charging_infrastructure_mappings": {},
+                "grid_availability_distribution": {
+                    "DRIVING": {0: 1},
+                    "HOME": {3.6: 0.5, 11: 0.5},
+                    "WORK": {11: 0.5, 22: 0.25, 0: 0.25},
+                },
+                "loss_factor": {"rated_power_0": 0, "rated_power_3.6": 0.1, "rated_power_11": 0.1, "rated_power_22": 0.1},
+            },
+        },
+        "dev_config": {"global": {"activities_data_types": {"rated_power": "float64", "available_power": "float64"}}},
+    }
+    return configs
+
+
+@pytest.fixture
+def ensemble_activities():
+    activities = pd.DataFrame({
+        "unique_id": [1, 1, 1, 2, 2, 2, 3, 3],
+        "park_id": [0, np.nan, 1, 0, np.nan, 1, 0, 1],
+        "trip_id": [np.nan, 1, np.nan, np.nan, 1, np.nan, np.nan, np.nan],
+        "purpose_string": pd.Categorical(["HOME", "DRIVING", "WORK", "HOME", "DRIVING", "HOME", "WORK", "HOME"]),
+        "time_delta": pd.to_timedelta([3600, 600, 600, 3600, 600, 3600, 3600, 3600], unit="s"),
+    })
+    return activities
+
+
+def test_assign_grid_ensemble(ensemble_configs, ensemble_activities):
+    single = GridModeller(configs=ensemble_configs, activities=ensemble_activities.copy())
+    single.assign_grid(seed=3)
+    ensemble = GridModeller(configs=ensemble_configs, activities=ensemble_activities.copy())
+    ensemble.assign_grid_ensemble(number_draws=50, seed=3)
+
+    assert ensemble.ensemble_codes.shape == (8, 50)
+    assert ensemble.ensemble_codes.dtype == np.uint8
+    assert ensemble.ensemble_rated_power.tolist() == [0, 3.6, 11, 22]
+    assert ensemble.ensemble_available_power.tolist() == pytest.approx([0, 3.24, 9.9, 19.8])
+    pd.testing.assert_frame_equal(ensemble.activities, single.activities)
+    for draw in range(50):
+        member = ensemble.ensemble_member(draw=draw)
+        assert member["rated_power"].iloc[[1, 2, 4]].tolist() == [0, 0, 0]
+        assert member["rated_power"].iloc[3] == member["rated_power"].iloc[5]
+    assert len(np.unique(ensemble.ensemble_codes[6])) > 1
+    with pytest.raises(ValueError):
+        ensemble.assign_grid_ensemble(number_draws=0)
+
+
+@pytest.mark.parametrize("counter_based", [False, True])
+def test_assign_grid_ensemble_blocks(ensemble_configs, ensemble_activities, counter_based):
+    ensemble_configs["user_config"]["gridmodellers"]["counter_based_random_numbers"] = counter_based
+    whole = GridModeller(configs=ensemble_configs, activities=ensemble_activities.copy())
+    whole.assign_grid_ensemble(number_draws=20, seed=3)
+    blocked = GridModeller(configs=ensemble_configs, activities=ensemble_activities.copy())
+    blocked.assign_grid_ensemble(number_draws=20, seed=3, values_per_block=24)
+
+    assert blocked.ensemble_codes.dtype == np.uint8
+    np.testing.assert_array_equal(blocked.ensemble_codes, whole.ensemble_codes)
+
+
+# TESTS counter-based random numbers
+def test_counter_uniforms():
+    keys = [np.array([1, 1, 2], dtype=np.uint64), np.array([5, 6, 5], dtype=np.uint64)]
+    result = GridModeller._counter_uniforms(seed=42, keys=keys, number_draws=3)
+
+    assert result.shape == (3, 3)
+    assert ((result >= 0) & (result < 1)).all()
+    assert len(np.unique(result)) == 9
+    np.testing.assert_array_equal(
+        GridModeller._counter_uniforms(seed=42, keys=[key[::-1] for key in keys], number_draws=2), result[:2, ::-1]
+    )
+    assert not np.array_equal(GridModeller._counter_uniforms(seed=43, keys=keys, number_draws=3), result)
+
+
+def test_key_bits():
+    np.testing.assert_array_equal(
+        GridModeller._key_bits(pd.Series([3, 1], dtype="Int64")), GridModeller._key_bits(pd.Series([3.0, 1.0]))
+    )
+    assert len(np.unique(GridModeller._key_bits(pd.Series(["a", "b", "a"])))) == 2
+
+
+def test_assign_grid_counter_based(ensemble_configs, ensemble_activities):
+    ensemble_configs["user_config"]["gridmodellers"]["counter_based_random_numbers"] = True
+    full = GridModeller(configs=ensemble_configs, activities=ensemble_activities.copy())
+    full.assign_grid_ensemble(number_draws=20, seed=7)
+    shard = GridModeller(configs=ensemble_configs, activities=ensemble_activities.iloc[[6, 7, 3, 4, 5]].copy())
+    shard.assign_grid_ensemble(number_draws=20, seed=7)
+
+    np.testing.assert_array_equal(
+        full.ensemble_rated_power[full.ensemble_codes[[6, 7, 3, 4, 5]]],
+        shard.ensemble_rated_power[shard.ensemble_codes],
+    )
+
+
+# TESTS register_grid_model
+def test_register_grid_model(ensemble_configs, ensemble_activities, monkeypatch):
+    monkeypatch.setattr(gridmodellers, "GRID_MODELS", {})
+
+    @register_grid_model("long_parking")
+    def long_parking(columns, user_config, seed):
+        assert columns["purposes"][columns["purpose_codes"]].tolist() == ensemble_activities["purpose_string"].tolist()
+        return np.where(columns["is_park"] & (columns["duration"] >= 3600), 11, 0)
+
+    ensemble_activities["timestamp_start"] = pd.Timestamp("2023-09-12 08:00")
+    ensemble_activities["timestamp_end"] = ensemble_activities["timestamp_start"] + ensemble_activities["time_delta"]
+    ensemble_configs["user_config"]["gridmodellers"]["grid_model"] = "long_parking"
+    grid = GridModeller(configs=ensemble_configs, activities=ensemble_activities)
+    grid.assign_grid()
+
+    assert gridmodellers.GRID_MODELS == {"long_parking": long_parking}
+    assert grid.activities["rated_power"].tolist() == [11, 0, 0, 11, 0, 11, 11, 11]
+    assert grid.activities["available_power"].tolist() == pytest.approx([9.9, 0, 0, 9.9, 0, 9.9, 9.9, 9.9])
+    with pytest.raises(ValueError):
+        register_grid_model("simple")
+
+
+# TESTS LossModel
+def test_loss_model_factors():
+    loss_model = LossModel.from_user_config(
+        grid_config={"loss_factor": {"rated_power_11": 0.1, "rated_power_0": 0, "rated_power_3.6": 0.15}}
+    )
+
+    assert loss_model.rated_powers.tolist() == [0, 3.6, 11]
+    assert loss_model.factors(rated_power=[11, 11.0, 0, 3.6]).tolist() == [0.1, 0.1, 0, 0.15]
+    assert loss_model.available_power(rated_power=[11, 0]).tolist() == pytest.approx([9.9, 0])
+    with pytest.raises(ValueError):
+        loss_model.factors(rated_power=[22])
+
+
+def test_loss_model_curve():
+    loss_model = LossModel.from_user_config(
+        grid_config={"loss_factor": {"rated_power_11": 0.1}, "loss_factor_curve": [[50, 0.2], [0, 0], [22, 0.1]]}
+    )
+
+    result = loss_model.factors(rated_power=[0, 11, 22, 36, 50, 100])
+
+    assert result.tolist() == pytest.approx([0, 0.05, 0.1, 0.15, 0.2, 0.2])
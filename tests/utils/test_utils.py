@@ -9,10 +9,11 @@ import yaml
 import os
 
 from unittest.mock import mock_open, patch
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
-from ...vencopy.utils.utils import load_configs, return_lowest_level_dict_keys, return_lowest_level_dict_values, replace_vec, create_output_folders, create_file_name, write_out
+from ...vencopy.utils.utils import load_configs, return_lowest_level_dict_keys, return_lowest_level_dict_values, replace_vec, compose_epoch_nanoseconds, enforce_schema, column_view, is_first_row_per_vehicle, is_last_row_per_vehicle, ChainIndex, chain_index, create_output_folders, create_file_name, write_out, write_out_columnar, read_columnar, read_columnar_metadata, file_fingerprint
 
 
 @pytest.fixture
@@ -163,6 +164,106 @@ def test_replace_vec():
     assert all(result == expected_result)
 
 
+def test_compose_epoch_nanoseconds():
+    result = compose_epoch_nanoseconds(
+        year=pd.Series([2023, 2024, np.nan]), days=pd.Series([258, 59, 1]), hours=8, minutes=pd.Series([0, 15, 30])
+    )
+    expected_result = pd.to_datetime(["2023-09-16 08:00:00", "2024-02-29 08:15:00", None])
+    pd.testing.assert_index_equal(pd.DatetimeIndex(result.view("datetime64[ns]")), expected_result)
+
+    result = replace_vec(pd.Series(pd.to_datetime(["2024-02-29 13:45:10", None]), index=[3, 5]), hour=0, minute=0)
+    expected_result = pd.Series(pd.to_datetime(["2024-02-29 00:00:10", None]), index=[3, 5])
+    pd.testing.assert_series_equal(result, expected_result)
+    with pytest.raises(ValueError):
+        replace_vec(pd.Series(pd.to_datetime(["2024-02-29 13:45:10"])), year=2023)
+
+
+def test_enforce_schema():
+    data = pd.DataFrame({
+        "unique_id": [10001, 10001, 10002],
+        "trip_id": [np.nan, 1.0, np.nan],
+        "max_battery_level_start": [None, 12.5, None],
+        "purpose_string": ["HOME", "WORK", "HOME"],
+    })
+    schema = {"unique_id": "int32", "trip_id": "Int16", "max_battery_level_start": "float64", "park_id": "Int16"}
+
+    result = enforce_schema(data=data, schema=schema)
+
+    assert result.dtypes.astype(str).to_dict() == {
+        "unique_id": "int32", "trip_id": "Int16", "max_battery_level_start": "float64", "purpose_string": "object"
+    }
+    assert result["trip_id"].isna().tolist() == [True, False, True]
+    assert enforce_schema(data=result, schema=schema) is result
+    with pytest.raises(ValueError):
+        enforce_schema(data=pd.DataFrame({"trip_id": [40000.0]}), schema=schema)
+
+
+def test_column_view():
+    data = pd.DataFrame({"unique_id": [1, 1, 2], "trip_id": [1.0, 2.0, 1.0], "purpose_string": ["HOME", "WORK", "HOME"]})
+    expected_result = data.copy()
+
+    view = column_view(data=data, columns=["unique_id", "trip_id"], writable_columns=["trip_id"])
+
+    assert view.columns.tolist() == ["unique_id", "trip_id"]
+    assert np.shares_memory(view["unique_id"].to_numpy(), data["unique_id"].to_numpy())
+    assert not np.shares_memory(view["trip_id"].to_numpy(), data["trip_id"].to_numpy())
+    view.loc[view["unique_id"] == 2, "trip_id"] = 0
+    view["rated_power"] = 11
+    pd.testing.assert_frame_equal(data, expected_result)
+
+    view = column_view(data=data)
+    view = view.drop(columns="trip_id")
+    view["unique_id"] = view["unique_id"] * 2
+    pd.testing.assert_frame_equal(data, expected_result)
+
+
+def test_first_and_last_row_per_vehicle():
+    unique_ids = pd.Series([3, 3, 3, 1, 2, 2])
+
+    assert is_first_row_per_vehicle(unique_ids=unique_ids).tolist() == [True, False, False, True, True, False]
+    assert is_last_row_per_vehicle(unique_ids=unique_ids).tolist() == [False, False, True, True, False, True]
+    assert is_last_row_per_vehicle(unique_ids=[]).tolist() == []
+
+
+def test_chain_index():
+    data = pd.DataFrame({"unique_id": [3, 3, 3, 1, 2, 2], "trip_id": [np.nan, 1, 2, 1, 2, np.nan]})
+
+    index = chain_index(data=data)
+
+    assert data.attrs["chain_index"] is index
+    assert index.unique_ids.tolist() == [3, 1, 2]
+    assert index.starts.tolist() == [0, 3, 4]
+    assert index.ends.tolist() == [3, 4, 6]
+    assert index.last_rows.tolist() == [2, 3, 5]
+    assert index.is_first_row().tolist() == [True, False, False, True, True, False]
+    assert index.vehicle_numbers().tolist() == [0, 0, 0, 1, 2, 2]
+    assert index.reduce(np.fmin, data["trip_id"]).tolist() == [1, 1, 2]
+    assert index.broadcast([10, 20, 30]).tolist() == [10, 10, 10, 20, 30, 30]
+
+    is_selected = np.array([True, False, True])
+    subset = data.take(index.rows(is_selected))
+    assert subset["unique_id"].tolist() == [3, 3, 3, 2, 2]
+    subset_index = index.select(is_selected)
+    assert subset_index.starts.tolist() == [0, 3]
+    assert subset_index.matches(unique_ids=subset["unique_id"])
+    assert not index.matches(unique_ids=subset["unique_id"])
+    assert chain_index(data=subset.iloc[1:]).starts.tolist() == [0, 2]
+    subset.attrs["chain_index"] = subset_index
+    assert chain_index(data=subset) is subset_index
+
+    chains = pd.DataFrame({"unique_id": ["A", "A", "A", "B", "B", "B"]})
+    chains_index = chain_index(data=chains)
+    reordered = chains.take([0, 3, 1, 4, 2, 5])
+    assert reordered.attrs["chain_index"] is chains_index
+    assert not chains_index.matches(unique_ids=reordered["unique_id"])
+    with pytest.raises(ValueError):
+        chain_index(data=reordered)
+
+    assert ChainIndex.from_unique_ids(unique_ids=[]).number_vehicles == 0
+    with pytest.raises(ValueError):
+        ChainIndex.from_unique_ids(unique_ids=[1, 1, 2, 1])
+
+
 @pytest.fixture
 def sample_configs(tmp_path):
     root_path = tmp_path / "sample_root"
@@ -250,3 +351,36 @@ def test_write_out(tmp_path, capsys):
     captured = capsys.readouterr()
     assert f"Dataset written to {output_path}." in captured.out
 
+
+def test_write_out_columnar(tmp_path):
+    pytest.importorskip("pyarrow")
+    data = pd.DataFrame({
+        "unique_id": [1, 2],
+        "timestamp_start": pd.DatetimeIndex(["2023-09-12 08:00:00", "2023-09-12 09:00:00"]),
+        "purpose_string": ["HOME", "WORK"],
+    }, index=[3, 7])
+    path = tmp_path / "data.feather"
+
+    write_out_columnar(data=data, path=path)
+
+    pd.testing.assert_frame_equal(read_columnar(path=path), data)
+    pd.testing.assert_frame_equal(read_columnar(path=path, memory_map=False), data)
+    assert read_columnar_metadata(path=path) == {}
+    result = read_columnar(path=path)
+    result.loc[3, "unique_id"] = 5
+    assert result.loc[3, "unique_id"] == 5
+
+    write_out_columnar(data=data, path=path, metadata={"filter_definitions": {"include_a": {"values": [1, "b"]}}})
+    pd.testing.assert_frame_equal(read_columnar(path=path), data)
+    assert read_columnar_metadata(path=path) == {"filter_definitions": {"include_a": {"values": [1, "b"]}}}
+
+
+def test_file_fingerprint(tmp_path):
+    path = tmp_path / "file.csv"
+    path.write_text("a,b\n")
+    fingerprint = file_fingerprint(path=path)
+
+    assert fingerprint["name"] == "file.csv"
+    assert fingerprint["size"] == 4
+    assert fingerprint == file_fingerprint(path=path)
+
@@ -2,15 +2,126 @@ __maintainer__ = "Niklas Wulff, Fabia Miorelli"
 __license__ = "BSD-3-Clause"
 
 
+import hashlib
+import json
+import os
+import stat
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 from zipfile import ZipFile
 
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+
+from ...utils.utils import (
+    ChainIndex,
+    column_view,
+    compose_epoch_nanoseconds,
+    create_file_name,
+    enforce_schema,
+    write_out,
+    write_out_columnar,
+    read_columnar,
+    read_columnar_metadata,
+    file_fingerprint,
+    return_lowest_level_dict_keys,
+    return_lowest_level_dict_values,
+)
+from ...utils.metadata import read_metadata_config, write_out_metadata
 
+# Version of the harmonised trips layout, to be increased whenever the parsers change the columns or dtypes of the
+# harmonised trips so that cached trips of earlier versions are not reused
+TRIPS_CACHE_VERSION = 2
+
+
+class SortedKeyIndex:
+    def __init__(self, keys):
+        """
+        Lookup structure over the key column of a table, e.g. the vehicle ID of a vehicles table or the household ID
+        of the trips. The keys are sorted once, lookups are then binary searches and the looked up rows are gathered
+        by position, so that neither hash joins nor groupby transforms are needed. Keys may occur more than once, rows
+        sharing a key form a group in their original order.
+
+        Args:
+            keys (array-like): Key of each row of the indexed table
+        """
+        keys = np.asarray(keys)
+        self.number_rows = len(keys)
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        is_group_start = np.ones(len(keys), dtype=bool)
+        is_group_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        self.group_starts = np.flatnonzero(is_group_start)
+        self.keys = sorted_keys[self.group_starts]
+        self.group_of_sorted_row = np.cumsum(is_group_start) - 1
+
+    def positions(self, keys) -> np.ndarray:
+        """
+        Looks up keys in the index.
+
+        Args:
+            keys (array-like): Keys to look up
+
+        Returns:
+            np.ndarray: Position of the first row of the indexed table with the respective key, -1 if the key is missing
+        """
+        keys = np.asarray(keys)
+        if not len(self.keys):
+            return np.full(len(keys), -1, dtype=np.intp)
+        group = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[group] == keys, self.order[self.group_starts[group]], -1)
+
+    def gather(self, table: pd.DataFrame, keys, index: pd.Index = None) -> pd.DataFrame:
+        """
+        Gathers the rows of the indexed table for the given keys, i.e. the right side of a left join on the key. Rows
+        without match are filled with missing values.
+
+        Args:
+            table (pd.DataFrame): The indexed table, its rows aligned with the keys the index was built from
+            keys (array-like): Keys to look up
+            index (pd.Index, optional): Index of the result. Defaults to None, i.e. a range index.
+
+        Returns:
+            pd.DataFrame: One row of table per key
+        """
+        positions = self.positions(keys=keys)
+        return pd.DataFrame(
+            {
+                column: pd.api.extensions.take(table[column].to_numpy(), positions, allow_fill=True)
+                for column in table.columns
+            },
+            index=index,
+        )
+
+    def first_valid(self, values: pd.Series) -> pd.Series:
+        """
+        Replaces each value by the first non-missing value of its group, equivalent to
+        groupby(keys).transform("first") with the keys the index was built from.
+
+        Args:
+            values (pd.Series): Values aligned with the keys the index was built from
+
+        Returns:
+            pd.Series: Values padded within their group, missing if a group has no value at all
+        """
+        sorted_positions = np.arange(self.number_rows)
+        is_valid_sorted = values.notna().to_numpy()[self.order]
+        first_valid_sorted = np.full(len(self.group_starts), self.number_rows)
+        if self.number_rows:
+            first_valid_sorted = np.minimum.reduceat(
+                np.where(is_valid_sorted, sorted_positions, self.number_rows), self.group_starts
+            )
+        first_valid_sorted = np.append(self.order, -1)[first_valid_sorted]
+        positions = np.empty(self.number_rows, dtype=np.intp)
+        positions[self.order] = first_valid_sorted[self.group_of_sorted_row]
+        return pd.Series(
+            pd.api.extensions.take(values.to_numpy(), positions, allow_fill=True), index=values.index, name=values.name
+        )
 
-from ...utils.utils import create_file_name, write_out, return_lowest_level_dict_keys, return_lowest_level_dict_values
-from ...utils.metadata import read_metadata_config, write_out_metadata
 
 class DataParser:
     def __init__(self, configs: dict, dataset: str):
@@ -47,83 +158,267 @@ class DataParser:
         self.trips = None
         self.activities = None
         self.filters = {}
+        self.columns = None
+        self.simple_filters_applied = False
+        self.filter_mask = None
+        self.filter_definitions = {}
+        self.harmonised_trips = None
         print("Generic file parsing properties set up.")
 
     def _load_data(self):
         """
-        Checks the load_encrypted value and then loads the data specified in self.raw_data_path 
-        and stores it in self.raw_data.
-        Checks the number_of_debug value only takes on those rows in the self.raw_data.
+        Loads the data specified in self.raw_data_path and stores it in self.raw_data. If load_encrypted is set in the
+        user_config, the data is decrypted on the fly from the encrypted zip archive, see _open_raw_file().
+        In debug mode, only the debug sample of the raw data is read, see _load_debug_data().
 
         """
-        number_lines_debug = self.user_config["global"]["number_lines_debug"]
-        load_encrypted = False
-        if load_encrypted:
-            print(f"Starting to retrieve encrypted data file from {self.raw_data_path}.")
-            self._load_encrypted_data(zip_path=self.raw_data_path, path_zip_data=self.raw_data_path)
+        if self.debug:
+            print(f"Starting to retrieve debug sample of data file {self.raw_data_path}.")
+            self._load_debug_data()
         else:
-            print(f"Starting to retrieve local data file from {self.raw_data_path}.")
+            print(f"Starting to retrieve data file {self.raw_data_path}.")
             self._load_unencrypted_data()
-        self.raw_data = self.raw_data.loc[0 : number_lines_debug - 1, :] if self.debug else self.raw_data.copy()
-        if self.debug:
-            print("Running in debug mode.")
+
+    def _load_debug_data(self):
+        """
+        Loads the debug sample of the raw data into self.raw_data. By default, reading stops after the first
+        number_lines_debug rows. If number_vehicles_debug is given in the global section of the user_config, the raw
+        data is streamed instead and number_vehicles_debug vehicles are sampled with all of their trips, so that no
+        trip chain is cut in half.
+        """
+        number_lines_debug = self.user_config["global"]["number_lines_debug"]
+        number_vehicles_debug = self.user_config["global"]["number_vehicles_debug"]
+        id_column = self._raw_id_variable()
+        if number_vehicles_debug and id_column is None:
+            warnings.warn(
+                f"No raw ID variable given for dataset {self.dataset}, sampling of complete vehicles not possible. "
+                f"Reading the first {number_lines_debug} rows instead."
+            )
+        if number_vehicles_debug and id_column is not None:
+            chunk_size = self.user_config["dataparsers"]["chunk_size"] or number_lines_debug
+            self.raw_data = self._sample_complete_ids(
+                chunks=self._iterate_raw_data(chunk_size=chunk_size), id_column=id_column, number_ids=number_vehicles_debug
+            )
+        else:
+            chunks = self._iterate_raw_data(chunk_size=number_lines_debug)
+            self.raw_data = next(chunks)
+            chunks.close()
+        print(f"Running in debug mode, finished loading {len(self.raw_data)} rows of raw data.")
+
+    def _raw_id_variable(self) -> str:
+        """
+        Returns the raw data name of the ID variable given in id_variables_names for the dataset.
+
+        Returns:
+            str: Name of the ID variable in the raw data, None if it is not contained in the raw data
+        """
+        data_variables = self.dev_config["dataparsers"]["data_variables"]
+        id_variable = self.dev_config["dataparsers"]["id_variables_names"][self.dataset]
+        id_column = data_variables[id_variable][data_variables["dataset"].index(self.dataset)]
+        return None if id_column == "NA" else id_column
+
+    @staticmethod
+    def _sample_complete_ids(chunks, id_column: str, number_ids: int) -> pd.DataFrame:
+        """
+        Samples number_ids IDs with all their rows from a stream of chunks via priority reservoir sampling. Each ID
+        gets the hash of its value as priority and the reservoir holds the rows of the number_ids IDs with the lowest
+        priorities seen so far. Thus, the sample is uniform over all IDs, reproducible between runs and independent
+        of the chunk size, while never more than the reservoir and one chunk are held in memory. Rows of an ID
+        spread over several chunks are all kept.
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): Chunks of the raw data
+            id_column (str): Column identifying the vehicles
+            number_ids (int): Number of IDs to sample
+
+        Returns:
+            pd.DataFrame: All rows of the sampled IDs in their original order
+        """
+        sample = None
+        for chunk in chunks:
+            sample = chunk if sample is None else pd.concat([sample, chunk])
+            ids = sample[id_column].unique()
+            if len(ids) > number_ids:
+                priorities = pd.util.hash_array(ids)
+                sampled_ids = ids[np.argpartition(priorities, number_ids - 1)[:number_ids]]
+                sample = sample[sample[id_column].isin(sampled_ids)]
+        return sample.reset_index(drop=True)
+
+    @staticmethod
+    def _align_chunks(chunks, id_column: str):
+        """
+        Re-cuts a stream of chunks so that the rows of an ID are never split between two chunks. The trailing rows
+        of the last ID of each chunk are held back and prepended to the next chunk. Thus, steps working on all rows
+        of an ID, e.g. padding per household, give the same result independent of the chunk size. The rows of each
+        ID have to be adjacent in the raw data.
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): Chunks of the raw data
+            id_column (str): Column identifying the groups of rows that must not be split
+
+        Raises:
+            ValueError: If the rows of an ID are not adjacent in the raw data
+
+        Yields:
+            pd.DataFrame: Chunks ending at an ID boundary
+        """
+        carry_over = None
+        yielded_ids = set()
+        for chunk in chunks:
+            if carry_over is not None:
+                chunk = pd.concat([carry_over, chunk])
+            if chunk.empty:
+                continue
+            ids = chunk[id_column].to_numpy()
+            boundaries = np.flatnonzero(ids != ids[-1])
+            end = boundaries[-1] + 1 if len(boundaries) else 0
+            carry_over = chunk.iloc[end:]
+            if end:
+                complete = chunk.iloc[:end]
+                chunk_ids = set(complete[id_column].unique())
+                if not yielded_ids.isdisjoint(chunk_ids):
+                    raise ValueError(
+                        f"The rows of some values of {id_column} are not adjacent in the raw data, thus the raw data "
+                        "cannot be streamed. Set chunk_size in the dataparsers section of the user_config to None."
+                    )
+                yielded_ids |= chunk_ids
+                yield complete
+        if carry_over is not None and not carry_over.empty:
+            if carry_over[id_column].iloc[0] in yielded_ids:
+                raise ValueError(
+                    f"The rows of some values of {id_column} are not adjacent in the raw data, thus the raw data "
+                    "cannot be streamed. Set chunk_size in the dataparsers section of the user_config to None."
+                )
+            yield carry_over
 
     def _load_unencrypted_data(self) -> pd.DataFrame:
         """
         Loads data specified in self.raw_data_path and stores it in self.raw_data.
+        If self.columns is given, only those columns are read from disk.
         Raises an exception if a invalid suffix is specified in self.raw_data_path.
 
         Returns:
             pd.DataFrame: raw_data
         """
-        if self.raw_data_path.suffix == ".dta":
-            self.raw_data = pd.read_stata(
-                self.raw_data_path,
+        with self._open_raw_file(path=self.raw_data_path) as source:
+            self.raw_data = self._read_raw_data(source=source, suffix=self.raw_data_path.suffix)
+        print(f"Finished loading {len(self.raw_data)} rows of raw data of type {self.raw_data_path.suffix}.")
+        return self.raw_data
+
+    def _read_raw_data(self, source, suffix: str, chunk_size: int = None):
+        """
+        Reads the variables in self.columns (all variables if None) from a Stata or csv source.
+
+        Args:
+            source: Path or file-like object of the raw data
+            suffix (str): File type of the raw data, either .dta or .csv
+            chunk_size (int, optional): If given, a reader iterating over chunks of chunk_size rows is returned
+                instead of the full data. Defaults to None.
+
+        Raises:
+            ValueError: Raised if the file type is not supported
+
+        Returns:
+            Union[pd.DataFrame, StataReader, TextFileReader]: The raw data or a reader over chunks of the raw data
+        """
+        if suffix == ".dta":
+            return pd.read_stata(
+                source,
                 convert_categoricals=False,
                 convert_dates=False,
                 preserve_dtypes=False,
+                columns=self.columns,
+                chunksize=chunk_size,
             )
-        elif self.raw_data_path.suffix == ".csv":
-            self.raw_data = pd.read_csv(self.raw_data_path)
-        else:
-            Exception(
-                f"Data type {self.raw_data_path.suffix} not yet specified. Available types so far are .dta and .csv"
-            )
-        print(f"Finished loading {len(self.raw_data)} rows of raw data of type {self.raw_data_path.suffix}.")
-        return self.raw_data
+        elif suffix == ".csv":
+            return pd.read_csv(source, usecols=self.columns, chunksize=chunk_size)
+        raise ValueError(f"Data type {suffix} not yet specified. Available types so far are .dta and .csv")
 
-    def _load_encrypted_data(self, zip_path, path_zip_data):
+    def _iterate_raw_data(self, chunk_size: int):
         """
-        Function to provide the possibility to access encrypted zip files. 
-        An encryption password has to be given in user_config.yaml in order to access the encrypted file. 
-        Loaded data is stored in self.raw_data.
+        Generator yielding the raw data specified in self.raw_data_path in chunks of chunk_size rows.
 
         Args:
-            zip_path : Path from current working directory to the zip file or absolute path to zipfile
-            path_zip_data : Path to trip data file within the encrypted zipfile
+            chunk_size (int): Number of rows per chunk
+
+        Yields:
+            pd.DataFrame: Chunk of the raw data
         """
-        with ZipFile(zip_path) as myzip:
-            if ".dta" in path_zip_data:
-                self.raw_data = pd.read_stata(
-                    myzip.open(
-                        path_zip_data,
-                        pwd=bytes(self.user_config["dataparsers"]["encryption_password"], encoding="utf-8"),
-                    ),
-                    convert_categoricals=False,
-                    convert_dates=False,
-                    preserve_dtypes=False,
-                )
-            else:  # if '.csv' in path_zip_data:
-                self.raw_data = pd.read_csv(
-                    myzip.open(
-                        path_zip_data,
-                        pwd=bytes(self.user_config["dataparsers"]["encryption_password"], encoding="utf-8"),
-                    ),
-                    sep=";",
-                    decimal=",",
-                )
+        with self._open_raw_file(path=self.raw_data_path) as source, self._read_raw_data(
+            source=source, suffix=self.raw_data_path.suffix, chunk_size=chunk_size
+        ) as reader:
+            for chunk in reader:
+                yield chunk
 
-        print(f"Finished loading {len(self.raw_data)} rows of raw data of type {self.raw_data_path.suffix}.")
+    @contextmanager
+    def _open_raw_file(self, path: Path):
+        """
+        Provides the source a raw data file is read from. Usually, this is the path itself. If load_encrypted is set in
+        the dataparsers section of the user_config, the member with the same file name is opened from the encrypted
+        zip archive specified as encrypted_zip_file for the dataset in the dev_config instead. The member is decrypted
+        with the encryption_password while the readers consume it, so no decrypted copy is written to disk.
+
+        Args:
+            path (Path): Path to the raw data file
+
+        Yields:
+            Union[Path, ZipExtFile]: Source of the raw data
+        """
+        if not self.user_config["dataparsers"]["load_encrypted"]:
+            yield path
+            return
+        zip_path = self._encrypted_zip_path()
+        password = bytes(self.user_config["dataparsers"]["encryption_password"], encoding="utf-8")
+        print(f"Decrypting {path.name} from encrypted archive {zip_path}.")
+        with ZipFile(zip_path) as archive:
+            with archive.open(self._find_zip_member(archive=archive, file_name=path.name), pwd=password) as member:
+                yield member
+
+    def _encrypted_zip_path(self) -> Path:
+        """
+        Returns the path to the encrypted zip archive holding the raw data files of the dataset.
+
+        Returns:
+            Path: Path to the encrypted zip archive
+        """
+        return (
+            Path(self.user_config["global"]["absolute_path"][self.dataset])
+            / self.dev_config["global"]["files"][self.dataset]["encrypted_zip_file"]
+        )
+
+    @staticmethod
+    def _find_zip_member(archive: ZipFile, file_name: str) -> str:
+        """
+        Finds the member of a zip archive with the given file name in any folder of the archive.
+
+        Args:
+            archive (ZipFile): Opened zip archive
+            file_name (str): File name of the member
+
+        Raises:
+            FileNotFoundError: Raised if no member with the given file name exists
+
+        Returns:
+            str: Name of the member within the archive
+        """
+        for member_name in archive.namelist():
+            if Path(member_name).name == file_name:
+                return member_name
+        raise FileNotFoundError(f"File {file_name} not found in archive {archive.filename}.")
+
+    @staticmethod
+    def _read_stata_variables(path: Path) -> list:
+        """
+        Reads the variable names of a Stata file from its header without decoding the data itself.
+
+        Args:
+            path (Path): Path to the Stata file or opened Stata file
+
+        Returns:
+            list: Variable (column) names contained in the file
+        """
+        with pd.read_stata(path, iterator=True) as reader:
+            return list(reader.variable_labels().keys())
 
     def _check_dataset_id(self, dataset: str) -> str:
         """
@@ -198,160 +493,234 @@ class DataParser:
         If a filters is defined with a different key, a warning is thrown.
         Filters are defined inclusively, thus boolean vectors will select
         elements (TRUE) that stay in the data set. The function operates on self.trips class-internally.
+        The simple filters are compiled into a filter plan evaluated in a single pass, the complex filters are
+        evaluated on the remaining trips only. If report_filter_rejections is set in the user_config, the number of
+        trips rejected by each filter is printed additionally.
 
         Args:
             filters (dict, optional): Defaults to None
         """
         print(f"Starting filtering, applying {len(return_lowest_level_dict_keys(filters))} filters.")
 
-        # Application of simple value-based filters
-        simple_filters = self._simple_filters()
-        self.data_simple = self.trips[simple_filters.all(axis="columns")]
-
-        # Application of sophisticated filters
-        complex_filters = self._complex_filters(data=self.data_simple)
-        self.trips = self.data_simple.loc[complex_filters.all(axis="columns"), :]
+        if self.user_config["dataparsers"]["filter_provenance"]:
+            # Keep the harmonised trips and a bitmask of the failed filters per trip for refiltering
+            self.harmonised_trips = self.trips
+            self._update_filter_provenance(filters=filters)
+            kept_rows = np.flatnonzero(self.filter_mask.to_numpy() == 0)
+            if self.user_config["dataparsers"]["report_filter_rejections"]:
+                print("Number of trips rejected per filter:")
+                print(self._provenance_rejections().to_string())
+        else:
+            # Application of simple value-based filters, skipped if they were already applied while streaming the trips
+            if self.simple_filters_applied:
+                kept_rows = np.arange(len(self.trips))
+            else:
+                kept_rows = self._apply_filter_plan(trips=self.trips, plan=self._compile_filter_plan(filters=filters))
+            data_simple = self.trips.iloc[kept_rows]
+
+            # Application of sophisticated filters
+            complex_filters = [function(data_simple).to_numpy() for function in self._complex_filter_functions()]
+            kept_rows = kept_rows[np.logical_and.reduce(complex_filters)] if complex_filters else kept_rows
+            if self.user_config["dataparsers"]["report_filter_rejections"]:
+                self._report_filter_rejections(filters=filters, complex_filters=complex_filters)
 
         # Print user feedback on filtering
-        self._filter_analysis(simple_filters.join(complex_filters))
+        mask = np.zeros(len(self.trips), dtype=bool)
+        mask[kept_rows] = True
+        self._filter_analysis(pd.DataFrame({"all_filters": mask}))
+        self.trips = self.trips.iloc[kept_rows]
 
-    def _simple_filters(self) -> pd.DataFrame:
+    @staticmethod
+    def _compile_filter_plan(filters: dict) -> dict:
         """
-        Apply single-column scalar value filtering as defined in the config.
+        Compiles the include, exclude, greater_than and smaller_than filter dictionaries given in the dev_config into
+        a filter plan that maps each referenced column to the checks applied on it. Thus, each column is read only
+        once when the plan is evaluated by _apply_filter_plan().
+
+        Args:
+            filters (dict): Filter dictionary from the dev_config
 
         Returns:
-            pd.DataFrame: DataFrame with boolean columns for include, exclude, greater_than and smaller_than filters, True
-            means keep the row
+            dict: Mapping of column names to lists of tuples of filter logic and filter values
         """
-        simple_filter = pd.DataFrame(index=self.trips.index)
-
-        # Simple filters checking single columns for specified values
-        for i_key, i_value in self.filters.items():
-            if i_key == "include" and i_value:
-                simple_filter = simple_filter.join(
-                    self._set_include_filter(dataset=self.trips, include_filter_dict=i_value)
-                )
-            elif i_key == "exclude" and i_value:
-                simple_filter = simple_filter.join(
-                    self._set_exclude_filter(dataset=self.trips, exclude_filter_dict=i_value)
-                )
-            elif i_key == "greater_than" and i_value:
-                simple_filter = simple_filter.join(
-                    self._set_greater_than_filter(dataset=self.trips, greater_than_filter_dict=i_value)
-                )
-            elif i_key == "smaller_than" and i_value:
-                simple_filter = simple_filter.join(
-                    self._set_smaller_than_filter(dataset=self.trips, smaller_than_filter_dict=i_value)
-                )
-            elif i_key not in ["include", "exclude", "greater_than", "smaller_than"]:
+        plan = {}
+        for i_key, i_value in filters.items():
+            if i_key not in DataParser._filter_checks:
                 warnings.warn(
                     f"A filter dictionary was defined in the dev_config with an unknown filtering key."
                     f"Current filtering keys comprise include, exclude, smaller_than and greater_than."
                     f"Continuing with ignoring the dictionary {i_key}"
                 )
-        return simple_filter
+                continue
+            for column, elements in (i_value or {}).items():
+                if i_key in ("greater_than", "smaller_than") and len(elements) > 1:
+                    warnings.warn(
+                        f"You specified more than one value as {i_key} limit for filtering column {column}."
+                        f"Only considering the last element given in the dev_config."
+                    )
+                plan.setdefault(column, []).append((i_key, elements))
+        return plan
+
+    # Vectorised checks of the filter logics, True means keep the row
+    _filter_checks = {
+        "include": lambda values, elements: values.isin(elements),
+        "exclude": lambda values, elements: ~values.isin(elements),
+        "greater_than": lambda values, elements: values >= elements[-1],
+        "smaller_than": lambda values, elements: values <= elements[-1],
+    }
 
     @staticmethod
-    def _set_include_filter(dataset: pd.DataFrame, include_filter_dict: dict) -> pd.DataFrame:
+    def _apply_filter_plan(trips: pd.DataFrame, plan: dict) -> np.ndarray:
         """
-        Read-in function for include filter dict from dev_config.yaml
+        Evaluates a filter plan compiled by _compile_filter_plan() column by column. Each column is only evaluated for
+        the rows that were not yet rejected by the previous columns, so that the work shrinks with every column and no
+        intermediate boolean frame of the size of the trips is built.
 
         Args:
-            dataset (pd.DataFrame): dataframe on which the include filter can be added
-            include_filter_dict (dict): Dictionary of include filters defined in dev_config.yaml
+            trips (pd.DataFrame): Trips to filter
+            plan (dict): Filter plan
 
         Returns:
-            pd.DataFrame: Dataframe including the variables specified
+            np.ndarray: Positions of the rows passing all filters
         """
-        inc_filter_cols = pd.DataFrame(index=dataset.index, columns=include_filter_dict.keys())
-        for inc_col, inc_elements in include_filter_dict.items():
-            inc_filter_cols[inc_col] = dataset[inc_col].isin(inc_elements)
-        return inc_filter_cols
+        kept_rows = np.arange(len(trips))
+        for column, checks in plan.items():
+            values = trips[column].iloc[kept_rows]
+            keep = np.ones(len(kept_rows), dtype=bool)
+            for filter_logic, elements in checks:
+                keep &= DataParser._filter_checks[filter_logic](values, elements).to_numpy()
+            kept_rows = kept_rows[keep]
+        return kept_rows
 
-    @staticmethod
-    def _set_exclude_filter(dataset: pd.DataFrame, exclude_filter_dict: dict) -> pd.DataFrame:
+    def _filter_definitions(self, filters: dict) -> dict:
         """
-        Read-in function for exclude filter dict from dev_config.yaml
+        Describes all filters applied by _filter() in a JSON-serialisable way. Simple filters are described by their
+        filter logic, column and values, complex filters by their function name and parameters. Simple filters come
+        first.
 
         Args:
-            dataset (pd.DataFrame): dataframe on which the exclude filter can be added
-            exclude_filter_dict (dict): Dictionary of exclude filters defined in dev_config.yaml
+            filters (dict): Filter dictionary from the dev_config
 
         Returns:
-            pd.DataFrame: Filtered dataframe
-        """
-        excl_filter_cols = pd.DataFrame(index=dataset.index, columns=exclude_filter_dict.keys())
-        for exc_col, exc_elements in exclude_filter_dict.items():
-            excl_filter_cols[exc_col] = ~dataset[exc_col].isin(exc_elements)
-        return excl_filter_cols
-
-    @staticmethod
-    def _set_greater_than_filter(dataset: pd.DataFrame, greater_than_filter_dict: dict):
-        """
-        Read-in function for greater_than filter dict from dev_config.yaml
+            dict: Mapping of filter names to filter definitions
+        """
+        definitions = {}
+        for column, checks in self._compile_filter_plan(filters=filters).items():
+            for filter_logic, elements in checks:
+                definitions[f"{filter_logic}_{column}"] = {
+                    "logic": filter_logic,
+                    "column": column,
+                    "values": list(elements),
+                }
+        for function in self._complex_filter_functions():
+            name = getattr(function, "func", function).__name__
+            definitions[name] = {"function": name, "parameters": getattr(function, "keywords", {})}
+        return definitions
+
+    def _update_filter_provenance(self, filters: dict):
+        """
+        Updates self.filter_mask, a bitmask per trip in self.trips with bit i set if the trip fails the i-th filter of
+        self.filter_definitions. Bits of filters whose definition did not change since the last update are reused, so
+        that only changed filters are evaluated again. As complex filters are evaluated on the trips passing all simple
+        filters, they are evaluated again whenever a simple filter changes.
 
         Args:
-            dataset (pd.DataFrame): dataframe on which the greater than filter can be added
-            greater_than_filter_dict (dict): Dictionary of greater than filters defined in dev_config.yaml
+            filters (dict): Filter dictionary from the dev_config
+
+        Raises:
+            ValueError: Raised if more than 64 filters are defined
+        """
+        definitions = self._filter_definitions(filters=filters)
+        if len(definitions) > 64:
+            raise ValueError(f"The filter bitmask holds up to 64 filters, {len(definitions)} filters were defined.")
+        dtype = np.dtype(f"uint{max(8, 2 ** int(np.ceil(np.log2(max(len(definitions), 1)))))}")
+        previous_definitions = self.filter_definitions if self.filter_mask is not None else {}
+        previous_bits = {name: bit for bit, name in enumerate(previous_definitions)}
+
+        def simple_definitions(all_definitions: dict) -> dict:
+            return {name: value for name, value in all_definitions.items() if "logic" in value}
+
+        simple_changed = simple_definitions(definitions) != simple_definitions(previous_definitions)
+        complex_functions = {getattr(f, "func", f).__name__: f for f in self._complex_filter_functions()}
+        mask = np.zeros(len(self.trips), dtype=dtype)
+        kept_rows = None
+        number_evaluated = 0
+        for bit, (name, definition) in enumerate(definitions.items()):
+            if previous_definitions.get(name) == definition and ("logic" in definition or not simple_changed):
+                failed = (self.filter_mask.to_numpy() >> previous_bits[name]) & 1 == 1
+            elif "logic" in definition:
+                number_evaluated += 1
+                failed = ~self._filter_checks[definition["logic"]](
+                    self.trips[definition["column"]], definition["values"]
+                ).to_numpy()
+            else:
+                number_evaluated += 1
+                if kept_rows is None:
+                    kept_rows = np.flatnonzero(mask == 0)
+                failed = np.zeros(len(self.trips), dtype=bool)
+                failed[kept_rows] = ~complex_functions[name](self.trips.iloc[kept_rows]).to_numpy()
+            mask |= failed.astype(dtype) << dtype.type(bit)
+        self.filter_mask = pd.Series(mask, index=self.trips.index, name="filter_mask")
+        self.filter_definitions = definitions
+        print(f"Evaluated {number_evaluated} of {len(definitions)} filters, reused the remaining from the bitmask.")
+
+    def _provenance_rejections(self) -> pd.Series:
+        """
+        Counts the trips failing each filter from the filter bitmask. Complex filters are counted on the trips passing
+        the simple filters.
 
         Returns:
-            _type_: Filtered dataframe
+            pd.Series: Number of trips rejected per filter
         """
-        greater_than_filter_cols = pd.DataFrame(index=dataset.index, columns=greater_than_filter_dict.keys())
-        for greater_col, greater_elements in greater_than_filter_dict.items():
-            greater_than_filter_cols[greater_col] = dataset[greater_col] >= greater_elements.pop()
-            if len(greater_elements) > 0:
-                warnings.warn(
-                    f"You specified more than one value as lower limit for filtering column {greater_col}."
-                    f"Only considering the last element given in the dev_config."
-                )
-        return greater_than_filter_cols
+        mask = self.filter_mask.to_numpy()
+        return pd.Series(
+            {name: int(((mask >> bit) & 1).sum()) for bit, name in enumerate(self.filter_definitions)}, dtype=int
+        )
 
-    @staticmethod
-    def _set_smaller_than_filter(dataset: pd.DataFrame, smaller_than_filter_dict: dict) -> pd.DataFrame:
+    def _report_filter_rejections(self, filters: dict, complex_filters: list):
         """
-        Read-in function for smaller_than filter dict from dev_config.yaml
+        Prints the number of trips rejected by each filter, named as in _filter_definitions(). Simple filters are
+        counted on all trips, complex filters on the trips remaining after the simple filters. A trip can be rejected
+        by more than one filter. If the simple filters were already applied while streaming the raw data, the trips
+        they rejected are not contained in self.trips anymore and only the complex filters are counted.
 
         Args:
-            dataset (pd.DataFrame): dataframe on which the smaller_than filter can be added
-            smaller_than_filter_dict (dict): Dictionary of smaller than filters defined in dev_config.yaml
-
-        Returns:
-            pd.DataFrame: Filtered dataframe
-        """
-        smaller_than_filter_cols = pd.DataFrame(index=dataset.index, columns=smaller_than_filter_dict.keys())
-        for smaller_col, smaller_elements in smaller_than_filter_dict.items():
-            smaller_than_filter_cols[smaller_col] = dataset[smaller_col] <= smaller_elements.pop()
-            if len(smaller_elements) > 0:
-                warnings.warn(
-                    f"You specified more than one value as upper limit for filtering column {smaller_col}."
-                    f"Only considering the last element given in the dev_config."
-                )
-        return smaller_than_filter_cols
-
-    def _complex_filters(self, data: pd.DataFrame) -> pd.DataFrame:
-        """
-        Collects filters that compare multiple columns or derived variables or calculation results thereof. True
-        in this filter means "keep row". The function needs self.trips to determine the length and the index of the
-        return argument.
+            filters (dict): Filter dictionary applied by _filter()
+            complex_filters (list): Boolean arrays of the complex filters evaluated by _filter(), 'True' means keep
+            the row
+        """
+        rejections = {}
+        if not self.simple_filters_applied:
+            for column, checks in self._compile_filter_plan(filters=filters).items():
+                for filter_logic, elements in checks:
+                    kept = self._filter_checks[filter_logic](self.trips[column], elements).to_numpy()
+                    rejections[f"{filter_logic}_{column}"] = int((~kept).sum())
+        for function, kept in zip(self._complex_filter_functions(), complex_filters):
+            rejections[getattr(function, "func", function).__name__] = int((~kept).sum())
+        print("Number of trips rejected per filter:")
+        if self.simple_filters_applied:
+            print("The simple filters were applied while streaming the raw data, their rejections are not counted.")
+        print(pd.Series(rejections, dtype=int).to_string())
+
+    def _complex_filter_functions(self) -> list:
+        """
+        Collects filters that compare multiple columns or derived variables or calculation results thereof. The
+        filters comparing multiple trips come first.
 
         Returns:
-            pd.DataFrame: DataFrame with a boolean column per complex filter, 'True' means keep the row in the trips
-            data set
+            list: Functions returning a boolean Series for a trips DataFrame, 'True' means keep the row
         """
-        complex_filters = pd.DataFrame(index=data.index)
         lower_speed_threshold = self.dev_config["dataparsers"]["filters"]["lower_speed_threshold"]
         higher_speed_threshold = self.dev_config["dataparsers"]["filters"]["higher_speed_threshold"]
-        complex_filters = complex_filters.join(
-            self._filter_inconsistent_speeds(
-                dataset=data,
+        return [
+            self._filter_overlapping_trips,
+            partial(
+                self._filter_inconsistent_speeds,
                 lower_speed_threshold=lower_speed_threshold,
                 higher_speed_threshold=higher_speed_threshold,
-            )
-        )
-        complex_filters = complex_filters.join(self._filter_inconsistent_travel_times(dataset=data))
-        complex_filters = complex_filters.join(self._filter_overlapping_trips(dataset=data))
-        return complex_filters
+            ),
+            self._filter_inconsistent_travel_times,
+        ]
 
     @staticmethod
     def _filter_inconsistent_speeds(dataset: pd.DataFrame, lower_speed_threshold, higher_speed_threshold) -> pd.Series:
@@ -368,11 +737,9 @@ class DataParser:
         Returns:
             pd.Series: Boolean vector with observations marked True that should be kept in the dataset
         """
-        dataset["average_speed"] = dataset["trip_distance"] / (dataset["travel_time"] / 60)
-        dataset = (dataset["average_speed"] > lower_speed_threshold) & (
-            dataset["average_speed"] <= higher_speed_threshold
-        )
-        return dataset
+        average_speed = dataset["trip_distance"] / (dataset["travel_time"] / 60)
+        average_speed.name = "average_speed"
+        return (average_speed > lower_speed_threshold) & (average_speed <= higher_speed_threshold)
 
     @staticmethod
     def _filter_inconsistent_travel_times(dataset_in: pd.DataFrame) -> pd.Series:
@@ -387,70 +754,50 @@ class DataParser:
         Returns:
             pd.Series: Boolean vector with observations marked True that should be kept in the dataset
         """
-        dataset = dataset_in.copy()
-        dataset["travel_time_ts"] = (
-            (dataset["timestamp_end"] - dataset["timestamp_start"]).dt.total_seconds().div(60).astype(int)
-        )
-        filt = dataset["travel_time_ts"] == dataset["travel_time"]
+        travel_time_ts = (dataset_in["timestamp_end"] - dataset_in["timestamp_start"]).dt.total_seconds().div(60).astype(int)
+        filt = travel_time_ts == dataset_in["travel_time"]
         filt.name = "travel_time"
         return filt
 
     @staticmethod
-    def _filter_overlapping_trips(dataset, lookahead_periods: int = 7) -> pd.DataFrame:
+    def _filter_overlapping_trips(dataset: pd.DataFrame, lookahead_periods: int = None) -> pd.Series:
         """
-        Filter out trips carried out by the same car as next (second next, third next up to period next etc) trip but
-        overlap with at least one of the period next trips.
+        Filter out all trips of vehicles that have at least one trip starting before any of their previous trips
+        ended. For each trip, the latest end timestamp of all previous trips of the same vehicle is determined by a
+        grouped cumulative maximum, so that every overlap within a trip chain is found in a single pass, regardless
+        of the length of the chain. As the timestamps cannot be compared, a trip with a missing start timestamp or
+        following a trip with a missing end timestamp of the same vehicle counts as overlapping.
 
         Args:
-            data (pd.DataFrame): Trip data set including the two variables timestamp_start and timestamp_end
-            characterizing a trip
+            dataset (pd.DataFrame): Trip data set including the variables unique_id, timestamp_start and timestamp_end
+            lookahead_periods (int, optional): Deprecated and ignored, all previous trips of a vehicle are compared.
+                Defaults to None.
 
         Returns:
-            Pandas DataFrame containing periods columns comparing each trip to their following trips. If True, the
-            trip does not overlap with the trip following after period trips (e.g. period==1 signifies no overlap with
-            next trip, period==2 no overlap with second next trip etc.)
+            pd.Series: Boolean vector that is False for all trips of vehicles with overlapping trips
         """
-        lst = []
-        for profile in range(1, lookahead_periods + 1):
-            ser = DataParser._identify_overlapping_trips(dataset, period=profile)
-            ser.name = f"profile={profile}"
-            lst.append(ser)
-        ret = pd.concat(lst, axis=1).all(axis=1)
-        ret.name = "trip_ends_after_next_start"
-
-        d = dataset.copy()
-        d['overlap'] = ret
-        filter_ids = d[['unique_id', 'overlap']].groupby(by='unique_id').all()
-        d['index'] = d.index
-        d = d.set_index('unique_id', drop=False)
-        d['overlap'] = filter_ids
-        d = d.set_index('index')
-        return d['overlap']
-
-    @staticmethod
-    def _identify_overlapping_trips(dataset_in: pd.DataFrame, period: int) -> pd.Series:
-        """
-        Calculates a boolean vector of same length as dat that is True if the current trip does not overlap with
-        the next trip. "Next" can relate to the consecutive trip (if period==1) or to a later trip defined by the
-        period (e.g. for period==2 the trip after next). For determining if an overlap occurs, the end timestamp of the
-        current trip is compared to the start timestamp of the "next" trip.
-
-        Args:
-            dataset (pd.DataFrame): A trip data set containing consecutive trips containing at least the columns id_col,
-                timestamp_start, timestamp_end
-            period (int): Forward looking period to compare trip overlap. Should be the maximum number of trip that one
-                vehicle carries out in a time interval (e.g. day) in the data set
-
-        Returns:
-            pd.Series: A boolean vector that is True if the trip does not overlap with the period-next trip but belongs
-                to the same vehicle
-        """
-        dataset = dataset_in.copy()
-        dataset["is_same_id_as_previous"] = dataset["unique_id"] == dataset["unique_id"].shift(period)
-        dataset["trip_starts_after_previous_trip"] = dataset["timestamp_start"] >= dataset["timestamp_end"].shift(
-            period
+        if lookahead_periods is not None:
+            warnings.warn(
+                "The argument lookahead_periods is deprecated and ignored, trips are compared to all previous trips of "
+                "the same vehicle.",
+                DeprecationWarning,
+            )
+        latest_previous_end = (
+            dataset.groupby("unique_id", sort=False)["timestamp_end"]
+            .cummax()
+            .groupby(dataset["unique_id"], sort=False)
+            .shift(1)
         )
-        return ~(dataset["is_same_id_as_previous"] & ~dataset["trip_starts_after_previous_trip"])
+        is_missing_end = dataset["timestamp_end"].isna()
+        follows_missing_end = is_missing_end.groupby(dataset["unique_id"], sort=False).cumsum() > is_missing_end
+        has_previous_trip = dataset["unique_id"].duplicated()
+        starts_before_previous_end = (dataset["timestamp_start"] < latest_previous_end) | (
+            has_previous_trip & (dataset["timestamp_start"].isna() | follows_missing_end)
+        )
+        overlapping_ids = dataset.loc[starts_before_previous_end, "unique_id"].unique()
+        keep = ~dataset["unique_id"].isin(overlapping_ids)
+        keep.name = "overlap"
+        return keep
 
     @staticmethod
     def _filter_analysis(filter_data: pd.DataFrame):
@@ -479,6 +826,24 @@ class DataParser:
         """
         raise NotImplementedError("A process method for DataParser is not implemented.")
 
+    def _enforce_activities_schema(self):
+        """
+        Casts self.activities to the dtypes declared in
+        dev_config['global']['activities_data_types'] before the activities
+        are handed on to the next stage.
+        """
+        self.activities = enforce_schema(
+            data=self.activities, schema=self.dev_config["global"]["activities_data_types"]
+        )
+
+    def _attach_chain_index(self):
+        """
+        Builds the chain offsets of the final activities and attaches them to
+        self.activities, so that the following stages can access the activity
+        chain of each vehicle by position instead of grouping by unique_id.
+        """
+        self.activities.attrs["chain_index"] = ChainIndex.from_unique_ids(unique_ids=self.activities["unique_id"])
+
     def write_output(self):
         """
         This saves the output from the dataparser class to a csv file.
@@ -568,13 +933,34 @@ class IntermediateParsing(DataParser):
                 del variables[indeces - counter]
                 counter += 1
 
+    def _project_columns(self, available_columns: list, key: str = None) -> list:
+        """
+        Returns the relevant variables in self.columns that are contained in
+        available_columns, e.g. the variables of one of multiple raw data
+        files. If a key is given, it is added to the projection so that the
+        subset can be joined with other files.
+
+        Args:
+            available_columns (list): Variable names available in a raw data file
+            key (str, optional): Join key to be contained in the projection. Defaults to None.
+
+        Returns:
+            list: Subset of self.columns to be read from the raw data file
+        """
+        columns = [i_column for i_column in self.columns if i_column in available_columns]
+        if key is not None and key not in columns:
+            columns.append(key)
+        return columns
+
     def _select_columns(self):
         """
         Function to filter the raw_data for only relevant columns as specified
         by parseConfig and cleaned in self.compileVariablesList().
-        Stores the subset of data in self.trips
+        Stores the subset of data in self.trips and releases self.raw_data. The columns are handed over as a view, as
+        self.raw_data is released right after, self.trips becomes the only owner of the selected column arrays.
         """
-        self.trips = self.raw_data.loc[:, self.columns]
+        self.trips = column_view(data=self.raw_data, columns=self.columns)
+        self.raw_data = None
 
     def _convert_types(self):
         """
@@ -589,31 +975,15 @@ class IntermediateParsing(DataParser):
         self.var_datatype_dict = {key: conversion_dict[key] for key in conversion_dict.keys() & keys}
         self.trips = self.trips.astype(self.var_datatype_dict)
 
-    def _complex_filters(self, data: pd.DataFrame) -> pd.DataFrame:
+    def _complex_filter_functions(self) -> list:
         """
-        Collects filters that compare multiple columns or derived variables or calculation results thereof. True
-        in this filter means "keep row". The function needs self.trips to determine the length and the index of the
-        return argument.
+        Collects filters that compare multiple columns or derived variables or calculation results thereof. The
+        filters comparing multiple trips come first.
 
         Returns:
-            pd.DataFrame: DataFrame with a boolean column per complex filter. True means keep the row in the activities
-            data set
+            list: Functions returning a boolean Series for a trips DataFrame, 'True' means keep the row
         """
-        complex_filters = pd.DataFrame(index=data.index)
-        lower_speed_threshold = self.dev_config["dataparsers"]["filters"]["lower_speed_threshold"]
-        higher_speed_threshold = self.dev_config["dataparsers"]["filters"]["higher_speed_threshold"]
-        complex_filters = complex_filters.join(
-            self._filter_inconsistent_speeds(
-                dataset=self.trips,
-                lower_speed_threshold=lower_speed_threshold,
-                higher_speed_threshold=higher_speed_threshold,
-            )
-        )
-        complex_filters = complex_filters.join(self._filter_inconsistent_travel_times(dataset_in=data))
-        complex_filters = complex_filters.join(self._filter_overlapping_trips(dataset=data))
-        complex_filters = complex_filters.join(self._filter_consistent_hours(dataset=data))
-        complex_filters = complex_filters.join(self._filter_zero_length_trips(dataset=data))
-        return complex_filters
+        return super()._complex_filter_functions() + [self._filter_consistent_hours, self._filter_zero_length_trips]
 
     @staticmethod
     def _filter_consistent_hours(dataset) -> pd.Series:
@@ -654,15 +1024,51 @@ class IntermediateParsing(DataParser):
         """
         Replaces each occurence of a MiD/KiD variable e.g. 1,2,...,7 for
         weekdays with an explicitly mapped string e.g. 'MON', 'TUE',...,'SUN'.
+        The column is stored as a pandas Categorical whose categories are taken
+        from the replacement table, so that chunks and cached trips share the
+        same integer codes.
 
         Args:
             col_name (str): Name of the column in self.trips where the explicit string info is stored
             var_name (str): Name of the venco.py internal variable given in dev_config/dataparsers['data_variables']
         """
-        self.trips.loc[:, col_name] = self.trips.loc[:, var_name].replace(
-            self.dev_config["dataparsers"]["replacements"][self.dataset][var_name]
+        self.trips[col_name] = self._categorical_from_replacements(
+            values=self.trips[var_name],
+            replacements=self.dev_config["dataparsers"]["replacements"][self.dataset][var_name],
         )
 
+    @staticmethod
+    def _categorical_from_replacements(values: pd.Series, replacements: dict) -> pd.Categorical:
+        """
+        Maps survey codes to a Categorical of their replacement strings. The categories are the unique replacement
+        strings in the order of the replacement table, a lookup array holds the category code of each table key.
+        As in a plain replacement, codes not contained in the table are kept, as strings of the codes appended as
+        additional categories, and missing values stay missing. As the additional categories depend on the data, they
+        are unified between chunks by _concat_chunks().
+
+        Args:
+            values (pd.Series): Survey codes
+            replacements (dict): Replacement table mapping survey codes to strings
+
+        Returns:
+            pd.Categorical: Replacement strings of the survey codes
+        """
+        keys = pd.Index(list(replacements.keys()))
+        categories = pd.Index(pd.unique(pd.Series(list(replacements.values()), dtype=object)))
+        key_codes = np.append(categories.get_indexer(list(replacements.values())), -1)
+        positions = keys.get_indexer(values)
+        codes = key_codes[positions]
+        is_unmapped = (positions == -1) & values.notna().to_numpy()
+        if is_unmapped.any():
+            unmapped_codes, unmapped_values = pd.factorize(values.to_numpy()[is_unmapped])
+            unmapped_strings = pd.Index([
+                str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+                for value in unmapped_values
+            ])
+            categories = categories.append(unmapped_strings.difference(categories, sort=False))
+            codes[is_unmapped] = categories.get_indexer(unmapped_strings)[unmapped_codes]
+        return pd.Categorical.from_codes(codes, categories=categories)
+
     @staticmethod
     def _compose_timestamp(
         data: pd.DataFrame = None,
@@ -674,7 +1080,8 @@ class IntermediateParsing(DataParser):
         col_name: str = None,
     ) -> pd.DatetimeIndex:
         """
-        Generating pandas timestamp and storing in a new column
+        Generating pandas timestamp and storing in a new column. The timestamp is composed in int64 epoch
+        nanoseconds from the first of January of the year plus week * 7 + day days, hours and minutes.
 
         Args:
             data (pd.DataFrame, optional): Defaults to None
@@ -688,13 +1095,12 @@ class IntermediateParsing(DataParser):
         Returns:
             pd.DatetimeIndex: modified dataframe with the new column containing the pandas timestamp values
         """
-        data[col_name] = (
-            pd.to_datetime(data.loc[:, col_year], format="%Y")
-            + pd.to_timedelta(data.loc[:, col_week] * 7, unit="days")
-            + pd.to_timedelta(data.loc[:, col_day], unit="days")
-            + pd.to_timedelta(data.loc[:, col_hour], unit="hour")
-            + pd.to_timedelta(data.loc[:, col_min], unit="minute")
-        )
+        data[col_name] = compose_epoch_nanoseconds(
+            year=data[col_year],
+            days=data[col_week] * 7 + data[col_day],
+            hours=data[col_hour],
+            minutes=data[col_min],
+        ).view("datetime64[ns]")
         return data
 
     def _compose_start_and_end_timestamps(self):
@@ -762,3 +1168,325 @@ class IntermediateParsing(DataParser):
                 f"The subset contains only vehicles of the class {segment} for a total of {n_vehicles} individual "
                 f"vehicles."
             )
+
+    def _add_parking_rows(self) -> pd.DataFrame:
+        """
+        Adds the park activities to the filtered trips, see ParkInference.add_parking_rows(). If number_processes is
+        set in the dataparsers section of the user_config, the trips are partitioned by vehicle and processed in that
+        many worker processes with an identical result.
+
+        Returns:
+            pd.DataFrame: Chain of trip and park activities
+        """
+        number_processes = self.user_config["dataparsers"]["number_processes"]
+        if number_processes and number_processes > 1:
+            return self.park_inference.add_parking_rows_partitioned(trips=self.trips, number_processes=number_processes)
+        return self.park_inference.add_parking_rows(trips=self.trips)
+
+    @staticmethod
+    def _run_concurrently(*tasks) -> list:
+        """
+        Runs independent tasks, e.g. reading the trips and the vehicles file of a dataset, concurrently in a thread
+        pool. Decoding the raw data files mostly runs in I/O and compiled pandas routines, so the threads overlap well.
+
+        Args:
+            tasks (Callable): Functions without arguments
+
+        Returns:
+            list: Results of the tasks in the order given
+        """
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = [executor.submit(task) for task in tasks]
+            return [future.result() for future in futures]
+
+    @staticmethod
+    def _join_vehicles(
+        trips: pd.DataFrame, vehicles: pd.DataFrame, on: str, vehicle_index: SortedKeyIndex = None, rsuffix: str = ""
+    ) -> pd.DataFrame:
+        """
+        Left joins the vehicle variables to the trips by gathering the vehicle rows through a SortedKeyIndex on the
+        vehicle key. When joining chunks of trips, the index should be built once and passed as vehicle_index.
+
+        Args:
+            trips (pd.DataFrame): Trips with the vehicle key in column on
+            vehicles (pd.DataFrame): Vehicles indexed by the vehicle key
+            on (str): Name of the vehicle key column in trips
+            vehicle_index (SortedKeyIndex, optional): Index over vehicles.index. Defaults to None, i.e. built here.
+            rsuffix (str, optional): Suffix for vehicle variables also contained in trips. Defaults to "".
+
+        Returns:
+            pd.DataFrame: Trips with the vehicle variables, missing if no vehicle matches
+        """
+        if vehicle_index is None:
+            vehicle_index = SortedKeyIndex(keys=vehicles.index)
+        overlapping_columns = trips.columns.intersection(vehicles.columns)
+        if len(overlapping_columns) and not rsuffix:
+            raise ValueError(f"Columns overlap but no suffix specified: {overlapping_columns.tolist()}")
+        vehicle_variables = vehicle_index.gather(table=vehicles, keys=trips[on], index=trips.index)
+        vehicle_variables.columns = [
+            column + rsuffix if column in overlapping_columns else column for column in vehicle_variables.columns
+        ]
+        return pd.concat([trips, vehicle_variables], axis=1, copy=False)
+
+    def _harmonise_trips(self):
+        """
+        Dataset specific sequence of harmonising, type converting and time stamping the trips in self.raw_data. The
+        result is stored in self.trips. Has to be implemented by the child classes.
+        """
+        raise NotImplementedError("A _harmonise_trips method for IntermediateParsing is not implemented.")
+
+    def _parse_trips(self):
+        """
+        Loads and harmonises the trips. If a chunk_size is given in the dataparsers section of the user_config, the
+        raw data is streamed in chunks instead of being loaded at once.
+        """
+        if self._is_streamed():
+            self._stream_trips(chunk_size=self.user_config["dataparsers"]["chunk_size"])
+        else:
+            self._load_data()
+            self._harmonise_trips()
+
+    def _is_streamed(self) -> bool:
+        """
+        Checks whether the raw data is streamed in chunks, which is the case if a chunk_size is given and venco.py
+        is not run in debug mode, where only a small sample of the raw data is loaded anyway.
+
+        Returns:
+            bool: True if the raw data is streamed
+        """
+        return bool(self.user_config["dataparsers"]["chunk_size"]) and not self.debug
+
+    def _is_prefiltered(self) -> bool:
+        """
+        Checks whether the simple filters are applied to each chunk while streaming the raw data. This is not the case
+        if filter_provenance is set, as the filter bitmask has to cover all harmonised trips so that refiltering with
+        looser thresholds can bring back trips rejected before.
+
+        Returns:
+            bool: True if the simple filters are applied while streaming
+        """
+        return self._is_streamed() and not self.user_config["dataparsers"]["filter_provenance"]
+
+    def _stream_trips(self, chunk_size: int):
+        """
+        Reads the raw data in chunks of chunk_size rows. Each chunk is harmonised and the simple filters (include,
+        exclude, greater_than and smaller_than) are applied before it is appended to self.trips. Thus, the memory
+        needed is bounded by the chunk size and the trips that pass the simple filters, while the complex filters
+        comparing multiple trips are applied on the reduced trips later on. If filter_provenance is set, the simple
+        filters are not applied per chunk and all harmonised trips are kept, see _is_prefiltered().
+
+        Args:
+            chunk_size (int): Number of raw data rows read at once
+        """
+        print(f"Starting to stream data file {self.raw_data_path} in chunks of {chunk_size} rows.")
+        self._check_filter_dict(dictionary=self.filters)
+        filter_plan = self._compile_filter_plan(filters=self.filters) if self._is_prefiltered() else {}
+        number_lines = 0
+        chunks = []
+        for chunk in self._iterate_raw_data(chunk_size=chunk_size):
+            number_lines += len(chunk)
+            self.raw_data = chunk
+            self._harmonise_trips()
+            chunks.append(self.trips.take(self._apply_filter_plan(trips=self.trips, plan=filter_plan)))
+        self.trips = self._concat_chunks(chunks=chunks)
+        if self._is_prefiltered():
+            print(
+                f"Finished streaming {number_lines} rows of raw data in {len(chunks)} chunks, {len(self.trips)} trips "
+                f"passed the simple filters."
+            )
+        else:
+            print(f"Finished streaming {number_lines} rows of raw data in {len(chunks)} chunks.")
+
+    @staticmethod
+    def _concat_chunks(chunks: list) -> pd.DataFrame:
+        """
+        Concatenates the harmonised chunks. The categories of categorical columns can differ between the chunks, e.g.
+        if a chunk contains survey codes missing from the replacement tables. They are unified before concatenating,
+        so that the columns stay categorical with the same categories as if the raw data was read at once.
+
+        Args:
+            chunks (list): Harmonised chunks
+
+        Returns:
+            pd.DataFrame: Concatenated chunks
+        """
+        for column in chunks[0].select_dtypes(include="category").columns:
+            if any(not chunk[column].cat.categories.equals(chunks[0][column].cat.categories) for chunk in chunks):
+                categories = union_categoricals([chunk[column] for chunk in chunks]).categories
+                for chunk in chunks:
+                    chunk[column] = chunk[column].cat.set_categories(categories)
+        return pd.concat(chunks)
+
+    def _load_harmonised_trips(self):
+        """
+        Wrapper function providing the harmonised trips in self.trips before filtering. If cache_trips is set in the
+        dataparsers section of the user_config, the trips are read from a columnar on-disk cache if it exists for the
+        current raw data files and dataparser configuration. Otherwise, the trips are composed via _parse_trips() and
+        written to the cache for later runs. If the trips are streamed, the cached trips already passed the simple
+        filters unless filter_provenance is set, in which case the filter bitmask is stored with the cached trips.
+        """
+        self.simple_filters_applied = self._is_prefiltered()
+        if not self.user_config["dataparsers"]["cache_trips"]:
+            self._parse_trips()
+            return
+        cache_path = self._trips_cache_path()
+        if cache_path.exists():
+            try:
+                self.trips = read_columnar(path=cache_path)
+                if "filter_mask" in self.trips.columns:
+                    self.filter_mask = self.trips.pop("filter_mask")
+                    self.filter_definitions = read_columnar_metadata(path=cache_path)["filter_definitions"]
+                print(f"Finished reading {len(self.trips)} harmonised trips from cache {cache_path}.")
+                return
+            except ImportError:
+                warnings.warn("Reading the trips cache requires pyarrow. Continuing without cache.")
+        self._parse_trips()
+        if self.user_config["dataparsers"]["filter_provenance"]:
+            self._update_filter_provenance(filters=self.filters)
+        self._write_trips_cache(cache_path=cache_path)
+
+    def _write_trips_cache(self, cache_path: Path):
+        """
+        Writes the harmonised trips to the columnar cache. Failing to write the cache does not interrupt parsing.
+
+        Args:
+            cache_path (Path): Location of the cache file
+        """
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        metadata = None
+        if self.filter_mask is not None:
+            self.trips["filter_mask"] = self.filter_mask
+            metadata = {"filter_definitions": self.filter_definitions}
+        try:
+            write_out_columnar(data=self.trips, path=cache_path, metadata=metadata)
+        except ImportError:
+            warnings.warn("Writing the trips cache requires pyarrow. Continuing without cache.")
+        except Exception as e:
+            cache_path.unlink(missing_ok=True)
+            warnings.warn(f"Harmonised trips could not be cached: {e}. Continuing without cache.")
+        finally:
+            self.trips.drop(columns="filter_mask", inplace=True, errors="ignore")
+
+    def refilter_trips(self, filters: dict = None) -> pd.DataFrame:
+        """
+        Applies changed filters to the harmonised trips kept from the last filtering, e.g. for filter sensitivity
+        studies. Only the filters whose definition changed are evaluated again, all other results are taken from the
+        filter bitmask. Changed speed thresholds are read from the dev_config. Requires filter_provenance to be set in
+        the dataparsers section of the user_config.
+
+        Args:
+            filters (dict, optional): Filter dictionary replacing self.filters. Defaults to None, i.e. self.filters.
+
+        Raises:
+            ValueError: Raised if no harmonised trips were kept from a previous filtering
+
+        Returns:
+            pd.DataFrame: Trips passing all filters
+        """
+        if self.harmonised_trips is None:
+            raise ValueError(
+                "No harmonised trips to refilter, the trips have to be filtered with filter_provenance set before."
+            )
+        if filters is not None:
+            self._check_filter_dict(dictionary=filters)
+            self.filters = filters
+        self.trips = self.harmonised_trips
+        self._filter(filters=self.filters)
+        return self.trips
+
+    def _trips_cache_path(self) -> Path:
+        """
+        Composes the location of the cache file from the cache key. Trips parsed from encrypted raw data are cached
+        in a private temporary folder.
+
+        Returns:
+            Path: Location of the cache file
+        """
+        if self.user_config["dataparsers"]["load_encrypted"]:
+            folder = self._private_cache_folder()
+        else:
+            folder = (
+                Path(self.user_config["global"]["absolute_path"]["vencopy_root"])
+                / self.dev_config["global"]["relative_path"]["parse_cache"]
+            )
+        return folder / f"trips_{self.dataset}_{self._trips_cache_key()}.feather"
+
+    @staticmethod
+    def _private_cache_folder() -> Path:
+        """
+        Returns the per-user cache folder (vencopy in XDG_CACHE_HOME, by default ~/.cache/vencopy) that is only
+        accessible by the current user. It holds the trips parsed from encrypted raw data, which must not end up in the
+        output folder. The folder is refused unless it is a real directory (not a symbolic link) owned by the current
+        user with mode 0o700.
+
+        Raises:
+            PermissionError: Raised if the folder is a symbolic link, not a directory, owned by another user or
+            accessible by other users.
+
+        Returns:
+            Path: Path to the private cache folder
+        """
+        folder = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "vencopy"
+        folder.mkdir(mode=0o700, parents=True, exist_ok=True)
+        status = os.lstat(folder)
+        if not stat.S_ISDIR(status.st_mode):
+            raise PermissionError(f"The trips cache folder {folder} is not a directory.")
+        if hasattr(os, "getuid") and status.st_uid != os.getuid():
+            raise PermissionError(f"The trips cache folder {folder} is owned by another user.")
+        if stat.S_IMODE(status.st_mode) != 0o700:
+            raise PermissionError(
+                f"The trips cache folder {folder} is accessible by other users, restrict it to mode 0o700."
+            )
+        return folder
+
+    def _trips_cache_key(self) -> str:
+        """
+        Calculates a key identifying the harmonised trips. It combines the fingerprints of the raw data files with all
+        dev_config and user_config options that are applied before filtering (and the simple filters if the trips are
+        streamed), the chunk size, the version of the harmonised trips layout (TRIPS_CACHE_VERSION) and the pandas
+        version, which determine the dtypes of the harmonised trips. Thus, the cache is invalidated if any of them
+        changes.
+
+        Returns:
+            str: Hexadecimal hash
+        """
+        dataparsers_config = self.dev_config["dataparsers"]
+        key_items = {
+            "cache_version": TRIPS_CACHE_VERSION,
+            "pandas_version": pd.__version__,
+            "dataset": self.dataset,
+            "raw_data": [file_fingerprint(path=path) for path in self._raw_data_origin()],
+            "data_variables": dataparsers_config["data_variables"],
+            "id_variables_names": dataparsers_config["id_variables_names"][self.dataset],
+            "input_data_types": dataparsers_config["input_data_types"][self.dataset],
+            "replacements": dataparsers_config["replacements"][self.dataset],
+            "simple_filters": self.filters if self.simple_filters_applied else None,
+            "chunk_size": self.user_config["dataparsers"]["chunk_size"],
+            "debug": self.debug,
+            "number_lines_debug": self.user_config["global"]["number_lines_debug"] if self.debug else None,
+            "number_vehicles_debug": self.user_config["global"]["number_vehicles_debug"] if self.debug else None,
+        }
+        return hashlib.sha1(json.dumps(key_items, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+    def _raw_data_origin(self) -> list:
+        """
+        Returns the files the raw data is read from, i.e. the encrypted zip archive if load_encrypted is set and the
+        raw data files otherwise.
+
+        Returns:
+            list: List of paths
+        """
+        if self.user_config["dataparsers"]["load_encrypted"]:
+            return [self._encrypted_zip_path()]
+        return self._raw_data_paths()
+
+    def _raw_data_paths(self) -> list:
+        """
+        Returns the paths of all raw data files of the dataset.
+
+        Returns:
+            list: List of paths to the trips and, if given, vehicles raw data files
+        """
+        folder = Path(self.user_config["global"]["absolute_path"][self.dataset])
+        files = self.dev_config["global"]["files"][self.dataset]
+        return [folder / files[file_id] for file_id in ("trips_data_raw", "vehicles_data_raw") if file_id in files]
@@ -2,9 +2,14 @@ __maintainer__ = "Niklas Wulff, Fabia Miorelli"
 __license__ = "BSD-3-Clause"
 
 
+import io
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+import numpy as np
 import pandas as pd
 
-from ...utils.utils import replace_vec
+from ...utils.utils import ChainIndex, column_view, is_first_row_per_vehicle, is_last_row_per_vehicle, replace_vec
 
 
 class ParkInference:
@@ -38,25 +43,8 @@ class ParkInference:
         """
         self.trips = trips
         split_overnight_trips = self.user_config["dataparsers"]["split_overnight_trips"]
-        self.activities_raw = self._copy_rows(trips=self.trips)
-        self.activities_raw = self._add_util_attributes(
-            activities_raw=self.activities_raw
-        )
-        self.activities_raw = self._add_park_act_before_first_trip(
-            activities_raw=self.activities_raw, user_config=self.user_config
-        )
-        self.activities_raw = self._adjust_park_attrs(
-            activities_raw=self.activities_raw
-        )
-        self.activities_raw = self._drop_redundant_columns(
-            activities_raw=self.activities_raw
-        )
-        self.activities_raw = self._remove_next_day_park_acts(
-            activities_raw=self.activities_raw
-        )
-        self.__adjust_park_timestamps()
-        self.activities_raw = self._add_next_and_prev_ids(
-            activities_raw=self.activities_raw
+        self.activities_raw = self._build_activity_chains(
+            trips=self._drop_redundant_columns(trips=self.trips), user_config=self.user_config
         )
         self.activities_raw = self._add_first_trip_park_columns(self.activities_raw)
         self.activities_raw = self.__overnight_split_decider(
@@ -66,114 +54,81 @@ class ParkInference:
             activities_raw=self.activities_raw
         )
         self.activities_raw = self._unique_indeces(activities_raw=self.activities_raw)
-        print(
-            f'Finished activity composition with {self.activities_raw["trip_id"].fillna(0).astype(bool).sum()} trips '
-            f'and {self.activities_raw["park_id"].fillna(0).astype(bool).sum()} parking activites.'
-        )
+        self.__report_composition()
         return self.activities_raw
 
-    @staticmethod
-    def _copy_rows(trips: pd.DataFrame):
-        """
-        Adds skeleton duplicate rows for parking activities.
-
-        Args:
-            trips (pd.DataFrame): Trip chain data set containing multiple unique_ids
-
-        Returns:
-            activities_raw (pd.DataFrame): Raw data set with a copy of each trip added behind the individual trip.
-        """
-        activities_raw = pd.concat([trips] * 2).sort_index(ignore_index=True)
-        activities_raw["park_id"] = activities_raw["trip_id"]
-        activities_raw.loc[range(1, len(activities_raw), 2), "trip_id"] = pd.NA
-        activities_raw.loc[range(0, len(activities_raw), 2), "park_id"] = pd.NA
-        return activities_raw
-
-    @staticmethod
-    def _add_util_attributes(activities_raw: pd.DataFrame):
+    def add_parking_rows_partitioned(self, trips: pd.DataFrame, number_processes: int) -> pd.DataFrame:
         """
-        Adding additional attribute columns with previous and next unique_id.
+        Partitioned variant of add_parking_rows(). The trips are cut at vehicle boundaries into contiguous shards of
+        about equal numbers of trips, i.e. ranges of unique_id for trips ordered by vehicle. Each shard is turned into
+        activity chains (including the overnight split) in a separate process, the shards are then concatenated in
+        their original order. As all steps only work within the chain of a vehicle, the result is identical to
+        add_parking_rows(). The share of merged overnight trip distance is checked once on the concatenated
+        activities, the progress messages of the shards are replaced by the ones of a serial run.
 
         Args:
-            activities_raw (pd.DataFrame): A raw chain of trip and park activities
+            trips (pd.DataFrame): Trip chain data set from a travel survey, ordered by vehicle
+            number_processes (int): Number of worker processes and shards
 
         Returns:
-            pd.DataFrame: Returns a chain of trip and park activities with additional attributes
+            pd.DataFrame: Chain of trip and park activities with a range index
         """
-        activities_raw["previous_unique_id"] = activities_raw["unique_id"].shift(
-            fill_value=0
-        )
-        activities_raw["is_first_activity"] = (
-            activities_raw["previous_unique_id"] != activities_raw["unique_id"]
-        )
-        activities_raw["next_unique_id"] = activities_raw["unique_id"].shift(
-            -1, fill_value=0
-        )
-        activities_raw["is_last_activity"] = (
-            activities_raw["next_unique_id"] != activities_raw["unique_id"]
-        )
-        return activities_raw
+        bounds = self._shard_bounds(unique_ids=trips["unique_id"], number_shards=number_processes)
+        if len(bounds) <= 2:
+            return self.add_parking_rows(trips=trips)
+        self.trips = trips
+        shards = [trips.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [executor.submit(_add_parking_rows_to_shard, self.user_config, shard) for shard in shards]
+            results = [future.result() for future in futures]
+        self.activities_raw = pd.concat([activities for activities, _ in results], ignore_index=True)
+        print("Completed activity chain construction.")
+        if self.user_config["dataparsers"]["split_overnight_trips"]:
+            self.overnight_splitter.activities = self.activities_raw
+            self.overnight_splitter.check_and_assert(
+                activities=self.activities_raw,
+                merged_distance=np.concatenate([merged_distance for _, merged_distance in results]),
+            )
+        self.__report_composition()
+        return self.activities_raw
 
     @staticmethod
-    def _add_park_act_before_first_trip(activities_raw: pd.DataFrame, user_config):
+    def _shard_bounds(unique_ids: pd.Series, number_shards: int) -> np.ndarray:
         """
-        Adds park activities before first trips. Currently, it is assumed that all cars start home.
-
+        Computes the row bounds of at most number_shards contiguous shards of about equal size, which are only cut
+        between the rows of two vehicles.
 
         Args:
-            activities_raw (pd.DataFrame): _description_
+            unique_ids (pd.Series): Vehicle ID of each row, rows of the same vehicle have to be adjacent
+            number_shards (int): Maximum number of shards
 
         Returns:
-            _type_: _description_
+            np.ndarray: Positions of the first row of each shard followed by the number of rows
         """
-        dataset = user_config["global"]["dataset"]
-        new_indeces = activities_raw.index[activities_raw["is_first_activity"]]
-        df_add = activities_raw.loc[new_indeces, :]
-        df_add["park_id"] = 0
-        df_add["purpose_string"] = user_config["dataparsers"][
-            "location_park_before_first_trip"
-        ][dataset]
-        activities_raw.loc[new_indeces, "is_first_activity"] = False
-        activities_raw = pd.concat([activities_raw, df_add]).sort_index()
-        activities_raw.loc[
-            (activities_raw["is_first_activity"]) & (activities_raw["park_id"] == 0),
-            "trip_id",
-        ] = pd.NA
-        return activities_raw
+        index = ChainIndex.from_unique_ids(unique_ids=unique_ids)
+        vehicle_bounds = np.append(index.starts, index.number_rows)
+        targets = np.linspace(0, index.number_rows, number_shards + 1)
+        return np.unique(vehicle_bounds[np.searchsorted(vehicle_bounds, targets)])
 
-    @staticmethod
-    def _adjust_park_attrs(activities_raw: pd.DataFrame) -> pd.DataFrame:
-        """
-        Sets trip attribute values to zero where trip_id == NaN (i.e. for all parking activities).
-
-        Args:
-            activities_raw (pd.DataFrame): _description_
-
-        Returns:
-            pd.DataFrame: _description_
-        """
-        activities_raw.loc[
-            activities_raw["trip_id"].isna(),
-            ["trip_distance", "travel_time", "trip_is_intermodal"],
-        ] = pd.NA
-        activities_raw["column_from_index"] = activities_raw.index
-        activities_raw = activities_raw.sort_values(
-            by=["column_from_index", "park_id", "trip_id"]
+    def __report_composition(self):
+        print(
+            f'Finished activity composition with {self.activities_raw["trip_id"].fillna(0).astype(bool).sum()} trips '
+            f'and {self.activities_raw["park_id"].fillna(0).astype(bool).sum()} parking activites.'
         )
-        return activities_raw
 
     @staticmethod
-    def _drop_redundant_columns(activities_raw: pd.DataFrame) -> pd.DataFrame:
+    def _drop_redundant_columns(trips: pd.DataFrame) -> pd.DataFrame:
         """
-        Removes temporary redundant columns.
+        Removes the clock and date component columns that are redundant once the timestamps are composed, so that
+        they are not carried into the activity chains.
 
         Args:
-            activities_raw (pd.DataFrame): _description_
+            trips (pd.DataFrame): Trip chain data set from a travel survey.
 
         Returns:
-            activities_raw (pd.DataFrame): _description_
+            pd.DataFrame: Trips without the redundant columns
         """
-        activities_raw.drop(
+        return trips.drop(
             columns=[
                 "trip_start_clock",
                 "trip_end_clock",
@@ -184,180 +139,127 @@ class ParkInference:
                 "trip_start_minute",
                 "trip_end_hour",
                 "trip_end_minute",
-                "previous_unique_id",
-                "next_unique_id",
-                "column_from_index",
-            ],
-            inplace=True,
-        )
-        return activities_raw
-
-    @staticmethod
-    def _remove_next_day_park_acts(activities_raw: pd.DataFrame) -> pd.DataFrame:
-        """
-        Checks for trips across day-limit and removing respective parking activities after ovenight trips.
-
-        Args:
-            activities_raw (pd.DataFrame): _description_
-
-        Returns:
-            pd.DataFrame: _description_
-        """
-        indeces_multi_day_activities = (
-            activities_raw["is_last_activity"]
-            & activities_raw["trip_end_next_day"]
-            & activities_raw["park_id"]
-        )
-        unique_ids = activities_raw.loc[indeces_multi_day_activities, "unique_id"]
-        trip_ids = (
-            activities_raw.loc[
-                activities_raw["unique_id"].isin(unique_ids), ["unique_id", "trip_id"]
             ]
-            .groupby(by=["unique_id"])
-            .max()
         )
-        idx = [(i, trip_ids.loc[i].values[0]) for i in trip_ids.index]
-        activities_raw = activities_raw.loc[~indeces_multi_day_activities, :]
-        acts = activities_raw.copy().set_index(["unique_id", "trip_id"], drop=True)
-        acts.loc[idx, "is_last_activity"] = True
-        activities_raw = acts.reset_index()
-        return activities_raw
-
-    def __adjust_park_timestamps(self):
-        """
-        Adjust the start and end timestamps of the newly added rows. This is done via range index, that is reset at
-        the beginning. First and last activities have to be treated separately since their dates have to match with
-        their daily activity chain.
-        """
-        self.activities_raw = self.activities_raw.reset_index(drop=True)
-        park_act_wo_first, park_act_wo_last = self._get_park_acts_wo_first_and_last(activities_raw=self.activities_raw)
-        self.activities_raw = self._update_park_start(activities_raw=self.activities_raw,park_act_wo_first=park_act_wo_first)
-        self.activities_raw = self._update_park_end(activities_raw=self.activities_raw, park_act_wo_last=park_act_wo_last)
-        self.activities_raw = self._update_timestamp_first_park_act(activities_raw=self.activities_raw)
-        self.activities_raw = self._update_timestamp_last_park_act(activities_raw=self.activities_raw)
-        print("Completed park timestamp adjustments.")
 
     @staticmethod
-    def _get_park_acts_wo_first_and_last(activities_raw: pd.DataFrame) -> pd.DataFrame:
+    def _chain_layout(unique_ids: np.ndarray, trip_ids: np.ndarray, trip_end_next_day: np.ndarray) -> dict:
         """
-        Returns all parking activities except for the last one (return argument 1) and the first one (return argument
-        2)
+        Computes the positions of all trip and park activities in the activity chains, given the trips ordered by
+        vehicle. Each vehicle chain starts with a park activity before its first trip (park_id 0) and each trip is
+        followed by a park activity, except for the last trip of a vehicle if that trip ends on the next day.
 
         Args:
-            activities_raw (pd.DataFrame): _description_
+            unique_ids (np.ndarray): Vehicle ID of each trip
+            trip_ids (np.ndarray): Trip ID of each trip
+            trip_end_next_day (np.ndarray): Whether each trip ends on the next day
 
         Returns:
-            pd.DataFrame: Parking activity indices without the last one and parking activity indices without the first one
-        """
-        park_act = ~activities_raw["park_id"].isna()
-        park_act = park_act.loc[park_act]
-        return park_act.iloc[1:], park_act.iloc[:-1]
+            dict: Index of the source trip of each activity ("source") and boolean masks over the activities for
+                trips ("is_trip"), park activities before the first trip ("is_first_park") and park activities after
+                a trip ("is_park_after_trip"), as well as the first and last activity of each vehicle
+                ("is_first_activity", "is_last_activity")
+        """
+        number_trips = len(unique_ids)
+        is_first_trip = is_first_row_per_vehicle(unique_ids=unique_ids)
+        is_last_trip = is_last_row_per_vehicle(unique_ids=unique_ids)
+        has_park_after_trip = ~(is_last_trip & trip_end_next_day & (trip_ids != 0))
+
+        activities_per_trip = 1 + is_first_trip.astype(np.intp) + has_park_after_trip
+        trip_positions = np.cumsum(activities_per_trip) - activities_per_trip + is_first_trip
+        number_activities = int(activities_per_trip.sum())
+        layout = {"source": np.repeat(np.arange(number_trips), activities_per_trip)}
+        for name in ("is_trip", "is_first_park", "is_park_after_trip", "is_first_activity", "is_last_activity"):
+            layout[name] = np.zeros(number_activities, dtype=bool)
+        layout["is_trip"][trip_positions] = True
+        layout["is_first_park"][trip_positions[is_first_trip] - 1] = True
+        layout["is_park_after_trip"][trip_positions[has_park_after_trip] + 1] = True
+        layout["is_first_activity"] = layout["is_first_park"]
+        last_positions = trip_positions[is_last_trip] + has_park_after_trip[is_last_trip]
+        layout["is_last_activity"][last_positions] = True
+        return layout
 
     @staticmethod
-    def _update_park_start(
-        activities_raw: pd.DataFrame, park_act_wo_first: pd.Series
-    ) -> pd.DataFrame:
+    def _build_activity_chains(trips: pd.DataFrame, user_config: dict) -> pd.DataFrame:
         """
-        Updates park start timestamps for newly added rows.
+        Builds the chains of trip and park activities from the trips in a single pass. The positions of all
+        activities are computed once per vehicle (see _chain_layout()), all trip attributes are then gathered into
+        the activities at their final positions. Park activities carry the attributes of the preceding trip, except
+        for trip_distance, travel_time and trip_is_intermodal. The park activity before the first trip of a vehicle
+        gets park_id 0 and the purpose given in location_park_before_first_trip in the user_config. Park activities
+        last from the end of the preceding to the start of the next trip, the first park activity starts and the last
+        park activity ends at midnight. Finally, the activity IDs as well as the IDs of the next and previous activity
+        within each vehicle chain are set.
 
         Args:
-            activities_raw (pd.DataFrame): _description_
-            park_act_wo_first (pd.Series): _description_
+            trips (pd.DataFrame): Trips ordered by vehicle (unique_id) and trip
+            user_config (dict): The user_config dictionary
 
         Returns:
-            pd.DataFrame: _description_
+            pd.DataFrame: Activity chains with a range index
         """
-        set_timestamp = activities_raw.loc[park_act_wo_first.index - 1, "timestamp_end"]
-        set_timestamp.index = activities_raw.loc[
-            park_act_wo_first.index, "timestamp_start"
-        ].index
-        activities_raw.loc[park_act_wo_first.index, "timestamp_start"] = set_timestamp
-        return activities_raw
-
-    @staticmethod
-    def _update_park_end(
-        activities_raw: pd.DataFrame, park_act_wo_last: pd.Series
-    ) -> pd.DataFrame:
-        """
-        Updates park end timestamps for newly added rows.
-
-        Args:
-            activities_raw (pd.DataFrame): _description_
-            park_act_wo_last (pd.Series): _description_
-
-        Returns:
-            pd.DataFrame: _description_
-        """
-        set_timestamp = activities_raw.loc[
-            park_act_wo_last.index + 1, "timestamp_start"
-        ]
-        set_timestamp.index = activities_raw.loc[
-            park_act_wo_last.index, "timestamp_end"
-        ].index
-        activities_raw.loc[park_act_wo_last.index, "timestamp_end"] = set_timestamp
-        return activities_raw
-
-    @staticmethod
-    def _update_timestamp_first_park_act(activities_raw: pd.DataFrame) -> pd.DataFrame:
-        """
-        Updates park end timestamps for last activity in new park rows.
-
-        Args:
-            activities_raw (pd.DataFrame): _description_
-
-        Returns:
-            pd.DataFrame: _description_
-        """
-        indeces_activities = ~(activities_raw["park_id"].isna()) & (
-            activities_raw["is_first_activity"]
-        )
-        activities_raw.loc[indeces_activities, "timestamp_start"] = replace_vec(
-            activities_raw.loc[indeces_activities, "timestamp_end"], hour=0, minute=0
-        )
-        return activities_raw
-
-    @staticmethod
-    def _update_timestamp_last_park_act(activities_raw: pd.DataFrame) -> pd.DataFrame:
-        """
-        Updates park end timestamps for last activity in new park rows
-
-        Args:
-            activities_raw (pd.DataFrame): _description_
-
-        Returns:
-            pd.DataFrame: _description_
-        """
-        indeces_activities = ~(activities_raw["park_id"].isna()) & (
-            activities_raw["is_last_activity"]
-        )
-        activities_raw.loc[indeces_activities, "timestamp_end"] = replace_vec(
-            activities_raw.loc[indeces_activities, "timestamp_start"], hour=0, minute=0
+        dataset = user_config["global"]["dataset"]
+        purpose = user_config["dataparsers"]["location_park_before_first_trip"][dataset]
+        trip_ids = trips["trip_id"].to_numpy(dtype=float)
+        layout = ParkInference._chain_layout(
+            unique_ids=trips["unique_id"].to_numpy(),
+            trip_ids=trip_ids,
+            trip_end_next_day=trips["trip_end_next_day"].to_numpy(dtype=bool),
+        )
+        source = layout["source"]
+        is_trip = layout["is_trip"]
+        columns = ["unique_id", "trip_id"] + [column for column in trips.columns if column not in ("unique_id", "trip_id")]
+        activities_raw = trips[columns].take(source).reset_index(drop=True)
+
+        activities_raw["trip_id"] = np.where(is_trip, trip_ids[source], np.nan)
+        activities_raw["park_id"] = np.where(
+            layout["is_park_after_trip"], trip_ids[source], np.where(layout["is_first_park"], 0, np.nan)
+        )
+        activities_raw["is_first_activity"] = layout["is_first_activity"]
+        activities_raw["is_last_activity"] = layout["is_last_activity"]
+        purposes = activities_raw.get("purpose_string", pd.Series(None, index=activities_raw.index, dtype=object))
+        if isinstance(purposes.dtype, pd.CategoricalDtype):
+            if purpose not in purposes.cat.categories:
+                purposes = purposes.cat.add_categories([purpose])
+            codes = purposes.cat.codes.to_numpy().copy()
+            codes[layout["is_first_park"]] = purposes.cat.categories.get_loc(purpose)
+            purposes = pd.Series(pd.Categorical.from_codes(codes, dtype=purposes.dtype))
+        else:
+            purposes = purposes.where(~layout["is_first_park"], purpose)
+        activities_raw["purpose_string"] = purposes
+        for column in ("trip_distance", "travel_time", "trip_is_intermodal"):
+            if column in activities_raw.columns:
+                activities_raw[column] = activities_raw[column].where(is_trip)
+            else:
+                activities_raw[column] = np.nan
+
+        # Park activities last from the end of the previous to the start of the next trip
+        timestamp_start = activities_raw["timestamp_start"].to_numpy()
+        timestamp_end = activities_raw["timestamp_end"].to_numpy()
+        is_park = ~is_trip
+        is_last_park = is_park & layout["is_last_activity"]
+        is_middle_park = layout["is_park_after_trip"] & ~is_last_park
+        next_start = np.roll(timestamp_start, -1)
+        park_start = np.where(layout["is_park_after_trip"], timestamp_end, timestamp_start)
+        park_end = np.where(layout["is_first_park"] | is_middle_park, next_start, timestamp_end)
+        activities_raw["timestamp_start"] = np.where(is_park, park_start, timestamp_start)
+        activities_raw["timestamp_end"] = np.where(is_park, park_end, timestamp_end)
+        activities_raw.loc[layout["is_first_park"], "timestamp_start"] = replace_vec(
+            activities_raw.loc[layout["is_first_park"], "timestamp_end"], hour=0, minute=0
+        )
+        activities_raw.loc[is_last_park, "timestamp_end"] = replace_vec(
+            activities_raw.loc[is_last_park, "timestamp_start"], hour=0, minute=0
         ) + pd.Timedelta(1, "d")
-        return activities_raw
-
-    @staticmethod
-    def _add_next_and_prev_ids(activities_raw: pd.DataFrame) -> pd.DataFrame:
-        """
-        _summary_
-
-        Args:
-            activities_raw (pd.DataFrame): _description_
 
-        Returns:
-            pd.DataFrame: _description_
-        """
-        activities_raw.loc[~activities_raw["trip_id"].isna(), "activity_id"] = (
-            activities_raw["trip_id"]
+        activity_ids = np.where(is_trip, activities_raw["trip_id"], activities_raw["park_id"])
+        activities_raw["activity_id"] = activity_ids
+        activities_raw["next_activity_id"] = np.where(
+            layout["is_last_activity"], np.nan, np.roll(activity_ids, -1)
         )
-        activities_raw.loc[~activities_raw["park_id"].isna(), "activity_id"] = (
-            activities_raw["park_id"]
+        activities_raw["previous_activity_id"] = np.where(
+            layout["is_first_activity"], np.nan, np.roll(activity_ids, 1)
         )
-        activities_raw.loc[~activities_raw["is_last_activity"], "next_activity_id"] = (
-            activities_raw.loc[:, "activity_id"].shift(-1)
-        )
-        activities_raw.loc[
-            ~activities_raw["is_first_activity"], "previous_activity_id"
-        ] = activities_raw.loc[:, "activity_id"].shift(1)
+        print("Completed activity chain construction.")
         return activities_raw
 
     def __overnight_split_decider(self, split: bool):
@@ -393,31 +295,17 @@ class ParkInference:
         Returns:
             pd.DataFrame: _description_
         """
-        indeces_last_activity_is_trip = (activities_raw["is_last_activity"]) & ~(
-            activities_raw["trip_id"].isna()
-        )
-        idx_last_trip_end_midnight = (
-            indeces_last_activity_is_trip
-            & (
-                activities_raw.loc[
-                    indeces_last_activity_is_trip, "timestamp_end"
-                ].dt.hour
-                == 0
-            )
-            & (
-                activities_raw.loc[
-                    indeces_last_activity_is_trip, "timestamp_end"
-                ].dt.minute
-                == 0
-            )
-        )
-        unique_id_last_trip_end_midnight = activities_raw.loc[
-            idx_last_trip_end_midnight, "unique_id"
-        ]
-        activities_raw.loc[
-            activities_raw["unique_id"].isin(unique_id_last_trip_end_midnight.unique()),
-            "trip_end_next_day",
-        ] = False
+        unique_ids = activities_raw["unique_id"].to_numpy()
+        is_last_row = is_last_row_per_vehicle(unique_ids=unique_ids)
+        timestamp_end = activities_raw["timestamp_end"]
+        is_last_trip_end_midnight = (
+            is_last_row
+            & activities_raw["trip_id"].notna().to_numpy()
+            & (timestamp_end.dt.hour == 0).to_numpy()
+            & (timestamp_end.dt.minute == 0).to_numpy()
+        )
+        vehicle_numbers = np.cumsum(is_first_row_per_vehicle(unique_ids=unique_ids)) - 1
+        activities_raw.loc[is_last_trip_end_midnight[is_last_row][vehicle_numbers], "trip_end_next_day"] = False
         return activities_raw
 
     @staticmethod
@@ -433,53 +321,58 @@ class ParkInference:
         Returns:
             _type_: _description_
         """
-        # Column for lastActivity setting later
-        activities_raw["next_trip_end_next_day"] = activities_raw[
-            "trip_end_next_day"
-        ].shift(-1, fill_value=False)
-
         # Get rid of overnight trips
         indeces_no_overnight_trip = ~(
             activities_raw["trip_end_next_day"].fillna(False)
         )
         activities_raw = activities_raw.loc[indeces_no_overnight_trip, :]
 
-        # Update is_last_activity and timestamp_end variables and clean-up column
-        indeces_new_last_activity = activities_raw["next_trip_end_next_day"]
-        indeces_new_last_activity = indeces_new_last_activity.fillna(False).astype(bool)
+        # Update is_last_activity and timestamp_end of activities that became the last one of their vehicle
+        indeces_new_last_activity = (
+            is_last_row_per_vehicle(unique_ids=activities_raw["unique_id"]) & ~activities_raw["is_last_activity"]
+        )
         activities_raw.loc[indeces_new_last_activity, "is_last_activity"] = True
         activities_raw.loc[indeces_new_last_activity, "timestamp_end"] = replace_vec(
             activities_raw.loc[indeces_new_last_activity, "timestamp_start"],
             hour=0,
             minute=0,
         ) + pd.Timedelta(1, "d")
-        activities_raw = activities_raw.drop(columns=["next_trip_end_next_day"])
         return activities_raw
 
     def _add_first_trip_park_columns(self, activities_raw: pd.DataFrame):
-        activities_raw = self._is_first_trip(activities_raw=activities_raw)
-        activities_raw = self._is_first_park_activity(activities_raw=activities_raw)
+        """
+        Flags the first trip and the first park activity of each vehicle. Both are determined on the chain offsets of
+        the activities, the ID columns are moved to the front (unique_id, park_id, trip_id).
+
+        Args:
+            activities_raw (pd.DataFrame): Activity chains ordered by vehicle
+
+        Returns:
+            pd.DataFrame: Activity chains with the columns is_first_trip and is_first_park_activity
+        """
+        index = ChainIndex.from_unique_ids(unique_ids=activities_raw["unique_id"])
+        id_columns = ["unique_id", "park_id", "trip_id"]
+        activities_raw = column_view(
+            data=activities_raw,
+            columns=id_columns + [column for column in activities_raw.columns if column not in id_columns],
+        )
+        activities_raw = self._is_first_trip(activities_raw=activities_raw, chain_index=index)
+        activities_raw = self._is_first_park_activity(activities_raw=activities_raw, chain_index=index)
         return activities_raw
 
     @staticmethod
-    def _is_first_trip(activities_raw: pd.DataFrame):
-        acts_idx = activities_raw.set_index(['unique_id', 'trip_id'])
-        first_trip = activities_raw[['unique_id', 'trip_id']].groupby(by='unique_id').min(numeric_only=True)
-        first_trip['is_first_trip'] = True
-        first_trip = first_trip.set_index('trip_id', append=True)
-        acts_idx['is_first_trip'] = first_trip  # index comprehension
-        acts_idx['is_first_trip'] = acts_idx['is_first_trip'].fillna(value=False)
-        return acts_idx.reset_index()
+    def _is_first_trip(activities_raw: pd.DataFrame, chain_index: ChainIndex):
+        trip_ids = activities_raw["trip_id"].to_numpy(dtype=float)
+        first_trip_ids = chain_index.reduce(np.fmin, trip_ids)
+        activities_raw["is_first_trip"] = trip_ids == chain_index.broadcast(first_trip_ids)
+        return activities_raw
 
     @staticmethod
-    def _is_first_park_activity(activities_raw: pd.DataFrame):
-        acts_idx = activities_raw.set_index(['unique_id', 'park_id'])
-        first_park = activities_raw[['unique_id', 'park_id']].groupby(by='unique_id').min(numeric_only=True)
-        first_park['is_first_park_activity'] = True
-        first_park = first_park.set_index('park_id', append=True)
-        acts_idx['is_first_park_activity'] = first_park  # index comprehension
-        acts_idx['is_first_park_activity'] = acts_idx['is_first_park_activity'].fillna(value=False)
-        return acts_idx.reset_index()
+    def _is_first_park_activity(activities_raw: pd.DataFrame, chain_index: ChainIndex):
+        park_ids = activities_raw["park_id"].to_numpy(dtype=float)
+        first_park_ids = chain_index.reduce(np.fmin, park_ids)
+        activities_raw["is_first_park_activity"] = park_ids == chain_index.broadcast(first_park_ids)
+        return activities_raw
 
     @staticmethod
     def _add_timedelta_column(activities_raw: pd.DataFrame):
@@ -519,6 +412,8 @@ class OvernightSplitter:
         """
         self.activities_raw = None  # internally used until merge of morning splits
         self.activities = None  # internally used for merged data
+        self.merged_distance = None  # distances of the morning parts merged into the first trips
+        self.check_merged_distance = True  # disabled for shards, which are checked once after concatenation
 
     def split_overnight_trips(self, activities_raw: pd.DataFrame) -> pd.DataFrame:
         """
@@ -539,385 +434,179 @@ class OvernightSplitter:
         These edge cases are documented and quantified in issue #358 'Sum of all distances of dataParser at end equals
         sum of all distances after filtering'.
 
+        The split itself is computed on the column arrays and the chain offsets (see _overnight_split_kernel()), the
+        activities are then gathered once into their final order.
+
         Args:
-            activities_raw (pd.DataFrame): _description_
+            activities_raw (pd.DataFrame): Activity chains as built by ParkInference, ordered by vehicle
 
         Returns:
-            pd.DataFrame: _description_
+            pd.DataFrame: Activity chains with split overnight trips and a range index
         """
         self.activities_raw = activities_raw
-
-        # Split overnight trips and adjust last trip variables accordingly
-        is_overnight_trip, overnight_trips_add, ON_uids = (
-            self.__get_overnight_activities()
-        )
-        ON_trips_add_timestamp = self.__adjust_overnight_timestamps(
-            trips=overnight_trips_add
-        )
-        self.__set_last_activities_end_timestamp_to_zero()
-
-        # Adjust morning split trips (trip_id=0) and their variables
-        morning_trips = self.__set_overnight_trip_id_to_zero(
-            trips=ON_trips_add_timestamp
-        )
-        morning_trips = self.__adjust_morning_trip_distance(
-            overnightTrips=overnight_trips_add, morning_trips=morning_trips
-        )
-
-        self.__adjust_evening_trip_distance(
-            morning_trips=morning_trips, is_overnight_trip=is_overnight_trip
-        )
-        morning_trips = self.__set_morning_trips_first_last_acts(
-            morning_trips=morning_trips
-        )
-        is_prev_first_acts = self.__get_prev_first_act(
-            morning_trips=morning_trips
-        )  # Parking activities that are still first activities in the activities data set
-        morning_trips_no_overlap, is_prev_first_acts = (
-            self.__neglect_overlap_morning_trips(
-                morning_trips=morning_trips, is_prev_first_acts=is_prev_first_acts
-            )
-        )  # neglect morning split trips that overlap with first trip
-        self.__set_first_parking_timestamp_start(
-            morning_trips=morning_trips_no_overlap,
-            is_overnight_trip=is_overnight_trip,
-            is_prev_first_acts=is_prev_first_acts,
-        )
-        morning_trips_to_add = self.__set_morning_split_act_id_zero(
-            morning_trips=morning_trips_no_overlap
-        )
-        self.__set_is_first_trip_false(ids=ON_uids)
-        self.__add_morning_trips(morning_trips=morning_trips_to_add)
-        # self.__remove_first_parking_act() DEPRECATED
-        neglected_trips = self.__merge_adjacent_trips()
-        # Implement DELTA mileage check of overnight morning split trip distances
-        self.__check_and_assert(neglected_trips=neglected_trips)
-        self.__clean_up_columns()
-        self.__sort_activities()
-
+        index = ChainIndex.from_unique_ids(unique_ids=activities_raw["unique_id"])
+        columns = {
+            "unique_id": activities_raw["unique_id"].to_numpy(),
+            "trip_id": activities_raw["trip_id"].to_numpy(dtype=float),
+            "activity_id": activities_raw["activity_id"].to_numpy(dtype=float),
+            "next_activity_id": activities_raw["next_activity_id"].to_numpy(dtype=float),
+            "previous_activity_id": activities_raw["previous_activity_id"].to_numpy(dtype=float),
+            "is_first_activity": activities_raw["is_first_activity"].to_numpy(dtype=bool),
+            "is_last_activity": activities_raw["is_last_activity"].to_numpy(dtype=bool),
+            "is_first_trip": activities_raw["is_first_trip"].to_numpy(dtype=bool),
+            "trip_end_next_day": activities_raw["trip_end_next_day"].to_numpy(dtype=bool),
+            "timestamp_start": activities_raw["timestamp_start"].to_numpy(dtype="datetime64[ns]"),
+            "timestamp_end": activities_raw["timestamp_end"].to_numpy(dtype="datetime64[ns]"),
+            "trip_distance": activities_raw["trip_distance"].to_numpy(dtype=float),
+        }
+        split = self._overnight_split_kernel(chain_index=index, columns=columns)
+        self.activities = activities_raw.take(split["source"]).reset_index(drop=True)
+        for column in columns:
+            if column in split:
+                self.activities[column] = split[column]
+        if "trip_purpose" in self.activities.columns:
+            self.activities["trip_purpose"] = activities_raw["trip_purpose"].take(split["purpose_source"]).to_numpy()
+        self.merged_distance = split["merged_distance"]
+        if self.check_merged_distance:
+            self.check_and_assert(activities=self.activities, merged_distance=self.merged_distance)
         return self.activities
 
-    def __get_overnight_activities(self) -> tuple[pd.Series, pd.DataFrame, pd.Series]:
-        """
-        _summary_
-
-        Returns:
-            tuple[pd.Series, pd.DataFrame]: _description_
-        """
-        indeces_overnight_actvities = (
-            self.activities_raw["is_last_activity"]
-            & self.activities_raw["trip_end_next_day"]
-            & ~(
-                (self.activities_raw["timestamp_end"].dt.hour == 0)
-                & (
-                    self.activities_raw["timestamp_end"].dt.minute == 0
-                )  # assure that the overnight trip does
-            )
-        )  # not exactly end at 00:00
-        overnight_activities = self.activities_raw.loc[indeces_overnight_actvities, :]
-        return (
-            indeces_overnight_actvities,
-            overnight_activities,
-            overnight_activities["unique_id"],
-        )
-
-    def __adjust_overnight_timestamps(self, trips: pd.DataFrame) -> pd.DataFrame:
-        """
-        _summary_
-
-        Args:
-            trips (pd.DataFrame): _description_
-
-        Returns:
-            pd.DataFrame: _description_
-        """
-        tripsRes = trips.copy()
-        tripsRes["timestamp_end"] = tripsRes.loc[:, "timestamp_end"] - pd.Timedelta(
-            1, "d"
-        )
-        tripsRes["timestamp_start"] = replace_vec(
-            tripsRes.loc[:, "timestamp_end"], hour=0, minute=0
-        )
-        return tripsRes
-
-    def __set_last_activities_end_timestamp_to_zero(self):
-        """
-        _summary_
-        """
-        # Set timestamp end of evening part of overnight trip split to 00:00
-        self.activities_raw.loc[
-            self.activities_raw["is_last_activity"], "timestamp_end"
-        ] = replace_vec(
-            self.activities_raw.loc[
-                self.activities_raw["is_last_activity"], "timestamp_end"
-            ],
-            hour=0,
-            minute=0,
-        )
-
-    def __set_overnight_trip_id_to_zero(self, trips: pd.DataFrame) -> pd.DataFrame:
-        """
-        _summary_
-
-        Args:
-            trips (pd.DataFrame): _description_
-
-        Returns:
-            pd.DataFrame: _description_
-        """
-        trips["trip_id"] = 0
-        trips["activity_id"] = 0
-        trips["previous_activity_id"] = pd.NA
-
-        # Update next activity ID
-
-        # SUPPOSEDLY DEPRECATED / OVERLY COMPLEX PART
-        # unique_id = trips["unique_id"]
-        # act_idx = self.activities_raw["unique_id"].isin(unique_id) & self.activities_raw["is_first_activity"]
-        # trips["next_activity_id"] = self.activities_raw.loc[act_idx, "activity_id"]
-
-        # overnight morning splits are always first activities and thus the ones before park activities with park_id=0
-        trips["next_activity_id"] = 0
-
-        # Update previous activity ID of previously first activity
-        act_idx = (
-            self.activities_raw["unique_id"].isin(trips["unique_id"])
-            & self.activities_raw["is_first_activity"]
-        )
-        self.activities_raw.loc[act_idx, "previous_activity_id"] = 0
-        return trips
-
-    def __adjust_morning_trip_distance(
-        self, overnightTrips: pd.DataFrame, morning_trips: pd.DataFrame
-    ) -> pd.DataFrame:
-        """
-        _summary_
-
-        Args:
-            overnightTrips (pd.DataFrame): _description_
-            morning_trips (pd.DataFrame): _description_
-
-        Returns:
-            pd.DataFrame: _description_
-        """
-        # Splitting the total distance to morning and evening trip time-share dependent
-        morning_trips["timedelta_total"] = (
-            overnightTrips["timestamp_end"] - overnightTrips["timestamp_start"]
-        )
-        morning_trips["timedelta_morning"] = (
-            morning_trips["timestamp_end"] - morning_trips["timestamp_start"]
-        )
-        morning_trips["time_share_morning"] = (
-            morning_trips["timedelta_morning"] / morning_trips["timedelta_total"]
-        )
-        morning_trips["time_share_evening"] = (
-            morning_trips["timedelta_total"] - morning_trips["timedelta_morning"]
-        ) / morning_trips["timedelta_total"]
-        morning_trips["total_trip_distance"] = morning_trips["trip_distance"]
-        morning_trips["trip_distance"] = (
-            morning_trips["time_share_morning"] * morning_trips["total_trip_distance"]
-        )
-        return morning_trips
-
-    def __adjust_evening_trip_distance(
-        self, morning_trips: pd.DataFrame, is_overnight_trip: pd.Series
-    ):
-        """
-        _summary_
-
-        Args:
-            morning_trips (pd.DataFrame): _description_
-            is_overnight_trip (pd.Series): _description_
-        """
-        self.activities_raw.loc[is_overnight_trip, "trip_distance"] = (
-            morning_trips["time_share_evening"] * morning_trips["total_trip_distance"]
-        )
-
-    def __set_morning_trips_first_last_acts(
-        self, morning_trips: pd.DataFrame
-    ) -> pd.DataFrame:
-        """
-        _summary_
-
-        Args:
-            morning_trips (pd.DataFrame): _description_
-        """
-        # Setting first and last activities
-        morning_trips["is_first_activity"] = True
-        morning_trips["is_first_trip"] = True
-        morning_trips["is_last_activity"] = False
-        return morning_trips
-
-    def __get_prev_first_act(self, morning_trips: pd.DataFrame):
-        """
-        _summary_
-
-        Args:
-            morning_trips (pd.DataFrame): _description_
-
-        Returns:
-            _type_: _description_
-        """
-        return (
-            self.activities_raw["unique_id"].isin(morning_trips["unique_id"])
-            & self.activities_raw["is_first_activity"]
-        )
-
-    def __neglect_overlap_morning_trips(
-        self, morning_trips: pd.DataFrame, is_prev_first_acts: pd.DataFrame
-    ) -> tuple[pd.DataFrame, pd.Series]:
-        """
-        _summary_
-
-        Args:
-            morning_trips (pd.DataFrame): _description_
-            is_prev_first_acts (pd.DataFrame): _description_
-
-        Returns:
-            tuple[pd.DataFrame, pd.Series]: _description_
-        """
-        # Option 1 of treating overlaps: After concatenation in the end
-
-        on_uids = morning_trips["unique_id"]  # overnight day unique ids
-        first_park_end = self.activities_raw.loc[
-            (self.activities_raw["unique_id"].isin(on_uids))
-            & (self.activities_raw["is_first_park_activity"]),
-            "timestamp_end",
-        ].copy()
-        first_park_end.index = morning_trips.index  # Adjust index for comparison
-
-        # Filter out morning parts of overnight trip split for persons that already have morning trips in that period
-        neglect_overnight = first_park_end < morning_trips["timestamp_end"]
-        morning_trips_no_overlap = morning_trips.loc[~neglect_overnight, :]
-
-        # Filter out neglected activities from prev_first_acts accordingly
-        indeces_neglect_overnight = neglect_overnight
-        indeces_neglect_overnight.index = is_prev_first_acts[
-            is_prev_first_acts
-        ].index  # Align index for filtering
-        indeces_neglect_overnight = indeces_neglect_overnight[indeces_neglect_overnight]
-        is_prev_first_acts[indeces_neglect_overnight.index] = False
-
-        return morning_trips_no_overlap, is_prev_first_acts
-
-    def __set_first_parking_timestamp_start(
-        self,
-        morning_trips: pd.DataFrame,
-        is_overnight_trip: pd.Series,
-        is_prev_first_acts: pd.Series,
-    ) -> pd.DataFrame:
-        """
-        Sets start timestamp of previously first activity (parking) to end timestamp of morning split of overnight trip.
-
-        Args:
-            morning_trips (pd.DataFrame): _description_
-            is_overnight_trip (pd.Series): _description_
-            is_prev_first_acts (pd.DataFrame): _description_
+    @staticmethod
+    def _overnight_split_kernel(chain_index: ChainIndex, columns: dict) -> dict:
+        """
+        Splits the overnight trips of activity chains laid out as by ParkInference._build_activity_chains(), i.e. each
+        chain starts with park activity 0 followed by the first trip. Overnight trips are last activities ending on
+        the next day, but not exactly at 00:00. Their evening part ends at 00:00, their morning part is shifted to
+        00:00 until the end of the trip on the survey day and becomes the first activity of its chain (trip_id and
+        activity_id 0). The park activity that was the first activity then starts at the end of the morning part.
+        Morning parts overlapping with the first trip are neglected (edge case 1), morning parts ending exactly at the
+        start of the first trip are merged into it and the park activity in between is removed (edge case 2). As
+        before, the vehicles with an overnight trip get previous_activity_id 0 for their former first activity and
+        lose the is_first_trip flag of their former first trip in any case. The morning parts are spliced into their
+        chains at the positions given by the order of unique_id and timestamp_start, a stable sort is only needed if
+        the chains are not ordered by start time.
+
+        Args:
+            chain_index (ChainIndex): Chain offsets of the activities
+            columns (dict): Column arrays of the activities with the keys unique_id, trip_id, activity_id,
+                next_activity_id, previous_activity_id, is_first_activity, is_last_activity, is_first_trip,
+                trip_end_next_day, timestamp_start, timestamp_end and trip_distance
 
         Returns:
-            pd.DataFrame: _description_
-        """
-        timestamp_new = morning_trips["timestamp_end"].copy()
-        timestamp_new.index = self.activities_raw.loc[
-            is_prev_first_acts, "timestamp_start"
-        ].index
-        self.activities_raw.loc[is_prev_first_acts, "timestamp_start"] = timestamp_new
-        self.activities_raw.loc[is_prev_first_acts, "is_first_activity"] = False
-
-    def __set_morning_split_act_id_zero(
-        self, morning_trips: pd.DataFrame
-    ) -> pd.DataFrame:
-        """
-        The first parking activity id is always 0. The exception of morning split trip and
-        first trip exactly touching is treated later.
-
-        Args:
-            morning_trips (pd.DataFrame): Morning split trips as rows with venco.py variables
-                in columns.
+            dict: Row of the activities each result row is taken from ("source"), the result arrays of all columns
+                that change, the row of the activities whose trip_purpose each result row carries ("purpose_source")
+                and the total distance of the morning parts merged into first trips ("merged_distance")
+        """
+        starts = chain_index.starts
+        number_rows = chain_index.number_rows
+        unique_ids = columns["unique_id"]
+        timestamp_start = columns["timestamp_start"].copy()
+        timestamp_end = columns["timestamp_end"].copy()
+        trip_distance = columns["trip_distance"].copy()
+        previous_activity_id = columns["previous_activity_id"].copy()
+        is_first_activity = columns["is_first_activity"].copy()
+        is_first_trip = columns["is_first_trip"].copy()
+
+        # Overnight trips and the time-share dependent split of their distances
+        time_of_day_end = timestamp_end - timestamp_end.astype("datetime64[D]")
+        ends_at_midnight = time_of_day_end < np.timedelta64(1, "m")
+        overnight = np.flatnonzero(columns["is_last_activity"] & columns["trip_end_next_day"] & ~ends_at_midnight)
+        vehicles = chain_index.vehicle_numbers()[overnight]
+        first_rows = starts[vehicles]
+        morning_end = timestamp_end[overnight] - np.timedelta64(1, "D")
+        morning_start = replace_vec(morning_end, hour=0, minute=0).to_numpy()
+        duration = timestamp_end[overnight] - timestamp_start[overnight]
+        morning_duration = morning_end - morning_start
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share_morning = morning_duration / duration
+            share_evening = (duration - morning_duration) / duration
+        morning_distance = share_morning * trip_distance[overnight]
+        trip_distance[overnight] = share_evening * trip_distance[overnight]
+        last_rows = chain_index.last_rows
+        timestamp_end[last_rows] = replace_vec(timestamp_end[last_rows], hour=0, minute=0).to_numpy()
+
+        # Morning parts become the first activities, unless they overlap with the first trip (edge case 1)
+        is_kept = ~(timestamp_end[first_rows] < morning_end)
+        previous_activity_id[first_rows] = 0
+        has_overnight_trip = np.zeros(chain_index.number_vehicles, dtype=bool)
+        has_overnight_trip[vehicles] = True
+        is_first_trip[chain_index.broadcast(has_overnight_trip) & is_first_trip] = False
+        timestamp_start[first_rows[is_kept]] = morning_end[is_kept]
+        is_first_activity[first_rows[is_kept]] = False
+
+        # Morning parts ending at the start of the first trip are merged into the first trip (edge case 2)
+        next_rows = first_rows + 1
+        is_merged = is_kept & (morning_end == timestamp_start[next_rows])
+        merged_rows = next_rows[is_merged]
+        timestamp_start[merged_rows] = replace_vec(timestamp_start[merged_rows], hour=0, minute=0).to_numpy()
+        trip_distance[merged_rows] = trip_distance[merged_rows] + morning_distance[is_merged]
+        is_first_activity[merged_rows] = True
+        is_first_trip[merged_rows] = True
+        previous_activity_id[merged_rows] = np.nan
+        purpose_source = np.arange(number_rows)
+        purpose_source[merged_rows] = overnight[is_merged]
+        is_remaining = np.ones(number_rows, dtype=bool)
+        is_remaining[first_rows[is_merged]] = False
+
+        # Splice the remaining morning parts into their chains
+        is_inserted = is_kept & ~is_merged
+        inserted_start = morning_start[is_inserted]
+        remaining_ids = unique_ids[is_remaining]
+        remaining_start = timestamp_start[is_remaining]
+        is_same_vehicle = remaining_ids[1:] == remaining_ids[:-1]
+        is_ordered = (
+            np.all(remaining_ids[1:] >= remaining_ids[:-1])
+            and np.all((remaining_start[1:] >= remaining_start[:-1]) | ~is_same_vehicle)
+            and not np.isnat(inserted_start).any()
+        )
+        if is_ordered:
+            vehicle_morning_start = np.full(chain_index.number_vehicles, np.datetime64("NaT"), dtype="datetime64[ns]")
+            vehicle_morning_start[vehicles[is_inserted]] = inserted_start
+            is_before_morning = timestamp_start <= chain_index.broadcast(vehicle_morning_start)
+            offsets = chain_index.reduce(np.add, is_before_morning.astype(np.intp))[vehicles[is_inserted]]
+            positions = starts[vehicles[is_inserted]] + offsets
+            source = np.insert(np.arange(number_rows), positions, overnight[is_inserted])
+            is_morning = np.insert(np.zeros(number_rows, dtype=bool), positions, True)
+            is_remaining = np.insert(is_remaining, positions, True)
+            source = source[is_remaining]
+            is_morning = is_morning[is_remaining]
+        else:
+            source = np.concatenate([np.flatnonzero(is_remaining), overnight[is_inserted]])
+            is_morning = np.arange(len(source)) >= len(source) - len(inserted_start)
+            order = np.lexsort((np.concatenate([remaining_start, inserted_start]), unique_ids[source]))
+            source = source[order]
+            is_morning = is_morning[order]
+
+        split = {"source": source, "purpose_source": purpose_source[source], "merged_distance": morning_distance[is_merged]}
+        morning = np.searchsorted(overnight, source[is_morning])
+        for column, values, morning_values in (
+            ("trip_id", columns["trip_id"], 0),
+            ("activity_id", columns["activity_id"], 0),
+            ("next_activity_id", columns["next_activity_id"], 0),
+            ("previous_activity_id", previous_activity_id, np.nan),
+            ("is_first_activity", is_first_activity, True),
+            ("is_last_activity", columns["is_last_activity"], False),
+            ("is_first_trip", is_first_trip, True),
+            ("timestamp_start", timestamp_start, morning_start[morning]),
+            ("timestamp_end", timestamp_end, morning_end[morning]),
+            ("trip_distance", trip_distance, morning_distance[morning]),
+        ):
+            split[column] = values[source]
+            split[column][is_morning] = morning_values
+        return split
 
-        Returns:
-            pd.DataFrame: The morning split trips with next_activity_id set to 0
-        """
-        m = morning_trips.copy()
-        m["next_activity_id"] = 0
-        return m
-
-    def __set_is_first_trip_false(self, ids: pd.Series):
-        self.activities_raw.loc[
-            (self.activities_raw["unique_id"].isin(ids))
-            & (self.activities_raw["is_first_trip"]),
-            "is_first_trip",
-        ] = False
-
-    def __add_morning_trips(self, morning_trips: pd.DataFrame):
+    @staticmethod
+    def check_and_assert(activities: pd.DataFrame, merged_distance: np.ndarray):
         """
-        Appends overnight morning trips.
+        Reports the share of the total distance that stems from morning parts of overnight trips merged into the
+        first trip of the survey day.
 
         Args:
-            morning_trips (pd.DataFrame): _description_
-        """
-        self.activities = pd.concat(
-            [self.activities_raw, morning_trips], ignore_index=True
-        )
-
-    # DEPRECATED
-    def __remove_first_parking_act(self):
-        """
-        Removes first parking activities for persons where first activity is a trip (starting at 00:00).
-        """
-        first_park_acts = self.activities.loc[
-            self.activities["is_first_park_activity"], :
-        ]
-        first_trip_acts = self.activities.loc[self.activities["is_first_trip"], :]
-        first_trip_acts.index = first_park_acts.index  # Aligning trip indices
-        indeces_park_timestamp = (
-            first_park_acts["timestamp_start"] == first_trip_acts["timestamp_start"]
-        )
-        self.activities = self.activities.drop(
-            indeces_park_timestamp[indeces_park_timestamp].index
-        )
-
-        # After removing first parking, set first trip to first activity
-        self.activities.loc[
-            (
-                self.activities["unique_id"].isin(
-                    first_park_acts.loc[indeces_park_timestamp, "unique_id"]
-                )
-            )
-            & (self.activities["trip_id"] == 1),
-            "is_first_activity",
-        ] = True
-
-    def __merge_adjacent_trips(self):
-        """
-        Consolidate overnight morning trips and first trips for the edge case where morning trips of next day
-        end exactly at the beginning of the first trip of the survey day. In this case, the morning split of the
-        overnight trip is neglected and the beginning of the first trip is set to 00:00. In the MiD17 data set, there
-        were 3 occurences of this case all with end times of the overnight trip between 00:00 and 01:00.
-        """
-
-        # identify uids where timestamp_end (trip_id == 0) and timestamp start (trip_id == 1) are equal
-        # and from those uids the trips with trip_id == 0. Those should be neglected
-        self.activities, neglected_trips, remaining_first_trips = (
-            self.__neglect_morning_splits()
-        )
-
-        # set timestamp_start to 00:00 of previously first trip and previous activity id to pd.NA
-        self.__update_consolidated_act(
-            neglected_trips=neglected_trips, remaining_trips=remaining_first_trips
-        )
-
-        return neglected_trips
-
-    def __check_and_assert(self, neglected_trips: pd.DataFrame):
+            activities (pd.DataFrame): Activity chains after the overnight split
+            merged_distance (np.ndarray): Distances of the merged morning parts
         """
-        _summary_
-        """
-        # Calculates the neglected trip distances from overnight split trips with regular morning trips
-        total_distance = self.activities.loc[
-            ~self.activities["trip_id"].isna(), "trip_distance"
-        ].sum()
-        neglected_trip_distance = neglected_trips["trip_distance"].sum()
+        total_distance = activities.loc[~activities["trip_id"].isna(), "trip_distance"].sum()
+        neglected_trip_distance = pd.Series(merged_distance, dtype=float).sum()
         ratio = neglected_trip_distance / total_distance
         print(
             f"From {round(total_distance, 2)} km total mileage in the dataset after filtering, "
@@ -925,114 +614,22 @@ class OvernightSplitter:
         )
         assert ratio < 0.01
 
-    def __neglect_morning_splits(
-        self,
-    ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-        """
-        Identifies the household person IDs that should be neglected.
-        """
-        unique_ids_overnight = self.activities.loc[
-            self.activities["trip_id"] == 0, "unique_id"
-        ]
-        activities = self.activities.loc[
-            self.activities["unique_id"].isin(unique_ids_overnight), :
-        ]
-
-        first_trips = activities.loc[activities["trip_id"] == 0, :]
-        # Next trip after morning part of overnight split
-        next_trips = activities.loc[
-            (activities["previous_activity_id"] == 0) & (activities["park_id"].isna()),
-            :,
-        ]
-        first_park_activities = activities.loc[activities["park_id"] == 0, :]
-
-        # Timestamp comparison using morning trip index because those should eventually be neglected
-        bool = (
-            first_trips["timestamp_end"].values == next_trips["timestamp_start"].values
-        )
-        neglect_trips_idx = first_trips.loc[bool, :].index
-        neglect_park_idx = first_park_activities.loc[bool, :].index
-        neglect_idx = neglect_trips_idx.union(neglect_park_idx)
-
-        # supposedly DEPRECATED
-        # remain_trips_idx = next_trips.loc[bool, :].index
-
-        neglected_trips = first_trips[bool]
-        remaining_first_trips = next_trips[bool]
-
-        if any(bool):
-            remaining_activities = self.activities.loc[
-                ~self.activities.index.isin(neglect_idx), :
-            ]
-        else:
-            remaining_activities = self.activities
-
-        return remaining_activities, neglected_trips, remaining_first_trips
-
-    # DEPRECATED
-    def __neglect_zero_trip_id_from_activities(self, id_neglect: pd.Series):
-        """
-        Filters out the activities with the given hhpid and trip_id 0.
 
-        Args:
-            id_neglect (pd.Series): _description_
-        """
-        neglect = (self.activities["unique_id"].isin(id_neglect)) & (
-            self.activities["trip_id"] == 0
-        )
-        self.activities = self.activities.loc[~neglect, :]
-
-    def __update_consolidated_act(
-        self, neglected_trips: pd.DataFrame, remaining_trips: pd.DataFrame
-    ):
-        """
-        Sets the start timestamp of the firstActivity of all hhpids given as argument to 00:00. Additionally
-        the previous_activity_id is set to pd.NA._summary_
-
-        Args:
-            id_neglect (pd.Series): _description_
-        """
-        idx = remaining_trips.index
-
-        # Adjust timestamp_start
-        self.activities.loc[idx, "timestamp_start"] = replace_vec(
-            self.activities.loc[idx, "timestamp_start"],
-            hour=0,
-            minute=0,
-        )
-
-        # Add neglected trip distance
-        neglected_trips.index = idx
-        self.activities.loc[idx, "trip_distance"] = (
-            self.activities.loc[idx, "trip_distance"] + neglected_trips["trip_distance"]
-        )
-
-        # Set purpose to morning split trip purpose
-        self.activities.loc[idx, "trip_purpose"] = neglected_trips["trip_purpose"]
-
-        # Set activity id booleans
-        self.activities.loc[idx, "is_first_activity"] = True
-        self.activities.loc[idx, "is_first_trip"] = True
-        self.activities.loc[idx, "previous_activity_id"] = pd.NA
-
-        # ToDo: Is the park activity in between adjacent trips already deleted?
-
-    def __clean_up_columns(self):
-        keep_col_bool = ~self.activities.columns.isin(
-            [
-                "timedelta_total",
-                "timedelta_morning",
-                "time_share_morning",
-                "time_share_evening",
-                "total_trip_distance",
-            ]
-        )
-        self.activities = self.activities.loc[:, keep_col_bool]
-
-    def __sort_activities(self):
-        """
-        Sorts activities according to unique_id and timestamp_start column values.
-        """
-        self.activities = self.activities.sort_values(
-            by=["unique_id", "timestamp_start"]
-        )
+def _add_parking_rows_to_shard(user_config: dict, trips: pd.DataFrame) -> tuple:
+    """
+    Worker of ParkInference.add_parking_rows_partitioned() building the activity chains of one shard of trips. The
+    progress messages are discarded and the merged overnight trip distance is returned instead of being checked.
+
+    Args:
+        user_config (dict): The user_config dictionary
+        trips (pd.DataFrame): Trips of complete vehicle chains
+
+    Returns:
+        tuple: Activity chains of the shard and the distances of the merged morning parts of overnight trips
+    """
+    park_inference = ParkInference(configs={"user_config": user_config})
+    park_inference.overnight_splitter.check_merged_distance = False
+    with redirect_stdout(io.StringIO()):
+        activities = park_inference.add_parking_rows(trips=trips)
+    merged_distance = park_inference.overnight_splitter.merged_distance
+    return activities, np.zeros(0) if merged_distance is None else merged_distance
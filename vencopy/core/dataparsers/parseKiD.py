@@ -4,9 +4,10 @@ __license__ = "BSD-3-Clause"
 
 import pandas as pd
 import numpy as np
+from functools import partial
 from pathlib import Path
 
-from ...core.dataparsers.dataparsers import IntermediateParsing
+from ...core.dataparsers.dataparsers import IntermediateParsing, SortedKeyIndex
 from ...core.dataparsers.parkinference import ParkInference
 
 
@@ -24,39 +25,110 @@ class ParseKiD(IntermediateParsing):
         super().__init__(configs=configs, dataset=dataset)
         self.park_inference = ParkInference(configs=configs)
 
+    def _split_columns(self, path_trips: Path) -> tuple:
+        """
+        Splits the relevant variables in self.columns into those read from the trips file and those read from the
+        vehicles file. The vehicle ID k00 is read from both files to join them.
+
+        Args:
+            path_trips (Path): Path to the trips file
+
+        Returns:
+            tuple: The columns to read from the trips file and from the vehicles file
+        """
+        with self._open_raw_file(path=path_trips) as source:
+            columns_trips = self._project_columns(available_columns=self._read_stata_variables(path=source), key="k00")
+        columns_vehicles = ["k00"] + [i_column for i_column in self.columns if i_column not in columns_trips]
+        return columns_trips, columns_vehicles
+
+    def _load_trips(self, path_trips: Path, columns_trips: list) -> pd.DataFrame:
+        """
+        Reads the relevant variables from the trips file.
+
+        Args:
+            path_trips (Path): Path to the trips file
+            columns_trips (list): Variables to read
+
+        Returns:
+            pd.DataFrame: Trips data
+        """
+        with self._open_raw_file(path=path_trips) as source:
+            return pd.read_stata(
+                source,
+                convert_categoricals=False,
+                convert_dates=False,
+                preserve_dtypes=False,
+                columns=columns_trips,
+            )
+
+    def _load_vehicles(self, path_vehicles: Path, columns_vehicles: list) -> pd.DataFrame:
+        """
+        Reads the relevant variables from the vehicles file, indexed by the vehicle ID k00.
+
+        Args:
+            path_vehicles (Path): Path to the vehicles file
+            columns_vehicles (list): Variables to read
+
+        Returns:
+            pd.DataFrame: Vehicles data
+        """
+        with self._open_raw_file(path=path_vehicles) as source:
+            raw_data_vehicles = pd.read_stata(
+                source,
+                convert_categoricals=False,
+                convert_dates=False,
+                preserve_dtypes=False,
+                columns=columns_vehicles,
+            )
+        return raw_data_vehicles.set_index("k00")
+
     def _load_unencrypted_data(self):
         """
-        Loads the dataset specified in the user_config.
+        Loads the dataset specified in the user_config. Only the relevant
+        variables in self.columns are read from the trips and the vehicles
+        file respectively, the vehicle ID k00 is read from both to join them.
+        Both files are decoded concurrently.
         """
-        raw_data_path_trips = (
-            Path(self.user_config["global"]["absolute_path"][self.dataset])
-            / self.dev_config["global"]["files"][self.dataset]["trips_data_raw"]
-        )
-        raw_data_path_vehicles = (
-            Path(self.user_config["global"]["absolute_path"][self.dataset])
-            / self.dev_config["global"]["files"][self.dataset]["vehicles_data_raw"]
-        )
-        raw_data_trips = pd.read_stata(
-            raw_data_path_trips,
-            convert_categoricals=False,
-            convert_dates=False,
-            preserve_dtypes=False,
+        raw_data_path_trips, raw_data_path_vehicles = self._raw_data_paths()
+        columns_trips, columns_vehicles = self._split_columns(path_trips=raw_data_path_trips)
+        raw_data_trips, raw_data_vehicles = self._run_concurrently(
+            partial(self._load_trips, path_trips=raw_data_path_trips, columns_trips=columns_trips),
+            partial(self._load_vehicles, path_vehicles=raw_data_path_vehicles, columns_vehicles=columns_vehicles),
         )
-        raw_data_vehicles = pd.read_stata(
-            raw_data_path_vehicles,
+        self.raw_data = self._join_vehicles(trips=raw_data_trips, vehicles=raw_data_vehicles, on="k00")
+        print(f"Finished loading {len(self.raw_data)} " f"rows of raw data of type .dta.")
+
+    def _iterate_raw_data(self, chunk_size: int):
+        """
+        Generator yielding the trips file in chunks of chunk_size rows. The vehicles file is read and indexed once
+        and joined to each chunk.
+
+        Args:
+            chunk_size (int): Number of rows per chunk
+
+        Yields:
+            pd.DataFrame: Chunk of trips joined with the vehicle variables
+        """
+        raw_data_path_trips, raw_data_path_vehicles = self._raw_data_paths()
+        columns_trips, columns_vehicles = self._split_columns(path_trips=raw_data_path_trips)
+        raw_data_vehicles = self._load_vehicles(path_vehicles=raw_data_path_vehicles, columns_vehicles=columns_vehicles)
+        vehicle_index = SortedKeyIndex(keys=raw_data_vehicles.index)
+        with self._open_raw_file(path=raw_data_path_trips) as source, pd.read_stata(
+            source,
             convert_categoricals=False,
             convert_dates=False,
             preserve_dtypes=False,
-        )
-        raw_data_vehicles.set_index("k00", inplace=True)
-        raw_data = raw_data_trips.join(raw_data_vehicles, on="k00")
-        self.raw_data = raw_data
-        print(f"Finished loading {len(self.raw_data)} " f"rows of raw data of type .dta.")
+            columns=columns_trips,
+            chunksize=chunk_size,
+        ) as reader:
+            for chunk in reader:
+                yield self._join_vehicles(trips=chunk, vehicles=raw_data_vehicles, on="k00", vehicle_index=vehicle_index)
 
     @staticmethod
     def _change_separator(trips):
         """
-        Replaces commas with dots in the dataset (German datasets).
+        Replaces decimal commas with dots in the trip distance and weight columns (German datasets) with one
+        vectorised string operation per column.
 
         Args:
             trips (pd.DataFrame): A dataframe containing all trips.
@@ -64,10 +136,8 @@ class ParseKiD(IntermediateParsing):
         Returns:
             pd.DataFrame: A dataframe containing all trips.
         """
-        for i, x in enumerate(list(trips.trip_distance)):
-            trips.at[i, "trip_distance"] = x.replace(",", ".")
-        for i, x in enumerate(list(trips.trip_weight)):
-            trips.at[i, "trip_weight"] = x.replace(",", ".")
+        for column in ("trip_distance", "trip_weight"):
+            trips[column] = trips[column].str.replace(",", ".", regex=False)
         return trips
 
     def __add_string_columns(self, weekday=True, purpose=True, vehicle_segment=True):
@@ -86,10 +156,31 @@ class ParseKiD(IntermediateParsing):
         if vehicle_segment:
             self._add_string_column_from_variable(col_name="vehicle_segment_string", var_name="vehicle_segment")
 
+    @staticmethod
+    def _split_clock(clock: pd.Series) -> tuple:
+        """
+        Parses a column of "HH:MM" clock strings once into hour and minute integers. Missing or empty clock strings
+        result in missing hours and minutes, and thus in NaT timestamps.
+
+        Args:
+            clock (pd.Series): Clock strings
+
+        Returns:
+            tuple: Hours and minutes as integer Series, float Series if clock strings are missing
+        """
+        is_missing = clock.isna() | (clock.astype("string").str.strip() == "")
+        hour_minute = clock.mask(is_missing).str.partition(":")
+        hours = pd.to_numeric(hour_minute[0])
+        minutes = pd.to_numeric(hour_minute[2])
+        if not (hours[~is_missing].between(0, 23).all() and minutes[~is_missing].between(0, 59).all()):
+            raise ValueError(f"Column {clock.name} contains clock times outside of 00:00 to 23:59.")
+        return hours, minutes
+
     @staticmethod
     def _extract_timestamps(trips):
         """
-        Extracts timestamps from the trip start date.
+        Extracts the date components from the trip start date and the hour and minute integers from the start and
+        end clock strings, which are the inputs of the shared timestamp composition.
 
         Args:
             trips (pd.DataFrame): A dataframe containing all trips.
@@ -102,12 +193,9 @@ class ParseKiD(IntermediateParsing):
         trips["trip_start_month"] = trips["trip_start_date"].dt.month
         trips["trip_start_day"] = trips["trip_start_date"].dt.day
         trips["trip_start_weekday"] = trips["trip_start_date"].dt.weekday
-        trips["trip_start_week"] = trips["trip_start_date"].dt.isocalendar().week
-        trips["trip_start_week"] = trips["trip_start_week"].astype(int)
-        trips["trip_start_hour"] = pd.to_datetime(trips["trip_start_clock"], format="%H:%M").dt.hour
-        trips["trip_start_minute"] = pd.to_datetime(trips["trip_start_clock"], format="%H:%M").dt.minute
-        trips["trip_end_hour"] = pd.to_datetime(trips["trip_end_clock"], format="%H:%M").dt.hour
-        trips["trip_end_minute"] = pd.to_datetime(trips["trip_end_clock"], format="%H:%M").dt.minute
+        trips["trip_start_week"] = trips["trip_start_date"].dt.isocalendar().week.astype(int)
+        trips["trip_start_hour"], trips["trip_start_minute"] = ParseKiD._split_clock(clock=trips["trip_start_clock"])
+        trips["trip_end_hour"], trips["trip_end_minute"] = ParseKiD._split_clock(clock=trips["trip_end_clock"])
         return trips
 
     @staticmethod
@@ -140,8 +228,10 @@ class ParseKiD(IntermediateParsing):
         Returns:
             pd.DataFrame: A dataframe containing all trips.
         """
-        trips.drop(trips.loc[trips["trip_start_clock"].str.contains("-1")].index, inplace=True)
-        trips.drop(trips.loc[trips["trip_end_clock"].str.contains("-1")].index, inplace=True)
+        missing_hours = trips["trip_start_clock"].str.contains("-1", regex=False) | trips[
+            "trip_end_clock"
+        ].str.contains("-1", regex=False)
+        trips.drop(trips.index[missing_hours], inplace=True)
         return trips
 
     @staticmethod
@@ -160,12 +250,10 @@ class ParseKiD(IntermediateParsing):
                      'is_first_trip'], inplace=True)
         return activities
 
-    def process(self) -> pd.DataFrame:
+    def _harmonise_trips(self):
         """
-        Wrapper function for harmonising and filtering the trips dataset as well
-        as adding parking rows.
+        Harmonises, type converts and time stamps the trips in self.raw_data.
         """
-        self._load_data()
         self._select_columns()
         self._harmonise_variables()
         self._harmonize_variables_unique_id_names()
@@ -176,12 +264,21 @@ class ParseKiD(IntermediateParsing):
         self.__add_string_columns()
         self._compose_start_and_end_timestamps()
         self._update_end_timestamp(trips=self.trips)
+
+    def process(self) -> pd.DataFrame:
+        """
+        Wrapper function for harmonising and filtering the trips dataset as well
+        as adding parking rows.
+        """
+        self._load_harmonised_trips()
         self._check_filter_dict(dictionary=self.filters)
         self._filter(filters=self.filters)
         self._filter_consistent_hours(dataset=self.trips)
-        self.activities = self.park_inference.add_parking_rows(trips=self.trips)
+        self.activities = self._add_parking_rows()
         self._subset_vehicle_segment()
         self.activities = self._cleanup_dataset(activities=self.activities)
+        self._enforce_activities_schema()
+        self._attach_chain_index()
         self.write_output()
         print("Parsing KiD dataset completed.")
         return self.activities
@@ -69,12 +69,10 @@ class ParseMiD(IntermediateParsing):
                      'is_first_trip'], inplace=True)
         return activities
 
-    def process(self) -> pd.DataFrame:
+    def _harmonise_trips(self):
         """
-        Wrapper function for harmonising and filtering the trips dataset as well
-        as adding parking rows.
+        Harmonises, type converts and time stamps the trips in self.raw_data.
         """
-        self._load_data()
         self._select_columns()
         self._harmonise_variables()
         self._harmonize_variables_unique_id_names()
@@ -82,10 +80,19 @@ class ParseMiD(IntermediateParsing):
         self.__add_string_columns()
         self._compose_start_and_end_timestamps()
         self._update_end_timestamp(trips=self.trips)
+
+    def process(self) -> pd.DataFrame:
+        """
+        Wrapper function for harmonising and filtering the trips dataset as well
+        as adding parking rows.
+        """
+        self._load_harmonised_trips()
         self._check_filter_dict(dictionary=self.filters)
         self._filter(filters=self.filters)
-        self.activities = self.park_inference.add_parking_rows(trips=self.trips)
+        self.activities = self._add_parking_rows()
         self.activities = self._cleanup_dataset(activities=self.activities)
+        self._enforce_activities_schema()
+        self._attach_chain_index()
         self.write_output()
         print("Parsing MiD dataset completed.")
         return self.activities
@@ -3,9 +3,10 @@ __license__ = "BSD-3-Clause"
 
 
 import pandas as pd
+from functools import partial
 from pathlib import Path
 
-from ...core.dataparsers.dataparsers import IntermediateParsing
+from ...core.dataparsers.dataparsers import IntermediateParsing, SortedKeyIndex
 from ...core.dataparsers.parkinference import ParkInference
 
 
@@ -23,35 +24,114 @@ class ParseVF(IntermediateParsing):
         super().__init__(configs=configs, dataset=dataset)
         self.park_inference = ParkInference(configs=configs)
 
+    def _split_columns(self, path_trips: Path) -> tuple:
+        """
+        Splits the relevant variables in self.columns into those read from the trips file and those read from the
+        vehicles file. Variables contained in the trips file are not read again from the vehicles file, HP_ID is read
+        from both files to join them.
+
+        Args:
+            path_trips (Path): Path to the trips file
+
+        Returns:
+            tuple: The columns to read from the trips file and from the vehicles file
+        """
+        with self._open_raw_file(path=path_trips) as source:
+            columns_trips = self._project_columns(
+                available_columns=self._read_stata_variables(path=source), key="HP_ID"
+            )
+        columns_vehicles = ["HP_ID"] + [i_column for i_column in self.columns if i_column not in columns_trips]
+        return columns_trips, columns_vehicles
+
+    def _load_trips(self, path_trips: Path, columns_trips: list) -> pd.DataFrame:
+        """
+        Reads the relevant variables from the MiD B1 trips file.
+
+        Args:
+            path_trips (Path): Path to the trips file
+            columns_trips (list): Variables to read
+
+        Returns:
+            pd.DataFrame: Trips data
+        """
+        with self._open_raw_file(path=path_trips) as source:
+            return pd.read_stata(
+                source,
+                convert_categoricals=False,
+                convert_dates=False,
+                preserve_dtypes=False,
+                columns=columns_trips,
+            )
+
+    def _load_vehicles(self, path_vehicles: Path, columns_vehicles: list) -> pd.DataFrame:
+        """
+        Reads the relevant variables from the vehicles file, keeping the first vehicle per HP_ID. The result is
+        indexed by HP_ID.
+
+        Args:
+            path_vehicles (Path): Path to the vehicles file
+            columns_vehicles (list): Variables to read
+
+        Returns:
+            pd.DataFrame: Vehicles data
+        """
+        with self._open_raw_file(path=path_vehicles) as source:
+            raw_data_vehicles = pd.read_csv(source, encoding="ISO-8859-1", usecols=lambda x: x in columns_vehicles)
+        raw_data_vehicles = raw_data_vehicles.drop_duplicates(subset=["HP_ID"], keep="first")
+        return raw_data_vehicles.set_index("HP_ID")
+
     def _load_unencrypted_data(self):
         """
         Loads the dataset specified in the user_config. raw_data_path_trips,
         unlike for other MiD classes is taken from the MiD B1 dataset.
         raw_data_path_vehicles is an internal dataset from DLR-VF (a filtered
         MiD B2 dataset depending on vehicle information in the MiD B1 dataset).
+        Only the relevant variables in self.columns are read, variables
+        contained in the trips file are not read again from the vehicles file.
+        Both files are decoded concurrently.
         """
-        raw_data_path_trips = (
-            Path(self.user_config["global"]["absolute_path"][self.dataset])
-            / self.dev_config["global"]["files"][self.dataset]["trips_data_raw"]
-        )
-        raw_data_path_vehicles = (
-            Path(self.user_config["global"]["absolute_path"][self.dataset])
-            / self.dev_config["global"]["files"][self.dataset]["vehicles_data_raw"]
+        raw_data_path_trips, raw_data_path_vehicles = self._raw_data_paths()
+        columns_trips, columns_vehicles = self._split_columns(path_trips=raw_data_path_trips)
+        raw_data_trips, raw_data_vehicles = self._run_concurrently(
+            partial(self._load_trips, path_trips=raw_data_path_trips, columns_trips=columns_trips),
+            partial(self._load_vehicles, path_vehicles=raw_data_path_vehicles, columns_vehicles=columns_vehicles),
         )
+        self.raw_data = self._join_vehicles(trips=raw_data_trips, vehicles=raw_data_vehicles, on="HP_ID", rsuffix="VF")
+        print(f"Finished loading {len(self.raw_data)} rows of raw data of type .dta.")
+
+    def _iterate_raw_data(self, chunk_size: int):
+        """
+        Generator yielding the MiD B1 trips file in chunks of chunk_size rows. The DLR-VF vehicles file is read
+        and indexed once and joined to each chunk. The chunks are re-cut at household boundaries, so that the
+        padding of missing car segments per household does not depend on the chunk size.
+
+        Args:
+            chunk_size (int): Number of rows per chunk
 
-        raw_data_trips = pd.read_stata(
-            raw_data_path_trips,
+        Yields:
+            pd.DataFrame: Chunk of trips joined with the vehicle variables
+        """
+        raw_data_path_trips, raw_data_path_vehicles = self._raw_data_paths()
+        columns_trips, columns_vehicles = self._split_columns(path_trips=raw_data_path_trips)
+        raw_data_vehicles = self._load_vehicles(path_vehicles=raw_data_path_vehicles, columns_vehicles=columns_vehicles)
+        vehicle_index = SortedKeyIndex(keys=raw_data_vehicles.index)
+        data_variables = self.dev_config["dataparsers"]["data_variables"]
+        household_column = data_variables["household_id"][data_variables["dataset"].index(self.dataset)]
+        with self._open_raw_file(path=raw_data_path_trips) as source, pd.read_stata(
+            source,
             convert_categoricals=False,
             convert_dates=False,
             preserve_dtypes=False,
-        )
-        raw_data_vehicles = pd.read_csv(raw_data_path_vehicles, encoding="ISO-8859-1")
-        raw_data_vehicles = raw_data_vehicles.drop(columns=["Unnamed: 0"])
-        raw_data_vehicles = raw_data_vehicles.drop_duplicates(subset=["HP_ID"], keep="first")
-        raw_data_vehicles.set_index("HP_ID", inplace=True)
-        raw_data = raw_data_trips.join(raw_data_vehicles, on="HP_ID", rsuffix="VF")
-        self.raw_data = raw_data
-        print(f"Finished loading {len(self.raw_data)} rows of raw data of type .dta.")
+            columns=columns_trips,
+            chunksize=chunk_size,
+        ) as reader:
+            joined_chunks = (
+                self._join_vehicles(
+                    trips=chunk, vehicles=raw_data_vehicles, on="HP_ID", vehicle_index=vehicle_index, rsuffix="VF"
+                )
+                for chunk in reader
+            )
+            yield from self._align_chunks(chunks=joined_chunks, id_column=household_column)
 
     def _harmonise_variables(self):
         """
@@ -72,20 +152,18 @@ class ParseVF(IntermediateParsing):
 
     def __pad_missing_car_segments(self):
         """
-        Pads missing car segments. KiD-specific function.
+        Pads missing car segments. Trips of persons without a matching vehicle take over the vehicle variables
+        of the first vehicle of their household, the household index is built once for all padded variables. Trips
+        without a vehicle segment after padding are removed.
         """
         # remove vehicle_segment nicht zuzuordnen
         self.trips = self.trips[self.trips.vehicle_segment != "nicht zuzuordnen"]
-        # pad missing car segments self.trips.vehicle_segment =
-        # self.trips.groupby('household_id').vehicle_segment.transform('first')
-        # self.trips.drivetrain =
-        # self.trips.groupby('household_id').drivetrain.transform('first')
-        # self.trips.vehicle_id =
-        # self.trips.groupby('household_id').vehicle_id.transform('first')
+        # pad missing car segments with the first value per household
+        household_index = SortedKeyIndex(keys=self.trips["household_id"])
+        for column in ["vehicle_segment", "drivetrain", "vehicle_id"]:
+            self.trips[column] = self.trips[column].fillna(household_index.first_valid(values=self.trips[column]))
         # remove remaining NaN
         self.trips = self.trips.dropna(subset=["vehicle_segment"])
-        # self.trips = self.trips.dropna(subset=['vehicle_segment',
-        # 'drivetrain', 'vehicle_id'])
 
     def __exclude_hours(self):
         """
@@ -150,12 +228,10 @@ class ParseVF(IntermediateParsing):
                      'drivetrain'], inplace=True)
         return activities
 
-    def process(self) -> pd.DataFrame:
+    def _harmonise_trips(self):
         """
-        Wrapper function for harmonising and filtering the trips dataset as well
-        as adding parking rows.
+        Harmonises, type converts and time stamps the trips in self.raw_data.
         """
-        self._load_data()
         self._select_columns()
         self._harmonise_variables()
         self._harmonize_variables_unique_id_names()
@@ -165,12 +241,21 @@ class ParseVF(IntermediateParsing):
         self.__add_string_columns()
         self._compose_start_and_end_timestamps()
         self._update_end_timestamp(trips=self.trips)
+
+    def process(self) -> pd.DataFrame:
+        """
+        Wrapper function for harmonising and filtering the trips dataset as well
+        as adding parking rows.
+        """
+        self._load_harmonised_trips()
         self._check_filter_dict(dictionary=self.filters)
         self._filter(filters=self.filters)
         # self._filter_consistent_hours(dataset=self.trips)
-        self.activities = self.park_inference.add_parking_rows(trips=self.trips)
+        self.activities = self._add_parking_rows()
         self._subset_vehicle_segment()
         self.activities = self._cleanup_dataset(activities=self.activities)
+        self._enforce_activities_schema()
+        self._attach_chain_index()
         self.write_output()
         print("Parsing VF dataset completed.")
         return self.activities
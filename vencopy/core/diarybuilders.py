@@ -9,7 +9,7 @@ import pandas as pd
 from pathlib import Path
 from typing import Optional
 
-from ..utils.utils import create_file_name, write_out
+from ..utils.utils import chain_index, column_view, create_file_name, write_out
 from ..utils.metadata import read_metadata_config, write_out_metadata
 
 
@@ -27,7 +27,7 @@ class DiaryBuilder:
         self.dev_config = configs["dev_config"]
         self.user_config = configs["user_config"]
         self.dataset = configs["user_config"]["global"]["dataset"]
-        self.activities = activities
+        self.activities = column_view(data=activities)
         self.time_resolution = configs["user_config"]["diarybuilders"]["time_resolution"]
         self.is_week_diary = is_week_diary
         self.drain = None
@@ -252,7 +252,7 @@ class TimeDiscretiser:
             necessary_columns = necessary_columns + ["trip_start_weekday"]
         if self.column_to_discretise == "uncontrolled_charging":
             necessary_columns = necessary_columns + ["available_power", "timestamp_end_uncontrolled_charging"]
-        self.data_to_discretise = self.activities[necessary_columns].copy()
+        self.data_to_discretise = column_view(data=self.activities, columns=necessary_columns)
 
     def __correct_values(self):
         """
@@ -703,37 +703,32 @@ class TimeDiscretiser:
 
     def __allocate(self) -> pd.DataFrame:
         """
-        Loops over every activity (row) and allocates the respective value per bin (value_per_bin) to each column
-        specified in the columns first_bin and last_bin.      
+        Allocates the respective value per bin (value_per_bin) of every activity to the slots from first_bin to
+        last_bin of its vehicle. The rows of each vehicle are found via the chain index of the activities, so that
+        every activity is written as one slice into a preallocated array instead of grouping the activities by
+        unique_id.
 
         Returns:
             pd.DataFrame: Discretized data set with temporal discretizations in the columns.
         """
-        trips = self.data_to_discretise.copy()
-        trips = trips[["unique_id", "first_bin", "last_bin", "value_per_bin"]]
-        trips["unique_id"] = trips["unique_id"].astype(int)
-        return trips.groupby(by="unique_id").apply(self.assign_bins)
-
-    def assign_bins(self, activities: pd.DataFrame) -> pd.Series:
-        """
-        Assigns values for every unique_id based on first and last bin.
-
-        Args:
-            activities (pd.DataFrame): A dataframe containing all trip and parking activities.
-
-        Returns:
-            pd.Series: Series containing the value depending on the profile to discretise and the time resolution.
-        """
-        s = pd.Series(index=range(self.number_time_slots), dtype=float)
-        for _, itrip in activities.iterrows():
-            start = itrip["first_bin"]
-            end = itrip["last_bin"]
-            value = itrip["value_per_bin"]
-            if self.column_to_discretise == "min_battery_level_end":
-                s.loc[start:end] = value[::-1]
-            else:
-                s.loc[start:end] = value
-        return s
+        index = chain_index(data=self.data_to_discretise)
+        first_bins = self.data_to_discretise["first_bin"].to_numpy(dtype=np.int64)
+        last_bins = self.data_to_discretise["last_bin"].to_numpy(dtype=np.int64)
+        values = self.data_to_discretise["value_per_bin"].to_numpy()
+        is_reversed = self.column_to_discretise == "min_battery_level_end"
+        discrete_data = np.full((index.number_vehicles, self.number_time_slots), np.nan)
+        for vehicle, start, end in zip(range(index.number_vehicles), index.starts, index.ends):
+            profile = discrete_data[vehicle]
+            for row in range(start, end):
+                value = values[row]
+                profile[first_bins[row] : last_bins[row] + 1] = value[::-1] if is_reversed else value
+        unique_ids = index.unique_ids.astype(int)
+        order = np.argsort(unique_ids, kind="stable")
+        return pd.DataFrame(
+            discrete_data[order],
+            index=pd.Index(unique_ids[order], name="unique_id"),
+            columns=pd.RangeIndex(self.number_time_slots),
+        )
 
     def __write_output(self):
         """
@@ -1,12 +1,13 @@
 __maintainer__ = "Niklas Wulff, Fabia Miorelli"
 __license__ = "BSD-3-Clause"
 
+import numpy as np
 import pandas as pd
 
 from pathlib import Path
 from typing import Union
 
-from ..utils.utils import create_file_name, write_out
+from ..utils.utils import chain_index, column_view, create_file_name, enforce_schema, write_out
 from ..utils.metadata import read_metadata_config, write_out_metadata
 
 
@@ -31,15 +32,12 @@ class FlexEstimator:
             self.user_config["flexestimators"]["battery_capacity"]
             * self.user_config["flexestimators"]["minimum_soc"]
         )
-        self.activities = activities.copy()
+        self.activities = column_view(data=activities)
         self.is_trip = ~self.activities["trip_id"].isna()
         self.is_park = ~self.activities["park_id"].isna()
-        self.is_first_activity = (
-            self.activities["is_first_activity"].fillna(0).astype(bool)
-        )
-        self.is_last_activity = (
-            self.activities["is_last_activity"].fillna(0).astype(bool)
-        )
+        index = chain_index(data=self.activities)
+        self.is_first_activity = pd.Series(index.is_first_row(), index=self.activities.index)
+        self.is_last_activity = pd.Series(index.is_last_row(), index=self.activities.index)
 
         self.activities[
             [
@@ -59,9 +57,19 @@ class FlexEstimator:
                 "max_auxiliary_fuel_need",
                 "min_auxiliary_fuel_need",
             ]
-        ] = None
+        ] = np.nan
+        self._enforce_activities_schema()
         self.activities_without_residual = None
 
+    def _enforce_activities_schema(self):
+        """
+        Casts self.activities to the dtypes declared in dev_config['global']['activities_data_types'], so that the
+        battery level columns are numeric instead of object columns.
+        """
+        self.activities = enforce_schema(
+            data=self.activities, schema=self.dev_config["global"]["activities_data_types"]
+        )
+
     def _drain(self):
         """
         This function calculates the consumption of a specific trip according to its length based on the user's electrical consumption rate.
@@ -106,14 +114,11 @@ class FlexEstimator:
         # Start and end for all trips and parkings in between
         set_acts = range(1, int(self.activities["park_id"].max()) + 1)
         subset_trip_activities = pd.DataFrame()  # Redundant?
+        is_not_first_activity = ~chain_index(data=self.activities).is_first_row()
         for act in set_acts:  # implementable via groupby with actIDs as groups?
             print(f"Calculating maximum battery level for act {act}.")
-            trip_rows = (self.activities["trip_id"] == act) & (
-                ~self.activities["is_first_activity"]
-            )
-            park_rows = (self.activities["park_id"] == act) & (
-                ~self.activities["is_first_activity"]
-            )
+            trip_rows = (self.activities["trip_id"] == act) & is_not_first_activity
+            park_rows = (self.activities["park_id"] == act) & is_not_first_activity
             trip_activities = self.activities.loc[trip_rows, :]
             park_activities = self.activities.loc[park_rows, :]
 
@@ -142,9 +147,9 @@ class FlexEstimator:
         self.activities = act_temp.sort_values(
             by=["unique_id", "activity_id", "trip_id"]
         )
-        return self.activities.loc[
-            self.activities["is_last_activity"], ["unique_id", "max_battery_level_end"]
-        ].set_index("unique_id")
+        return self.activities[["unique_id", "max_battery_level_end"]].take(
+            chain_index(data=self.activities).last_rows
+        ).set_index("unique_id")
 
     def __battery_level_min(self, end_level: pd.Series) -> pd.Series:
         """
@@ -171,14 +176,11 @@ class FlexEstimator:
         # Start and end for all trips and parkings starting from the last
         # activities, then looping to earlier activities
         n_act = int(self.activities["park_id"].max())
+        is_not_last_activity = ~chain_index(data=self.activities).is_last_row()
         for act in range(n_act, -1, -1):
             print(f"Calculate minimum battery level for act {act}.")
-            trip_rows = (self.activities["trip_id"] == act) & (
-                ~self.activities["is_last_activity"]
-            )
-            park_rows = (self.activities["park_id"] == act) & (
-                ~self.activities["is_last_activity"]
-            )
+            trip_rows = (self.activities["trip_id"] == act) & is_not_last_activity
+            park_rows = (self.activities["park_id"] == act) & is_not_last_activity
             trip_activities = self.activities.loc[trip_rows, :]
             park_activities = self.activities.loc[park_rows, :]
 
@@ -210,10 +212,9 @@ class FlexEstimator:
         self.activities = act_temp.sort_values(
             by=["unique_id", "activity_id", "trip_id"], ignore_index=True
         )
-        return self.activities.loc[
-            self.activities["is_first_activity"],
-            ["unique_id", "min_battery_level_start"],
-        ].set_index("unique_id")
+        return self.activities[["unique_id", "min_battery_level_start"]].take(
+            chain_index(data=self.activities).first_rows
+        ).set_index("unique_id")
 
     def __first_activities(
         self, start_level: Union[float, pd.Series]
@@ -241,7 +242,7 @@ class FlexEstimator:
             # Treat parking activities after morning split trips. They have activitiy_id==0 but are the second activity.
             first_park_activities_overnight = self.activities.loc[
                 (self.activities["is_first_park_activity"])
-                & ~(self.activities["is_first_activity"])
+                & ~chain_index(data=self.activities).is_first_row()
             ].copy()
             first_park_activities_overnight = self.__calculate_max_battery_level_park(
                 activity_id=0,
@@ -275,9 +276,7 @@ class FlexEstimator:
             pd.DataFrame: First activities with all battery level columns as anchor for the consecutive calculation of maximum charge
         """
         # First activities - parking and trips
-        first_activities = self.activities.loc[
-            self.activities["is_first_activity"], :
-        ].copy()
+        first_activities = self.activities.take(chain_index(data=self.activities).first_rows)
 
         # Needed for setting start_level at correct unique_id in iterations
         first_activities = first_activities.set_index("unique_id")
@@ -381,9 +380,7 @@ class FlexEstimator:
             pd.DataFrame: Activity data set with the battery variables set for all last activities of the activity chains
         """
         # Last activities - parking and trips
-        last_activities_in = self.activities.loc[
-            self.activities["is_last_activity"], :
-        ].copy()
+        last_activities_in = self.activities.take(chain_index(data=self.activities).last_rows)
         is_trip = ~last_activities_in["trip_id"].isna()
 
         indeces_last_activities = last_activities_in.set_index("unique_id")
@@ -778,8 +775,8 @@ class FlexEstimator:
                 requires residual fuel are disregarded.
         """
         indeces_activities = activities.set_index(index_columns)
-        indeces_out = (~indeces_activities["max_residual_need"].isin([None, 0])) | (
-            ~indeces_activities["min_residual_need"].isin([None, 0])
+        indeces_out = (indeces_activities["max_residual_need"].fillna(0) != 0) | (
+            indeces_activities["min_residual_need"].fillna(0) != 0
         )
 
         if len(index_columns) == 1:
@@ -939,11 +936,10 @@ class FlexEstimator:
         Returns:
             float: absolute delta
         """
+        index = chain_index(data=self.activities)
         delta = abs(
-            self.activities.loc[self.activities["is_last_activity"], end_column].values
-            - self.activities.loc[
-                self.activities["is_first_activity"], start_column
-            ].values
+            self.activities[end_column].to_numpy()[index.last_rows]
+            - self.activities[start_column].to_numpy()[index.first_rows]
         ).sum()
         return delta
 
@@ -970,6 +966,7 @@ class FlexEstimator:
             self.activities = self._filter_residual_need(
                 activities=self.activities, index_columns=["unique_id"]
             )
+        self._enforce_activities_schema()
         if self.user_config["global"]["write_output_to_disk"]["flex_output"]:
             self.__write_output()
         print("Technical flexibility estimation ended.")
@@ -1010,12 +1007,13 @@ class FlexEstimator:
             max_iteration=self.user_config["flexestimators"]["max_iterations"],
             epsilon=self.user_config["flexestimators"]["epsilon_battery_level"],
             battery_capacity=self.upper_battery_level,
-            number_vehicles=len(self.activities["unique_id"].unique()),
+            number_vehicles=chain_index(data=self.activities).number_vehicles,
         )
         self._auxiliary_fuel_need()
         if self.user_config["flexestimators"]["filter_fuel_need"]:
             self.activities = self._filter_residual_need(activities=self.activities, index_columns=["unique_id"])
         self.activities = self._cleanup_dataset(activities=self.activities)
+        self._enforce_activities_schema()
         if self.user_config["global"]["write_output_to_disk"]["flex_output"]:
             self.__write_output()
         print("Technical flexibility estimation ended.")
@@ -7,12 +7,142 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 
-from scipy.stats.sampling import DiscreteAliasUrn
-
-from ..utils.utils import create_file_name, write_out
+from ..utils.utils import chain_index, column_view, create_file_name, enforce_schema, write_out
 from ..utils.metadata import read_metadata_config, write_out_metadata
 
 
+GRID_MODELS = {}
+
+
+def register_grid_model(name: str):
+    """
+    Decorator registering a batch grid model, which can then be selected by
+    its name in the option grid_model of the gridmodellers section of the
+    user_config. A grid model is a function
+    model(columns: dict, user_config: dict, seed: int) -> np.ndarray that
+    receives the column arrays of all activities (see
+    GridModeller._grid_model_columns()) and returns the rated power of each
+    activity. The minimum parking time, the losses and the schema are applied
+    by the GridModeller afterwards, as for the built-in grid models.
+
+    Args:
+        name (str): Name of the grid model
+
+    Raises:
+        ValueError: Raised if the name is the one of a built-in grid model.
+
+    Returns:
+        Callable: Decorator returning the grid model unchanged
+    """
+    if name in ("simple", "probability"):
+        raise ValueError(f"The grid model {name} is built in and cannot be replaced.")
+
+    def register(model):
+        GRID_MODELS[name] = model
+        return model
+
+    return register
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """
+    SplitMix64 finaliser, a bijective mixing function on uint64 values.
+
+    Args:
+        values (np.ndarray): uint64 values
+
+    Returns:
+        np.ndarray: Mixed uint64 values
+    """
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class LossModel:
+    def __init__(self, rated_powers, loss_factors, interpolate: bool = False):
+        """
+        Compiled charging station loss model. The loss factors are stored
+        sorted by rated power once, the loss factors of all activities are
+        then looked up with a single binary search. Either the loss factor of
+        each rated power is given explicitly (loss_factor in the
+        user_config), in which case only these rated powers are known, or the
+        points of a piecewise-linear loss factor curve over the rated power
+        are given (loss_factor_curve), which is interpolated linearly and held
+        constant beyond its first and last point.
+
+        Args:
+            rated_powers (array-like): Rated powers in kW
+            loss_factors (array-like): Loss factor of each rated power, between 0 and 1
+            interpolate (bool, optional): Interpolate the loss factors linearly between the rated powers. Defaults
+            to False.
+        """
+        rated_powers = np.asarray(rated_powers, dtype=float)
+        order = np.argsort(rated_powers, kind="stable")
+        self.rated_powers = rated_powers[order]
+        self.loss_factors = np.asarray(loss_factors, dtype=float)[order]
+        self.interpolate = interpolate
+        if len(np.unique(self.rated_powers)) != len(self.rated_powers):
+            raise ValueError(f"Loss factors are given more than once for a rated power in {self.rated_powers}.")
+
+    @classmethod
+    def from_user_config(cls, grid_config: dict) -> "LossModel":
+        """
+        Compiles the loss model from the gridmodellers section of the
+        user_config. A given loss_factor_curve takes precedence over the
+        loss_factor mapping, whose keys are the rated powers prefixed by
+        rated_power_.
+
+        Args:
+            grid_config (dict): The gridmodellers section of the user_config
+
+        Returns:
+            LossModel: Compiled loss model
+        """
+        curve = grid_config.get("loss_factor_curve")
+        if curve:
+            rated_powers, loss_factors = zip(*curve)
+            return cls(rated_powers=rated_powers, loss_factors=loss_factors, interpolate=True)
+        loss_factor = grid_config["loss_factor"]
+        rated_powers = [float(str(key).replace("rated_power_", "", 1)) for key in loss_factor]
+        return cls(rated_powers=rated_powers, loss_factors=list(loss_factor.values()))
+
+    def factors(self, rated_power) -> np.ndarray:
+        """
+        Looks up the loss factors of rated powers.
+
+        Args:
+            rated_power (array-like): Rated powers in kW
+
+        Raises:
+            ValueError: Raised if no loss factor is given for a rated power (only without interpolation).
+
+        Returns:
+            np.ndarray: Loss factor of each rated power
+        """
+        rated_power = np.asarray(rated_power, dtype=float)
+        if self.interpolate:
+            return np.interp(rated_power, self.rated_powers, self.loss_factors)
+        positions = np.minimum(np.searchsorted(self.rated_powers, rated_power), len(self.rated_powers) - 1)
+        is_unknown = self.rated_powers[positions] != rated_power
+        if is_unknown.any():
+            raise ValueError(f"No loss factor given for the rated powers {np.unique(rated_power[is_unknown]).tolist()}.")
+        return self.loss_factors[positions]
+
+    def available_power(self, rated_power) -> np.ndarray:
+        """
+        Reduces rated powers by their loss factors.
+
+        Args:
+            rated_power (array-like): Rated powers in kW
+
+        Returns:
+            np.ndarray: Available powers in kW
+        """
+        rated_power = np.asarray(rated_power, dtype=float)
+        return rated_power - rated_power * self.factors(rated_power=rated_power)
+
+
 class GridModeller:
     def __init__(self, configs: dict, activities):
         """
@@ -51,121 +181,366 @@ class GridModeller:
         self.dev_config = configs["dev_config"]
         self.dataset = configs["user_config"]["global"]["dataset"]
         self.grid_model = self.user_config["gridmodellers"]["grid_model"]
-        self.activities = activities
+        self.activities = column_view(data=activities)
         if self.user_config["gridmodellers"]["force_last_trip_home"]:
             self.__remove_activities_not_ending_home()
         self.grid_availability_simple = self.user_config["gridmodellers"]["charging_infrastructure_mappings"]
         self.grid_availability_probability = self.user_config["gridmodellers"]["grid_availability_distribution"]
         self.charging_availability = None
+        self.ensemble_codes = None
+        self.ensemble_rated_power = None
+        self.ensemble_available_power = None
+        self.loss_model = (
+            LossModel.from_user_config(grid_config=self.user_config["gridmodellers"])
+            if self.user_config["gridmodellers"]["losses"]
+            else None
+        )
 
     def __assign_grid_via_purposes(self):
         """
         Assigns the grid connection power using the trip purposes though a
         true/false mapping in the user_config.yaml to represent the charging
-        station availability for each individual vehicle.
+        station availability for each individual vehicle. The mapping is
+        evaluated once per purpose category and looked up via the category
+        codes, activities without purpose get no charging availability.
         """
         print("Starting with charge connection replacement of location purposes.")
-        self.charging_availability = self.activities.purpose_string.replace(self.grid_availability_simple)
+        purposes = self._purpose_categories()
+        unmapped = set(purposes.cat.remove_unused_categories().cat.categories) - set(self.grid_availability_simple)
+        if unmapped:
+            raise ValueError(f"No charging infrastructure mapping given for the purposes {sorted(unmapped)}.")
+        availability = np.array(
+            [bool(self.grid_availability_simple.get(purpose, False)) for purpose in purposes.cat.categories] + [False]
+        )
+        self.charging_availability = pd.Series(availability[purposes.cat.codes], index=self.activities.index)
         self.charging_availability = self.charging_availability * self.user_config["gridmodellers"]["rated_power_simple"]
         self.activities["rated_power"] = self.charging_availability
         self.__adjust_power_short_parking_time()
         print("Grid connection assignment complete.")
 
+    def __assign_grid_via_registered_model(self, set_seed: int):
+        """
+        Assigns the grid using a grid model registered with
+        register_grid_model(). The model gets the column arrays of all
+        activities at once and returns their rated powers, which are written
+        without changing the order of the activities.
+
+        Args:
+            set_seed (int): Seed for reproducing random number.
+        """
+        print(f"Starting with charge connection replacement of location purposes using the grid model {self.grid_model}.")
+        rated_power = np.asarray(
+            GRID_MODELS[self.grid_model](columns=self._grid_model_columns(), user_config=self.user_config, seed=set_seed),
+            dtype=float,
+        )
+        if rated_power.shape != (len(self.activities),):
+            raise ValueError(
+                f"The grid model {self.grid_model} returned {rated_power.shape[0] if rated_power.ndim else 1} rated "
+                f"powers for {len(self.activities)} activities."
+            )
+        self.charging_availability = pd.Series(rated_power, index=self.activities.index)
+        self.activities["rated_power"] = self.charging_availability
+        self.__adjust_power_short_parking_time()
+        print("Grid connection assignment complete.")
+
+    def _grid_model_columns(self) -> dict:
+        """
+        Column arrays of the activities passed to registered grid models.
+        Purposes are given as category codes (-1 for activities without
+        purpose) into the purpose names, durations in seconds. household_id
+        is given by unique_id for datasets whose household_id is dropped by
+        the dataparsers, as in the probability grid model.
+
+        Returns:
+            dict: Arrays "purpose_codes", "purposes", "is_park", "unique_id", "household_id", "timestamp_start",
+                "timestamp_end" and "duration" of all activities
+        """
+        purposes = self._purpose_categories()
+        household_key = "household_id" if "household_id" in self.activities.columns else "unique_id"
+        return {
+            "purpose_codes": purposes.cat.codes.to_numpy(),
+            "purposes": purposes.cat.categories.to_numpy(),
+            "is_park": self.activities["park_id"].notna().to_numpy(),
+            "unique_id": self.activities["unique_id"].to_numpy(),
+            "household_id": self.activities[household_key].to_numpy(),
+            "timestamp_start": self.activities["timestamp_start"].to_numpy(dtype="datetime64[ns]"),
+            "timestamp_end": self.activities["timestamp_end"].to_numpy(dtype="datetime64[ns]"),
+            "duration": self.activities["time_delta"].to_numpy(dtype="timedelta64[ns]") / np.timedelta64(1, "s"),
+        }
+
     def __assign_grid_via_probabilities(self, set_seed: int):
         """
-        Assigns the grid usig probability distributions defined in
-        user_config.yaml.
+        Assigns the grid using probability distributions defined in
+        user_config.yaml, see __sample_probabilities(). rated_power is written
+        without changing the order of the activities.
 
         Args:
             set_seed (int): Seed for reproducing random number.
         """
-        activities_no_home = []
         print("Starting with charge connection replacement of location purposes.")
-        for purpose in self.activities.purpose_string.unique():
-            if purpose == "HOME":
-                activities_home = self.__home_probability_distribution(set_seed=42)
-            else:
-                subset = self.activities.loc[self.activities.purpose_string == purpose].copy()
-                power = list((self.user_config["gridmodellers"]["grid_availability_distribution"][purpose]).keys())
-                probability = list(self.user_config["gridmodellers"]["grid_availability_distribution"][purpose].values())
-                urng = np.random.default_rng(set_seed)  # universal non-uniform random number
-                rng = DiscreteAliasUrn(probability, random_state=urng)
-                self.charging_availability = rng.rvs(len(subset))
-                self.charging_availability = [power[i] for i in self.charging_availability]
-                subset.loc[:, ("rated_power")] = self.charging_availability
-                activities_no_home.append(subset)
-        activities_no_home = pd.concat(activities_no_home).reset_index(drop=True)
-        dataframes = [activities_home, activities_no_home]
-        self.activities = pd.concat(dataframes).reset_index(drop=True)
+        _, positions, powers = next(self.__sample_probabilities(set_seed=set_seed, number_draws=1))
+        self.charging_availability = pd.Series(powers[positions[0]], index=self.activities.index)
+        self.activities["rated_power"] = self.charging_availability
         self.__adjust_power_short_parking_time()
         print("Grid connection assignment complete.")
 
-    def __home_probability_distribution(self, set_seed: int) -> pd.DataFrame:
+    def __sample_probabilities(self, set_seed: int, number_draws: int, draws_per_block: int = None):
+        """
+        Samples number_draws independent grid allocations in blocks of
+        draws_per_block allocations. The distributions are compiled into an
+        inverse cumulative distribution table (see _inverse_cdf_table()), all
+        activities that are not at home are then sampled in a single call per
+        block. Home activities are sampled per household (see
+        __home_probability_distribution()). Both draws use independent random
+        streams spawned from the seed. The uniforms of each allocation are
+        consecutive in these streams, so the allocations depend neither on
+        number_draws nor on the block size. If counter_based_random_numbers is
+        set in the user_config, each uniform is derived from the seed, the keys
+        of its activity or household and the number of its allocation instead
+        (see _counter_uniforms()), so that the allocations do not depend on the
+        order or partitioning of the activities.
+
+        Args:
+            set_seed (int): Seed for reproducing random number.
+            number_draws (int): Number of allocations
+            draws_per_block (int, optional): Number of allocations sampled at once. Defaults to None, i.e. all.
+
+        Yields:
+            tuple: Number of the first allocation of the block, positions of the rated power of each allocation
+                (rows) and activity (columns) of the block in the rated powers, and the rated powers, the last one
+                (0) is used for activities without purpose.
+        """
+        purposes = self._purpose_categories()
+        unmapped = set(purposes.cat.remove_unused_categories().cat.categories) - set(self.grid_availability_probability)
+        if unmapped:
+            raise ValueError(f"No grid availability distribution given for the purposes {sorted(unmapped)}.")
+        bounds, powers = self._inverse_cdf_table(
+            categories=purposes.cat.categories, distribution=self.grid_availability_probability
+        )
+        home_stream, activity_stream = [np.random.default_rng(seed) for seed in np.random.SeedSequence(set_seed).spawn(2)]
+        codes = purposes.cat.codes.to_numpy()
+        home_code = purposes.cat.categories.get_indexer(["HOME"])[0]
+        is_home = (codes >= 0) & (codes == home_code)
+        is_sampled = (codes >= 0) & ~is_home
+        is_counter_based = self.user_config["gridmodellers"]["counter_based_random_numbers"]
+        activity_keys = self.__activity_keys(is_sampled=is_sampled) if is_counter_based else None
+        draws_per_block = draws_per_block or number_draws
+        for first_draw in range(0, number_draws, draws_per_block):
+            block_draws = min(draws_per_block, number_draws - first_draw)
+            if is_counter_based:
+                uniforms = self._counter_uniforms(
+                    seed=set_seed, keys=activity_keys, number_draws=block_draws, first_draw=first_draw
+                )
+            else:
+                uniforms = activity_stream.random((block_draws, int(is_sampled.sum())))
+            positions = np.full((block_draws, len(codes)), len(powers))
+            positions[:, is_sampled] = self._sample_positions(
+                bounds=bounds, codes=codes[is_sampled], uniforms=uniforms
+            )
+            del uniforms
+            positions[:, is_home] = self.__home_probability_distribution(
+                is_home=is_home,
+                bounds=bounds,
+                home_code=home_code,
+                number_draws=block_draws,
+                random_state=home_stream,
+                set_seed=set_seed,
+                first_draw=first_draw,
+            )
+            yield first_draw, positions, np.append(powers, 0.0)
+
+    def __activity_keys(self, is_sampled: np.ndarray) -> list:
+        """
+        Keys of the counter-based draws of activities: park activities are
+        identified by unique_id and park_id, trips by unique_id and trip_id.
+
+        Args:
+            is_sampled (np.ndarray): Mask of the sampled activities
+
+        Returns:
+            list: Key arrays (uint64) of the sampled activities
+        """
+        is_park = self.activities["park_id"].notna()
+        return [
+            np.where(is_park, 1, 2).astype(np.uint64)[is_sampled],
+            self._key_bits(self.activities["unique_id"])[is_sampled],
+            self._key_bits(self.activities["park_id"].where(is_park, self.activities["trip_id"]))[is_sampled],
+        ]
+
+    @staticmethod
+    def _counter_uniforms(seed: int, keys: list, number_draws: int, first_draw: int = 0) -> np.ndarray:
+        """
+        Counter-based uniform random numbers. The seed and the keys of each row
+        are hashed into a state with the SplitMix64 finaliser, the number of
+        each draw is then added as counter and hashed once more. A number thus
+        only depends on the seed, its keys and its draw.
+
+        Args:
+            seed (int): Seed
+            keys (list): Key arrays (uint64) of equal length identifying the rows
+            number_draws (int): Number of draws per row
+            first_draw (int, optional): Number of the first draw, e.g. of a block of draws. Defaults to 0.
+
+        Returns:
+            np.ndarray: Uniform random numbers in [0, 1) of each draw (rows) and row (columns)
+        """
+        state = np.full(len(keys[0]), seed % 2**64, dtype=np.uint64)
+        for key in keys:
+            state = _mix64(state ^ key)
+        counters = np.arange(first_draw + 1, first_draw + number_draws + 1, dtype=np.uint64)[:, np.newaxis]
+        return (_mix64(state + counters * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(11)) * 2.0**-53
+
+    @staticmethod
+    def _key_bits(keys: pd.Series) -> np.ndarray:
+        """
+        Converts a key column into uint64 values that are equal for equal
+        keys, independent of the dtype of the column (e.g. int64, Int64 or
+        float64). Numeric keys are taken by their float64 bits, other keys are
+        hashed.
+
+        Args:
+            keys (pd.Series): Key column without missing values
+
+        Returns:
+            np.ndarray: uint64 value of each key
+        """
+        if pd.api.types.is_numeric_dtype(keys):
+            return (keys.to_numpy(dtype=float) + 0.0).view(np.uint64)
+        return pd.util.hash_array(keys.astype(str).to_numpy(dtype=object))
+
+    def __home_probability_distribution(
+        self, is_home: np.ndarray, bounds: np.ndarray, home_code: int, number_draws: int,
+        random_state: np.random.Generator, set_seed: int, first_draw: int = 0
+    ) -> np.ndarray:
         """
         Adds condition that charging at home in the morning has the same rated
         capacity as in the evening if first and/or last parking ar at home,
         instead of reiterating the home distribution (or separate home from the
         main function) it assign the home charging probability based on unique
         household IDs instead of dataset entries -> each household always has
-        same rated power.
+        same rated power. The dataparsers drop household_id for some datasets,
+        the draw is then made per vehicle (unique_id). Counter-based draws are
+        derived from the seed and the household.
 
         Args:
-            set_seed (int): Seed used when using the universal non-uniform
-            random number generator.
+            is_home (np.ndarray): Mask of the home activities
+            bounds (np.ndarray): Bounds of the inverse cumulative distribution table of all purposes
+            home_code (int): Category code of the home purpose
+            number_draws (int): Number of allocations
+            random_state (np.random.Generator): Random stream of the home draws
+            set_seed (int): Seed for reproducing random number.
+            first_draw (int, optional): Number of the first allocation, e.g. of a block of allocations. Defaults to 0.
+
+        Returns:
+            np.ndarray: Positions of the sampled rated powers of each allocation (rows) and home activity (columns)
+        """
+        key = "household_id" if "household_id" in self.activities.columns else "unique_id"
+        household_numbers, households = pd.factorize(self.activities[key].to_numpy()[is_home])
+        if self.user_config["gridmodellers"]["counter_based_random_numbers"]:
+            uniforms = self._counter_uniforms(
+                seed=set_seed,
+                keys=[np.zeros(len(households), dtype=np.uint64), self._key_bits(pd.Series(households))],
+                number_draws=number_draws,
+                first_draw=first_draw,
+            )
+        else:
+            uniforms = random_state.random((number_draws, len(households)))
+        household_positions = self._sample_positions(
+            bounds=bounds, codes=np.full(len(households), home_code), uniforms=uniforms
+        )
+        return household_positions[:, household_numbers]
+
+    @staticmethod
+    def _inverse_cdf_table(categories: pd.Index, distribution: dict) -> tuple:
+        """
+        Compiles the rated power distributions of all purpose categories into
+        one inverse cumulative distribution table. The powers of all
+        categories are concatenated, the inner bounds of the cumulative
+        probabilities of category code k are shifted by k, so that a single
+        sorted array of bounds covers all categories. Categories without a
+        distribution get a rated power of 0.
+
+        Args:
+            categories (pd.Index): Purpose categories in the order of their codes
+            distribution (dict): Probability of each rated power per purpose
+
+        Returns:
+            tuple: Sorted bounds and rated powers of all categories
+        """
+        bounds, powers = [np.zeros(0)], []
+        for code, category in enumerate(categories):
+            probabilities = distribution.get(category, {0: 1})
+            cumulative = np.cumsum(list(probabilities.values()), dtype=float)
+            bounds.append(code + cumulative[:-1] / cumulative[-1])
+            powers.extend(probabilities.keys())
+        return np.concatenate(bounds), np.array(powers, dtype=float)
+
+    @staticmethod
+    def _sample_positions(bounds: np.ndarray, codes: np.ndarray, uniforms: np.ndarray) -> np.ndarray:
+        """
+        Looks up uniform random numbers in the inverse cumulative distribution
+        table. Each category has one more rated power than inner bounds, so
+        the position in the powers is the number of bounds below
+        code + uniform plus the code.
+
+        Args:
+            bounds (np.ndarray): Bounds of the inverse cumulative distribution table, see _inverse_cdf_table()
+            codes (np.ndarray): Purpose category code of each draw, broadcast against the uniforms
+            uniforms (np.ndarray): Uniform random numbers in [0, 1) of each draw
+
+        Returns:
+            np.ndarray: Positions of the sampled rated powers in the powers of the table
+        """
+        return np.searchsorted(bounds, codes + uniforms, side="right") + codes
+
+    def _purpose_categories(self) -> pd.Series:
+        """
+        Returns the parking purposes as a categorical Series. The dataparsers already provide purpose_string as
+        Categorical, in which case no conversion takes place. Mapping and masking then work on the integer codes.
 
         Returns:
-            pd.DataFrame: Activities data set with sampled and harmonized home
-            charging rated powers.
-        """
-        purpose = "HOME"
-        home_activities = self.activities.loc[self.activities.purpose_string == purpose].copy()
-        households = home_activities[["household_id"]].reset_index(drop=True)
-        households = households.drop_duplicates(subset="household_id").copy()  # 73850 unique HH
-        power = list((self.user_config["gridmodellers"]["grid_availability_distribution"][purpose]).keys())
-        probability = list(self.user_config["gridmodellers"]["grid_availability_distribution"][purpose].values())
-        urng = np.random.default_rng(set_seed)  # universal non-uniform random number
-        rng = DiscreteAliasUrn(probability, random_state=urng)
-        self.charging_availability = rng.rvs(len(households))
-        self.charging_availability = [power[i] for i in self.charging_availability]
-        households.loc[:, ("rated_power")] = self.charging_availability
-        households.set_index("household_id", inplace=True)
-        home_activities = home_activities.join(households, on="household_id")
-        return home_activities
+            pd.Series: Categorical parking purposes of all activities
+        """
+        return self.activities["purpose_string"].astype("category")
 
     def __adjust_power_short_parking_time(self):
         """
         Adjusts charging power to zero if parking duration shorter than a
         minimum parking time set in the config file.
         """
-        self.activities.loc[
-            (
-                (self.activities["park_id"].notna())
-                & (
-                    (self.activities["time_delta"] / np.timedelta64(1, "s"))
-                    <= self.user_config["gridmodellers"]["minimum_parking_time"]
-                )
-            ),
-            "rated_power",
-        ] = 0
+        self.activities.loc[self.__is_short_parking(), "rated_power"] = 0
+
+    def __is_short_parking(self) -> pd.Series:
+        return (self.activities["park_id"].notna()) & (
+            (self.activities["time_delta"] / np.timedelta64(1, "s"))
+            <= self.user_config["gridmodellers"]["minimum_parking_time"]
+        )
 
     def __add_grid_losses(self):
         """
         Function applying a reduction of rated power capacities to the rated
         powers after sampling. The factors for reducing the rated power are
-        given in the gridConfig with keys being floats of rated powers and
-        values being floats between 0 and 1. The factor is aloss factor and not
-        the efficiency, thus 0.1 applied to a rated power of 11 kW will yield an
-        available power of 9.9 kW.
-        """
-        if self.user_config["gridmodellers"]["losses"]:
-            self.activities["available_power"] = self.activities["rated_power"] - (
-                self.activities["rated_power"]
-                * self.activities["rated_power"].apply(
-                    lambda x: self.user_config["gridmodellers"]["loss_factor"][f"rated_power_{str(x)}"]
-                )
-            )
-        else:
-            self.activities["available_power"] = self.activities["rated_power"]
+        given in the user_config either per rated power (loss_factor) or as a
+        piecewise-linear curve over the rated power (loss_factor_curve), see
+        LossModel. The factor is a loss factor and not the efficiency, thus 0.1
+        applied to a rated power of 11 kW will yield an available power of
+        9.9 kW.
+        """
+        self.activities["available_power"] = self.__available_power(rated_power=self.activities["rated_power"])
+
+    def __available_power(self, rated_power: pd.Series) -> pd.Series:
+        """
+        Applies the loss model to rated powers, see __add_grid_losses().
+
+        Args:
+            rated_power (pd.Series): Rated powers
+
+        Returns:
+            pd.Series: Available powers
+        """
+        if self.loss_model is None:
+            return rated_power
+        return pd.Series(self.loss_model.available_power(rated_power=rated_power), index=rated_power.index)
 
     def __write_output(self):
         """
@@ -186,14 +561,15 @@ class GridModeller:
 
     def __remove_activities_not_ending_home(self):
         """
-        Removes activity which are not ending at home.
+        Removes the activity chains of vehicles whose last activity is not at
+        home. The last activities are looked up via the chain index of the
+        activities, which is updated for the remaining vehicles.
         """
         if self.dataset in ["MiD17", "VF"]:
-            last_activities_not_home = self.activities.loc[
-                (self.activities["purpose_string"] != "HOME") & (self.activities["is_last_activity"]), :
-            ].copy()
-            id_to_remove = last_activities_not_home["unique_id"].unique()
-            self.activities = self.activities.loc[~self.activities["unique_id"].isin(id_to_remove), :].copy()
+            index = chain_index(data=self.activities)
+            is_ending_home = self.activities["purpose_string"].take(index.last_rows).to_numpy() == "HOME"
+            self.activities = self.activities.take(index.rows(is_ending_home))
+            self.activities.attrs["chain_index"] = index.select(is_ending_home)
 
     def generate_metadata(self, metadata_config, file_name):
         metadata_config["name"] = file_name
@@ -219,7 +595,9 @@ class GridModeller:
         """
         Wrapper function for grid assignment. The number of iterations for
         assignGridViaProbabilities() and seed for reproduction of random numbers
-        can be specified here.
+        can be specified here. Besides the built-in grid models simple and
+        probability, grid_model can name a grid model registered with
+        register_grid_model().
 
         Args:
             seed (int, optional): Seed used when using the universal non-uniform
@@ -228,15 +606,90 @@ class GridModeller:
         if self.grid_model == "simple":
             self.__assign_grid_via_purposes()
         elif self.grid_model == "probability":
-            seed = seed
             self.__assign_grid_via_probabilities(set_seed=seed)
+        elif self.grid_model in GRID_MODELS:
+            self.__assign_grid_via_registered_model(set_seed=seed)
         else:
             raise (
                 ValueError(
-                    f"Specified grid modeling option {self.grid_model} is not implemented. Please choose"
-                    f'"simple" or "probability".'
+                    f"Specified grid modeling option {self.grid_model} is not implemented. Please choose "
+                    f'"simple", "probability" or a registered grid model {sorted(GRID_MODELS)}.'
                 )
             )
         self.__add_grid_losses()
+        self.activities = enforce_schema(
+            data=self.activities, schema=self.dev_config["global"]["activities_data_types"]
+        )
         self.__write_output()
 
+    def assign_grid_ensemble(self, number_draws: int, seed: int = 42, values_per_block: int = 2**22):
+        """
+        Ensemble mode of the probability grid model. Samples number_draws
+        allocations of rated powers at once instead of a single one. The
+        ensemble is stored compactly as codes into a table of rated powers
+        (ensemble_codes, activities x draws, uint8 for up to 256 distinct
+        powers) together with the rated and available powers of each code
+        (ensemble_rated_power, ensemble_available_power), so the losses are
+        evaluated per distinct power only. The activities of a single draw are
+        provided by ensemble_member(), the first draw equals the allocation of
+        assign_grid() with the same seed and is set as activities. The
+        allocations are sampled in blocks of about values_per_block random
+        numbers that are converted into codes right away, so that only the
+        codes of the whole ensemble are held in memory. Only the grid
+        assignment is vectorised over the draws, FlexEstimator and
+        DiaryBuilder still process one allocation at a time via
+        ensemble_member().
+
+        Args:
+            number_draws (int): Number of allocations, at least 1
+            seed (int, optional): Seed used when using the universal non-uniform
+            random number generator. Defaults to 42.
+            values_per_block (int, optional): Number of random numbers sampled
+            at once. Defaults to 2**22.
+
+        Raises:
+            ValueError: Raised if the grid model is not probability or number_draws is smaller than 1
+        """
+        if number_draws < 1:
+            raise ValueError(f"The ensemble mode requires at least one allocation, number_draws is {number_draws}.")
+        if self.grid_model != "probability":
+            raise ValueError(
+                f"The ensemble mode requires the grid model probability, the specified grid model is {self.grid_model}."
+            )
+        print(f"Starting with the sampling of {number_draws} grid connection allocations.")
+        blocks = self.__sample_probabilities(
+            set_seed=seed, number_draws=number_draws, draws_per_block=max(1, values_per_block // max(len(self.activities), 1))
+        )
+        for first_draw, positions, powers in blocks:
+            if first_draw == 0:
+                self.ensemble_rated_power, position_codes = np.unique(powers, return_inverse=True)
+                self.ensemble_available_power = self.__available_power(
+                    rated_power=pd.Series(self.ensemble_rated_power)
+                ).to_numpy(dtype=float)
+                position_codes = position_codes.astype(np.min_scalar_type(len(self.ensemble_rated_power) - 1))
+                self.ensemble_codes = np.empty((len(self.activities), number_draws), dtype=position_codes.dtype)
+            self.ensemble_codes[:, first_draw : first_draw + len(positions)] = position_codes[positions].T
+        self.ensemble_codes[self.__is_short_parking().to_numpy()] = position_codes[-1]
+        self.activities = self.ensemble_member(draw=0)
+        self.__write_output()
+        print("Grid connection assignment complete.")
+
+    def ensemble_member(self, draw: int) -> pd.DataFrame:
+        """
+        Returns the activities with the rated and available powers of one
+        allocation of the ensemble, e.g. to estimate the flexibility of each
+        allocation without parsing the data again. Each call copies the
+        activities, the later stages are run once per allocation.
+
+        Args:
+            draw (int): Number of the allocation
+
+        Returns:
+            pd.DataFrame: Activities with the columns rated_power and available_power of the allocation
+        """
+        codes = self.ensemble_codes[:, draw]
+        activities = self.activities.copy()
+        activities["rated_power"] = self.ensemble_rated_power[codes]
+        activities["available_power"] = self.ensemble_available_power[codes]
+        return enforce_schema(data=activities, schema=self.dev_config["global"]["activities_data_types"])
+
@@ -7,7 +7,7 @@ from pathlib import Path
 import pandas as pd
 
 from ..core.diarybuilders import DiaryBuilder
-from ..utils.utils import create_file_name, write_out
+from ..utils.utils import chain_index, column_view, create_file_name, write_out
 from ..utils.metadata import read_metadata_config, write_out_metadata
 
 
@@ -162,12 +162,21 @@ class Aggregator:
         """
         Get weights from the initial mobility data set stored in the column trip_weight and store it in self.weights.
         """
-        self.weights = (
-            self.activities.loc[:, ["unique_id", "trip_weight"]]
-            .drop_duplicates(subset=["unique_id"])
-            .reset_index(drop=True)
-            .set_index("unique_id")
-        )
+        self.weights = self._first_activities(columns=["unique_id", "trip_weight"]).set_index("unique_id")
+
+    def _first_activities(self, columns: list) -> pd.DataFrame:
+        """
+        Selects the given columns of the first activity of each vehicle. The first activities are taken at the chain
+        offsets of the activities instead of searching duplicates of unique_id.
+
+        Args:
+            columns (list): Columns to select
+
+        Returns:
+            pd.DataFrame: One row per vehicle with a range index
+        """
+        index = chain_index(data=self.activities)
+        return column_view(data=self.activities, columns=columns).take(index.first_rows).reset_index(drop=True)
 
     def __basic_aggregation(self):
         """
@@ -196,12 +205,7 @@ class Aggregator:
             columns=self.profile.columns, index=range(1, 2)
         )
         cols = ["unique_id", "trip_weight"]
-        self.activities_subset = (
-            self.activities[cols]
-            .copy()
-            .drop_duplicates(subset=["unique_id"])
-            .reset_index(drop=True)
-        )
+        self.activities_subset = self._first_activities(columns=cols)
         self.activities_weekday = pd.merge(
             self.profile, self.activities_subset, on="unique_id", how="inner"
         )
@@ -249,12 +253,7 @@ class Aggregator:
         
         self.weekday_profiles = pd.DataFrame(columns=self.profile.columns, index=range(1, 8))
         cols = ["unique_id", "trip_weight"] + [by_column]
-        self.activities_subset = (
-            self.activities[cols]
-            .copy()
-            .drop_duplicates(subset=["unique_id"])
-            .reset_index(drop=True)
-        )
+        self.activities_subset = self._first_activities(columns=cols)
         self.activities_weekday = pd.merge(
             self.profile, self.activities_subset, on="unique_id", how="inner"
         )
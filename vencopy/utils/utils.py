@@ -1,6 +1,8 @@
 __maintainer__ = "Niklas Wulff, Fabia Miorelli"
 __license__ = "BSD-3-Clause"
 
+import json
+import numpy as np
 import pandas as pd
 import yaml
 from pathlib import Path
@@ -75,51 +77,362 @@ def return_lowest_level_dict_values(dictionary: dict, lst: list = None) -> list:
     return lst
 
 
+NANOSECONDS_PER_UNIT = {
+    "day": 86_400_000_000_000,
+    "hour": 3_600_000_000_000,
+    "minute": 60_000_000_000,
+    "second": 1_000_000_000,
+}
+
+
+def _as_int64(values, size: int) -> tuple:
+    """
+    Broadcasts a scalar, array or Series of integer valued time components to an int64 array of length size. Missing
+    values are replaced by zero and reported in the returned mask.
+
+    Args:
+        values (scalar, np.ndarray or pd.Series): Time component values
+        size (int): Length of the returned array
+
+    Returns:
+        tuple: int64 array of the values and boolean array flagging missing values
+    """
+    if np.ndim(values):
+        values = pd.Series(values).to_numpy(dtype="float64", na_value=np.nan)
+    else:
+        values = np.full(size, np.nan if pd.isna(values) else values, dtype="float64")
+    missing = np.isnan(values)
+    return np.where(missing, 0, values).astype(np.int64), missing
+
+
+def compose_epoch_nanoseconds(year, days=0, hours=0, minutes=0, seconds=0) -> np.ndarray:
+    """
+    Composes timestamps as int64 nanoseconds since 1970-01-01 from integer valued components: the first of January of
+    year plus the given number of days, hours, minutes and seconds. All arguments may be scalars or array-likes of
+    equal length, missing values in any component result in NaT.
+
+    Args:
+        year (scalar or array-like): Calendar year
+        days (scalar or array-like, optional): Days after the first of January. Defaults to 0.
+        hours (scalar or array-like, optional): Defaults to 0.
+        minutes (scalar or array-like, optional): Defaults to 0.
+        seconds (scalar or array-like, optional): Defaults to 0.
+
+    Returns:
+        np.ndarray: Timestamps as int64 epoch nanoseconds, NaT is represented by the minimum int64 value
+    """
+    size = max(np.size(component) for component in (year, days, hours, minutes, seconds))
+    year, missing = _as_int64(year, size)
+    epoch_days = (year - 1970).astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64)
+    epoch_nanoseconds = epoch_days * NANOSECONDS_PER_UNIT["day"]
+    for component, unit in ((days, "day"), (hours, "hour"), (minutes, "minute"), (seconds, "second")):
+        component, component_missing = _as_int64(component, size)
+        epoch_nanoseconds += component * NANOSECONDS_PER_UNIT[unit]
+        missing |= component_missing
+    epoch_nanoseconds[missing] = np.iinfo(np.int64).min
+    return epoch_nanoseconds
+
+
 def replace_vec(
     series, year=None, month=None, day=None, hour=None, minute=None, second=None
 ) -> pd.Series:
     """
-    _summary_
+    Vectorised equivalent of pd.Timestamp.replace() for a Series of timestamps. The timestamps are decomposed and
+    recomposed in int64 epoch nanoseconds, sub-second components are dropped. If only time of day components are
+    replaced, the calendar date is kept as is.
 
     Args:
-        series (_type_): _description_
-        year (_type_, optional): _description_. Defaults to None.
-        month (_type_, optional): _description_. Defaults to None.
-        day (_type_, optional): _description_. Defaults to None.
-        hour (_type_, optional): _description_. Defaults to None.
-        minute (_type_, optional): _description_. Defaults to None.
-        second (_type_, optional): _description_. Defaults to None.
+        series (pd.Series): Series of timestamps
+        year (int, optional): Replacement year. Defaults to None.
+        month (int, optional): Replacement month. Defaults to None.
+        day (int, optional): Replacement day of month. Defaults to None.
+        hour (int, optional): Replacement hour. Defaults to None.
+        minute (int, optional): Replacement minute. Defaults to None.
+        second (int, optional): Replacement second. Defaults to None.
 
     Returns:
-        pd.Series: _description_
-    """
-    replacement = pd.to_datetime(
-        {
-            "year": (
-                series.dt.year if year is None else [year for i in range(len(series))]
-            ),
-            "month": (
-                series.dt.month
-                if month is None
-                else [month for i in range(len(series))]
-            ),
-            "day": series.dt.day if day is None else [day for i in range(len(series))],
-            "hour": (
-                series.dt.hour if hour is None else [hour for i in range(len(series))]
-            ),
-            "minute": (
-                series.dt.minute
-                if minute is None
-                else [minute for i in range(len(series))]
-            ),
-            "second": (
-                series.dt.second
-                if second is None
-                else [second for i in range(len(series))]
-            ),
-        }
-    )
-    return replacement
+        pd.Series: Series of timestamps with the given components replaced
+    """
+    timestamps = pd.to_datetime(series).to_numpy(dtype="datetime64[ns]")
+    missing = np.isnat(timestamps)
+    dates = timestamps.astype("datetime64[D]")
+    time_of_day = (timestamps - dates).astype(np.int64)
+    time_components = {
+        "hour": time_of_day // NANOSECONDS_PER_UNIT["hour"] if hour is None else hour,
+        "minute": time_of_day % NANOSECONDS_PER_UNIT["hour"] // NANOSECONDS_PER_UNIT["minute"]
+        if minute is None
+        else minute,
+        "second": time_of_day % NANOSECONDS_PER_UNIT["minute"] // NANOSECONDS_PER_UNIT["second"]
+        if second is None
+        else second,
+    }
+    epoch_days = dates.astype(np.int64)
+    if year is not None or month is not None or day is not None:
+        months = dates.astype("datetime64[M]")
+        years = months.astype("datetime64[Y]")
+        years = years if year is None else np.full(len(dates), year - 1970).astype("datetime64[Y]")
+        months = years.astype("datetime64[M]") + (
+            (months - months.astype("datetime64[Y]")).astype(np.int64) if month is None else month - 1
+        )
+        day_of_month = (dates - dates.astype("datetime64[M]")).astype(np.int64) if day is None else day - 1
+        month_lengths = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)
+        day_of_month = np.broadcast_to(day_of_month, dates.shape)
+        if np.any(((day_of_month < 0) | (day_of_month >= month_lengths))[~missing]):
+            raise ValueError("Replaced day is out of range for month.")
+        epoch_days = months.astype("datetime64[D]").astype(np.int64) + day_of_month
+    epoch_nanoseconds = epoch_days * NANOSECONDS_PER_UNIT["day"]
+    for unit, component in time_components.items():
+        epoch_nanoseconds = epoch_nanoseconds + np.asarray(component, dtype=np.int64) * NANOSECONDS_PER_UNIT[unit]
+    epoch_nanoseconds[missing] = np.iinfo(np.int64).min
+    return pd.Series(epoch_nanoseconds.view("datetime64[ns]"), index=getattr(series, "index", None))
+
+
+def enforce_schema(data: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """
+    Casts the columns of data to the dtypes declared in schema. Columns that are not declared keep their dtype,
+    declared columns that are not in data are ignored. Integer casts are checked against the range of the target dtype
+    so that ids are never silently wrapped.
+
+    Args:
+        data (pd.DataFrame): Data to cast
+        schema (dict): Mapping of column names to dtype names, e.g. {"unique_id": "int32", "trip_id": "Int16"}
+
+    Returns:
+        pd.DataFrame: data with the declared dtypes, data itself if all columns already comply
+    """
+    dtypes = {}
+    for column, dtype in schema.items():
+        if column not in data.columns:
+            continue
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if data[column].dtype == dtype:
+            continue
+        if pd.api.types.is_integer_dtype(dtype) and pd.api.types.is_numeric_dtype(data[column]) and len(data):
+            bounds = np.iinfo(dtype.numpy_dtype if isinstance(dtype, pd.api.extensions.ExtensionDtype) else dtype)
+            if data[column].min() < bounds.min or data[column].max() > bounds.max:
+                raise ValueError(f"Values of column {column} exceed the range of the declared dtype {dtype}.")
+        dtypes[column] = dtype
+    return data.astype(dtypes, copy=False) if dtypes else data
+
+
+def column_view(data: pd.DataFrame, columns: list = None, writable_columns: list = None) -> pd.DataFrame:
+    """
+    Hands data over to the next stage without copying it. The returned frame shares the column arrays of data, so
+    adding, dropping or reassigning whole columns of the view leaves data untouched. Values written into existing
+    columns in place, e.g. via view.loc[mask, column] = value, would however also show up in data. The columns a stage
+    writes to in this way therefore have to be listed in writable_columns, only these are copied.
+
+    Args:
+        data (pd.DataFrame): Data owned by the previous stage
+        columns (list, optional): Columns to hand over. Defaults to None, i.e. all columns.
+        writable_columns (list, optional): Columns that are modified in place by the receiving stage. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Frame with the selected columns of data and the same index
+    """
+    if columns is None:
+        view = data.copy(deep=False)
+    else:
+        view = pd.concat([data[column] for column in columns], axis=1, copy=False)
+    for column in writable_columns or []:
+        view[column] = view[column].copy()
+    return view
+
+
+def is_first_row_per_vehicle(unique_ids) -> np.ndarray:
+    """
+    Flags the first row of each vehicle in a table whose rows are ordered by vehicle, e.g. the first activity of each
+    activity chain.
+
+    Args:
+        unique_ids (array-like): Vehicle ID of each row, rows of the same vehicle have to be adjacent
+
+    Returns:
+        np.ndarray: Boolean array that is True for the first row of each vehicle
+    """
+    unique_ids = np.asarray(unique_ids)
+    is_first_row = np.ones(len(unique_ids), dtype=bool)
+    is_first_row[1:] = unique_ids[1:] != unique_ids[:-1]
+    return is_first_row
+
+
+def is_last_row_per_vehicle(unique_ids) -> np.ndarray:
+    """
+    Flags the last row of each vehicle in a table whose rows are ordered by vehicle, e.g. the last activity of each
+    activity chain.
+
+    Args:
+        unique_ids (array-like): Vehicle ID of each row, rows of the same vehicle have to be adjacent
+
+    Returns:
+        np.ndarray: Boolean array that is True for the last row of each vehicle
+    """
+    unique_ids = np.asarray(unique_ids)
+    is_last_row = np.ones(len(unique_ids), dtype=bool)
+    is_last_row[:-1] = unique_ids[1:] != unique_ids[:-1]
+    return is_last_row
+
+
+class ChainIndex:
+    def __init__(self, unique_ids: np.ndarray, starts: np.ndarray, number_rows: int):
+        """
+        Offsets of the activity chains in an activities table whose rows are ordered by vehicle, stored in the style of
+        a compressed sparse row index: the rows of vehicle unique_ids[i] are the positions starts[i] to ends[i] - 1.
+        Per-vehicle operations thus become slices or reduceat calls on the column arrays instead of a groupby over the
+        whole table. The index is built once by the dataparsers and carried with the activities in
+        DataFrame.attrs["chain_index"], see chain_index().
+
+        Args:
+            unique_ids (np.ndarray): Vehicle IDs in the order of their activity chains
+            starts (np.ndarray): Position of the first row of each activity chain
+            number_rows (int): Number of rows of the activities table
+        """
+        self.unique_ids = np.asarray(unique_ids)
+        self.starts = np.asarray(starts, dtype=np.intp)
+        self.ends = np.append(self.starts[1:], number_rows).astype(np.intp)
+        self.number_rows = number_rows
+
+    @classmethod
+    def from_unique_ids(cls, unique_ids) -> "ChainIndex":
+        """
+        Builds the offsets in a single pass over the unique_id column.
+
+        Args:
+            unique_ids (array-like): Vehicle ID of each row, rows of the same vehicle have to be adjacent
+
+        Raises:
+            ValueError: Raised if the rows of a vehicle are not adjacent.
+
+        Returns:
+            ChainIndex: Chain offsets of the table
+        """
+        unique_ids = np.asarray(unique_ids)
+        starts = np.flatnonzero(is_first_row_per_vehicle(unique_ids=unique_ids))
+        chain_ids = unique_ids[starts]
+        if len(pd.unique(chain_ids)) != len(chain_ids):
+            raise ValueError("The activities of each vehicle have to be in adjacent rows to build a chain index.")
+        return cls(unique_ids=chain_ids, starts=starts, number_rows=len(unique_ids))
+
+    @property
+    def number_vehicles(self) -> int:
+        return len(self.starts)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self.ends - self.starts
+
+    @property
+    def first_rows(self) -> np.ndarray:
+        return self.starts
+
+    @property
+    def last_rows(self) -> np.ndarray:
+        return self.ends - 1
+
+    def is_first_row(self) -> np.ndarray:
+        is_first_row = np.zeros(self.number_rows, dtype=bool)
+        is_first_row[self.first_rows] = True
+        return is_first_row
+
+    def is_last_row(self) -> np.ndarray:
+        is_last_row = np.zeros(self.number_rows, dtype=bool)
+        is_last_row[self.last_rows] = True
+        return is_last_row
+
+    def vehicle_numbers(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: Position of the activity chain in the index for each row of the table
+        """
+        return np.repeat(np.arange(self.number_vehicles), self.lengths)
+
+    def reduce(self, ufunc: np.ufunc, values) -> np.ndarray:
+        """
+        Reduces a column to one value per vehicle, e.g. reduce(np.fmin, trip_ids) for the first trip of each vehicle.
+
+        Args:
+            ufunc (np.ufunc): Binary ufunc such as np.add, np.fmin or np.logical_or
+            values (array-like): One value per row of the table
+
+        Returns:
+            np.ndarray: One value per vehicle
+        """
+        values = np.asarray(values)
+        if self.number_vehicles == 0:
+            return values[:0]
+        return ufunc.reduceat(values, self.starts)
+
+    def broadcast(self, values) -> np.ndarray:
+        """
+        Repeats one value per vehicle to all rows of its activity chain.
+
+        Args:
+            values (array-like): One value per vehicle
+
+        Returns:
+            np.ndarray: One value per row of the table
+        """
+        return np.repeat(np.asarray(values), self.lengths)
+
+    def select(self, is_selected) -> "ChainIndex":
+        """
+        Chain index of the table that only keeps the rows of the selected vehicles, e.g. after
+        activities.take(index.rows(is_selected)).
+
+        Args:
+            is_selected (np.ndarray): Boolean array with one entry per vehicle
+
+        Returns:
+            ChainIndex: Chain offsets of the reduced table
+        """
+        lengths = self.lengths[is_selected]
+        starts = np.cumsum(lengths) - lengths
+        return ChainIndex(unique_ids=self.unique_ids[is_selected], starts=starts, number_rows=int(lengths.sum()))
+
+    def rows(self, is_selected) -> np.ndarray:
+        """
+        Args:
+            is_selected (np.ndarray): Boolean array with one entry per vehicle
+
+        Returns:
+            np.ndarray: Row positions of all activities of the selected vehicles in table order
+        """
+        return np.flatnonzero(self.broadcast(is_selected))
+
+    def matches(self, unique_ids) -> bool:
+        """
+        Consistency check against a table. The unique_id column has to equal the vehicle IDs repeated over their
+        activity chains, so that rows reordered within or between chains are detected. This is a single O(n)
+        comparison.
+
+        Args:
+            unique_ids (array-like): unique_id column of the table
+
+        Returns:
+            bool: True if the offsets describe the table
+        """
+        unique_ids = np.asarray(unique_ids)
+        if len(unique_ids) != self.number_rows:
+            return False
+        return bool(np.array_equal(self.broadcast(self.unique_ids), unique_ids))
+
+
+def chain_index(data: pd.DataFrame) -> ChainIndex:
+    """
+    Returns the chain index carried with an activities table. If none is attached or the table was changed such that
+    the index does not describe it anymore, the index is rebuilt from the unique_id column and attached to the table.
+
+    Args:
+        data (pd.DataFrame): Activities table with rows ordered by vehicle
+
+    Returns:
+        ChainIndex: Chain offsets of the table
+    """
+    index = data.attrs.get("chain_index")
+    if index is None or not index.matches(unique_ids=data["unique_id"]):
+        index = ChainIndex.from_unique_ids(unique_ids=data["unique_id"])
+        data.attrs["chain_index"] = index
+    return index
 
 
 def create_output_folders(configs: dict):
@@ -180,3 +493,74 @@ def write_out(data: pd.DataFrame, path: Path):
     """
     data.to_csv(path)
     print(f"Dataset written to {path}.")
+
+
+def write_out_columnar(data: pd.DataFrame, path: Path, metadata: dict = None):
+    """
+    Utility function to write the DataFrame given in data to the location given in path in the uncompressed columnar
+    Feather format, so that it can be memory-mapped when read. Requires the optional dependency pyarrow.
+
+    Args:
+        data (pd.DataFrame): Any DataFrame to write to disk
+        path (Path): Location on the disk
+        metadata (dict, optional): JSON-serialisable metadata stored in the file schema. Defaults to None.
+    """
+    import pyarrow as pa
+    from pyarrow import feather
+
+    table = pa.Table.from_pandas(data)
+    if metadata is not None:
+        table = table.replace_schema_metadata({**table.schema.metadata, b"vencopy": json.dumps(metadata)})
+    feather.write_feather(table, path, compression="uncompressed")
+    print(f"Dataset written to {path}.")
+
+
+def read_columnar(path: Path, memory_map: bool = True) -> pd.DataFrame:
+    """
+    Utility function to read a DataFrame written by write_out_columnar(). Requires the optional dependency pyarrow.
+    The DataFrame is always fully materialised in memory, as the conversion to pandas copies the columns into writable
+    blocks. Memory-mapping only saves reading the file into an intermediate buffer first.
+
+    Args:
+        path (Path): Location on the disk
+        memory_map (bool, optional): Memory-map the file instead of reading it into a buffer. Defaults to True.
+
+    Returns:
+        pd.DataFrame: DataFrame read from disk
+    """
+    from pyarrow import feather
+
+    return feather.read_table(path, memory_map=memory_map).to_pandas()
+
+
+def read_columnar_metadata(path: Path) -> dict:
+    """
+    Utility function to read the metadata stored by write_out_columnar() from the file schema without reading the
+    data. Requires the optional dependency pyarrow.
+
+    Args:
+        path (Path): Location on the disk
+
+    Returns:
+        dict: Metadata, empty if none was stored
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(str(path)) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return json.loads(metadata[b"vencopy"]) if b"vencopy" in metadata else {}
+
+
+def file_fingerprint(path: Path) -> dict:
+    """
+    Returns a cheap fingerprint of a file on disk composed of its name, size and modification time. The file content
+    is not read.
+
+    Args:
+        path (Path): Location on the disk
+
+    Returns:
+        dict: Dictionary with the keys name, size and modified
+    """
+    stat = Path(path).stat()
+    return {"name": Path(path).name, "size": stat.st_size, "modified": stat.st_mtime_ns}